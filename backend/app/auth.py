@@ -3,15 +3,17 @@ from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import User
 import os
 from dotenv import load_dotenv
 import hashlib
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+from app.services.auth_cache import PrincipalCache, GoogleCertStore
+from app.services.metrics import timed
 
 load_dotenv()
 
@@ -24,6 +26,20 @@ GOOGLE_CLIENT_ID = "326829570192-gf6boa8bms63jcg4atn3iapdcqjapmdu.apps.googleuse
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# token -> User, so most requests skip the JWT decode and the DB lookup
+principal_cache = PrincipalCache()
+# Google's signing certs, reused across sign-ins and refreshed ahead of expiry
+google_certs = GoogleCertStore()
+
+def _invalidate_principal(mapper, connection, user):
+    principal_cache.invalidate_user(user.email)
+
+# Any change to a user (password, provider, deletion) drops their cached tokens.
+# These are ORM events of this process only: other workers, bulk updates and raw
+# SQL aren't seen, and are picked up when the entry's AUTH_CACHE_TTL runs out.
+event.listen(User, "after_update", _invalidate_principal)
+event.listen(User, "after_delete", _invalidate_principal)
+
 # --- Helpers ---
 # we hash the password with SHA256 first.
 def _pre_hash(password: str) -> str:
@@ -51,8 +67,21 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def _load_user(db: Session, email: str):
+    user = db.query(User).filter(User.email == email).first()
+    if user is not None:
+        # Detach with its columns loaded and end the read transaction, so the
+        # pooled connection isn't held while the request awaits the LLM.
+        db.expunge(user)
+    db.rollback()
+    return user
+
 # --- PROTECTOR FUNCTION ---
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -66,19 +95,18 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
         
-    user = db.query(User).filter(User.email == email).first()
+    # The DB driver is sync; never run it on the event loop
+    with timed("auth_db"):
+        user = await run_in_threadpool(_load_user, db, email)
     if user is None:
         raise credentials_exception
+    principal_cache.put(token, user, token_expires_at=payload.get("exp"))
     return user
 
 def verify_google_token(token: str):
     try:
-        # Verify the token with Google's public keys
-        id_info = id_token.verify_oauth2_token(
-            token, 
-            google_requests.Request(), 
-            GOOGLE_CLIENT_ID
-        )
+        # Verify the token with Google's public keys (cached, see GoogleCertStore)
+        id_info = google_certs.verify(token, GOOGLE_CLIENT_ID)
         
         # Google returns the user's email inside the token
         return id_info['email']
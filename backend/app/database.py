@@ -10,12 +10,6 @@ load_dotenv()
 # 2. Get the URL
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
-# --- DEBUGGING BLOCK ---
-print(f"------------ DOCKER DATABASE DEBUG ------------")
-print(f"Raw URL value: '{SQLALCHEMY_DATABASE_URL}'")
-print(f"Type: {type(SQLALCHEMY_DATABASE_URL)}")
-print(f"-----------------------------------------------")
-
 # 3. Validation Logic
 if not SQLALCHEMY_DATABASE_URL or SQLALCHEMY_DATABASE_URL == "None":
     print("⚠️  URL is missing. Switching to SQLite.")
@@ -25,12 +19,17 @@ if not SQLALCHEMY_DATABASE_URL or SQLALCHEMY_DATABASE_URL == "None":
 if SQLALCHEMY_DATABASE_URL and SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-# 5. Create Engine
+# Seconds to wait for a database server to accept a connection; an unreachable
+# host fails fast (startup migrations, warm-up, requests) instead of hanging on TCP
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+
+# 5. Create Engine (creating it doesn't connect)
 try:
     if "sqlite" in SQLALCHEMY_DATABASE_URL:
         engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
     else:
-        engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True)
+        engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True,
+                               connect_args={"connect_timeout": DB_CONNECT_TIMEOUT})
     print("✅ Database Engine Created Successfully.")
 except Exception as e:
     print(f"❌ CRITICAL ERROR creating engine: {e}")
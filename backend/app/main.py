@@ -1,23 +1,117 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from sqlalchemy.orm import Session
-from datetime import timedelta
-from typing import List
+from datetime import datetime, timedelta
+from typing import List, Optional
+from contextlib import asynccontextmanager
+from sqlalchemy import text
+import atexit
+import json
 import os
+import sys
 
 # Import our infrastructure
-from app.database import engine, get_db
+from app.database import engine, get_db, SessionLocal
 from app import models, auth
-from app.services.rag_service import query_rag,download_and_ingest_10k
+from app.migrations import run_migrations
+from app.services import chat_history
+from app.services.answer_cache import answer_cache
+from app.services.ingest_jobs import IngestJobQueue
+from app.services.message_writer import MessageWriter, MESSAGE_WRITE_THROUGH
+from app.services.llm_service import llm_client
+from app.services.metrics import MetricsMiddleware, registry, timed
+from app.services.warmup import Warmup
 
-# 1. CREATE TABLES IN CLOUD DB (Run migrations)
-models.Base.metadata.create_all(bind=engine)
+# The RAG stack (Chroma, LangChain, the embedding client, SEC downloader) takes
+# seconds to import, so it is loaded by the warm-up task or on first use,
+# never at import time: uvicorn can accept connections (and answer /healthz) right away.
 
-app = FastAPI(title="RiskSentinel API")
+async def aquery_rag(question: str, filters: dict = None):
+    from app.services import rag_service
+    return await rag_service.aquery_rag(question, filters)
+
+async def astream_rag(question: str, filters: dict = None):
+    from app.services import rag_service
+    async for event in rag_service.astream_rag(question, filters):
+        yield event
+
+async def astream_risk_matrix(questions, tickers, year: int = None, item: str = None):
+    from app.services import rag_service
+    async for event in rag_service.astream_risk_matrix(questions, tickers, year, item):
+        yield event
+
+def download_and_ingest_10k(ticker: str, progress):
+    from app.services import rag_service
+    return rag_service.download_and_ingest_10k(ticker, progress)
+
+# --- SCHEMA ---
+# Migrations run in the lifespan startup, before the first request is served, and
+# never at import. An unreachable database fails within DB_CONNECT_TIMEOUT and
+# doesn't keep the process from starting: the warm-up retries.
+_schema_ready = False
+
+def _migrate():
+    global _schema_ready
+    run_migrations(engine)
+    _schema_ready = True
+
+# --- WARM-UP ---
+def _check_database():
+    if not _schema_ready:
+        _migrate()
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+def _check_vector_store():
+    from app.services import vector_store
+    vector_store.get_vector_store()
+    vector_store.get_lexical_index()
+
+def _check_rag():
+    from app.services import rag_service  # noqa: F401
+
+def _check_llm():
+    if not os.getenv("HUGGINGFACEHUB_API_TOKEN"):
+        raise RuntimeError("HUGGINGFACEHUB_API_TOKEN is not set")
+    if not any(model["state"] != "open" for model in llm_client.stats()["models"].values()):
+        raise RuntimeError("every model's circuit is open")
+
+# name -> (check, required for readiness)
+warmup = Warmup({
+    "database": (_check_database, True),
+    "vector_store": (_check_vector_store, True),
+    "rag": (_check_rag, True),
+    "llm": (_check_llm, False),
+})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await run_in_threadpool(_migrate)
+    except Exception as e:
+        print(f"⚠️  Migrations failed at startup ({e}); the warm-up will retry")
+    # Runs in the background: startup doesn't wait for it, /readyz reports it
+    warmup.start()
+    yield
+    warmup.stop()
+    # Blocking wait; keep it off the event loop
+    await run_in_threadpool(message_writer.flush, 10)
+
+app = FastAPI(title="RiskSentinel API", lifespan=lifespan)
+
+# Ingestion runs in a background worker pool, not inside the HTTP request.
+# Job state lives in the database, so every uvicorn worker sees every job.
+ingest_queue = IngestJobQueue(download_and_ingest_10k, session_factory=SessionLocal)
+
+# Chat messages are written behind the response in batched inserts;
+# whatever is still queued gets written out when the process exits
+message_writer = MessageWriter(SessionLocal)
+atexit.register(message_writer.close)
 
 # --- CORS ---
 app.add_middleware(
@@ -26,7 +120,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let the browser devtools show the per-stage breakdown cross-origin
+    expose_headers=["Server-Timing", "X-Next-Cursor"],
 )
+# Stage histograms for /metrics plus the Server-Timing response header
+app.add_middleware(MetricsMiddleware)
 
 # --- PYDANTIC SCHEMAS ---
 class UserCreate(BaseModel):
@@ -39,6 +137,26 @@ class Token(BaseModel):
 
 class RiskQuery(BaseModel):
     question: str
+    # Optional scope, e.g. {"ticker": "NVDA", "item": "1A"}
+    ticker: Optional[str] = None
+    year: Optional[int] = None
+    item: Optional[str] = None
+    # Messages are saved into this conversation (see POST /api/conversations)
+    conversation_id: Optional[int] = None
+
+    def filters(self):
+        from app.services.vector_store import build_filter
+        return build_filter(ticker=self.ticker, year=self.year, item=self.item)
+
+# Largest grid (questions x tickers) one risk matrix request may ask for
+RISK_MATRIX_MAX_CELLS = int(os.getenv("RISK_MATRIX_MAX_CELLS", "60"))
+
+class RiskMatrixQuery(BaseModel):
+    # e.g. ["China exposure", "Supply chain", "Litigation"] x ["AAPL", "NVDA", "TSLA"]
+    questions: List[str]
+    tickers: List[str]
+    year: Optional[int] = None
+    item: Optional[str] = None
 
 class MessageHistory(BaseModel):
     role: str
@@ -47,6 +165,17 @@ class MessageHistory(BaseModel):
     class Config:
         orm_mode = True
 
+class ConversationCreate(BaseModel):
+    title: Optional[str] = None
+
+class ConversationOut(BaseModel):
+    id: int
+    title: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
 class TickerRequest(BaseModel):
     ticker: str
 
@@ -123,54 +252,274 @@ def google_login(request: GoogleAuthRequest, db: Session = Depends(get_db)):
 
 # --- PROTECTED APP ENDPOINTS ---
 
+def _wait_for_writes(user_id: int):
+    # Read-your-writes: answering from the database while this user's messages
+    # are still queued would show history without them, so say "try again" instead
+    if not message_writer.wait_for_user(user_id):
+        raise HTTPException(status_code=503, detail="Chat history is being saved; retry shortly",
+                            headers={"Retry-After": "1"})
+
+def _wait_for_own_write(user_id: int):
+    # Several workers: the next read may land on one that never saw the queue,
+    # so the message has to be committed before we respond
+    if not message_writer.wait_for_user(user_id):
+        print(f"⚠️  Chat message of user {user_id} not committed yet; other workers won't see it")
+
+def _page(response: Response, rows, next_cursor):
+    # The body stays a plain list; the cursor for the next (older) page rides in a header
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
 @app.get("/api/history", response_model=List[MessageHistory])
-def get_chat_history(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    # SQL: SELECT * FROM messages WHERE user_id = {current_user.id} ORDER BY timestamp ASC
-    messages = db.query(models.Message)\
-        .filter(models.Message.user_id == current_user.id)\
-        .order_by(models.Message.timestamp.asc())\
-        .all()
-    return messages
+def get_chat_history(
+    response: Response,
+    before: Optional[str] = None,
+    limit: int = Query(chat_history.DEFAULT_PAGE_SIZE, ge=1, le=chat_history.MAX_PAGE_SIZE),
+    conversation_id: Optional[int] = None,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Latest `limit` messages in chronological order. To page back, pass the
+    X-Next-Cursor response header as `before`; no header means no older messages.
+    """
+    _wait_for_writes(current_user.id)
+    try:
+        with timed("db"):
+            rows, next_cursor = chat_history.fetch_messages(db, current_user.id, before, limit, conversation_id)
+    except chat_history.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _page(response, rows, next_cursor)
+
+@app.get("/api/conversations", response_model=List[ConversationOut])
+def list_conversations(
+    response: Response,
+    before: Optional[str] = None,
+    limit: int = Query(chat_history.DEFAULT_PAGE_SIZE, ge=1, le=chat_history.MAX_PAGE_SIZE),
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    _wait_for_writes(current_user.id)
+    try:
+        rows, next_cursor = chat_history.fetch_conversations(db, current_user.id, before, limit)
+    except chat_history.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _page(response, rows, next_cursor)
+
+@app.post("/api/conversations", response_model=ConversationOut)
+def create_conversation(
+    request: ConversationCreate,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    return chat_history.create_conversation(db, current_user.id, request.title)
+
+def _check_conversation(db: Session, user_id: int, conversation_id: Optional[int]):
+    if conversation_id is not None and chat_history.get_conversation(db, user_id, conversation_id) is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+def _save_question(db: Session, user_id: int, query: RiskQuery):
+    with timed("db"):
+        _check_conversation(db, user_id, query.conversation_id)
+    message_writer.enqueue(user_id, "user", query.question, query.conversation_id)
+    if MESSAGE_WRITE_THROUGH:
+        _wait_for_own_write(user_id)
 
 @app.post("/api/analyze")
-def analyze_risk(
+async def analyze_risk(
     query: RiskQuery, 
     current_user: models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db) # <--- Need DB access here now
 ):
-    # 1. Save User Message
-    user_msg = models.Message(user_id=current_user.id, role="user", content=query.question)
-    db.add(user_msg)
-    db.commit() # Commit immediately so it's safe
+    # 1. Save User Message (the conversation check reads the DB; the write itself is queued)
+    await run_in_threadpool(_save_question, db, current_user.id, query)
 
     try:
-        # 2. Get AI Response
-        ai_response_text = query_rag(query.question)
+        # 2. Get AI Response (awaited, so no worker is held while the model thinks)
+        ai_response_text = await aquery_rag(query.question, query.filters())
         
-        # 3. Save AI Message
-        ai_msg = models.Message(user_id=current_user.id, role="assistant", content=ai_response_text)
-        db.add(ai_msg)
-        db.commit()
+        # 3. Save AI Message (queued, committed by the writer thread)
+        message_writer.enqueue(current_user.id, "assistant", ai_response_text, query.conversation_id)
+        if MESSAGE_WRITE_THROUGH:
+            await run_in_threadpool(_wait_for_own_write, current_user.id)
         
         return {"answer": ai_response_text}
     except Exception as e:
         print(f"❌ Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
-@app.post("/api/ingest")
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/analyze/stream")
+async def analyze_risk_stream(
+    query: RiskQuery,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Same as /api/analyze, but sends Server-Sent Events:
+    "sources" (retrieved chunks), then "token" events, then "done".
+    """
+    await run_in_threadpool(_save_question, db, current_user.id, query)
+    user_id = current_user.id
+
+    async def event_stream():
+        pieces = []
+        try:
+            async for event, payload in astream_rag(query.question, query.filters()):
+                if event == "token":
+                    pieces.append(payload)
+                yield _sse(event, payload)
+        except Exception as e:
+            print(f"❌ Stream Error: {e}")
+            yield _sse("error", str(e))
+            return
+
+        # Persist the full answer only once the model is done
+        answer = "".join(pieces)
+        message_writer.enqueue(user_id, "assistant", answer, query.conversation_id)
+        if MESSAGE_WRITE_THROUGH:
+            await run_in_threadpool(_wait_for_own_write, user_id)
+        yield _sse("done", {"answer": answer})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _unique(values, normalize=str.strip):
+    seen = []
+    for value in map(normalize, values):
+        if value and value not in seen:
+            seen.append(value)
+    return seen
+
+@app.post("/api/analyze/matrix")
+async def analyze_risk_matrix(
+    query: RiskMatrixQuery,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Every question for every ticker in one request, as Server-Sent Events:
+    "grid" (the deduplicated rows and columns), one "cell" per answer in
+    the order they finish ({row, col, question, ticker, answer or error,
+    seconds}), then "done". Cells are not saved to the chat history.
+    """
+    questions = _unique(query.questions)
+    tickers = _unique(query.tickers, lambda t: t.strip().upper())
+    if not questions or not tickers:
+        raise HTTPException(status_code=400, detail="Give at least one question and one ticker")
+    if len(questions) * len(tickers) > RISK_MATRIX_MAX_CELLS:
+        raise HTTPException(status_code=400,
+                            detail=f"A risk matrix is limited to {RISK_MATRIX_MAX_CELLS} cells (questions x tickers)")
+
+    async def event_stream():
+        yield _sse("grid", {"questions": questions, "tickers": tickers})
+        try:
+            async for event, payload in astream_risk_matrix(questions, tickers, query.year, query.item):
+                yield _sse(event, payload)
+        except Exception as e:
+            print(f"❌ Risk matrix Error: {e}")
+            yield _sse("error", str(e))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/cache/stats")
+def get_cache_stats(current_user: models.User = Depends(auth.get_current_user)):
+    from app.services.vector_store import embedding_model
+    return {"answers": answer_cache.stats(), "embeddings": embedding_model.stats()}
+
+@app.get("/api/llm/stats")
+def get_llm_stats(current_user: models.User = Depends(auth.get_current_user)):
+    """
+    Per-model p50/p95 latency, error rate and circuit state.
+    """
+    return llm_client.stats()
+
+def _runtime_stats():
+    # Cache, circuit and writer counters live in their own stats(); export them at scrape time
+    samples = []
+    answers = answer_cache.stats()
+    for outcome in ("hits", "similar_hits", "misses", "coalesced"):
+        samples.append(("risksentinel_cache_lookups_total", "counter", "Cache lookups by cache and outcome.",
+                        {"cache": "answer", "outcome": outcome}, answers[outcome]))
+    caches = [("principal", auth.principal_cache.stats())]
+    vector_store = sys.modules.get("app.services.vector_store")
+    if vector_store is not None:
+        # Don't make a scrape import the whole RAG stack
+        caches.append(("embedding", vector_store.embedding_model.stats()))
+    for name, stats in caches:
+        for outcome in ("hits", "misses"):
+            samples.append(("risksentinel_cache_lookups_total", "counter", "Cache lookups by cache and outcome.",
+                            {"cache": name, "outcome": outcome}, stats[outcome]))
+    for model, health in llm_client.stats()["models"].items():
+        samples.append(("risksentinel_llm_circuit_open", "gauge", "1 while a model's circuit breaker is not closed.",
+                        {"model": model}, int(health["state"] != "closed")))
+    writer = message_writer.stats()
+    samples.append(("risksentinel_message_queue_depth", "gauge", "Chat messages waiting to be written.", {}, writer["queued"]))
+    samples.append(("risksentinel_message_flushes_total", "counter", "Batched message inserts committed.", {}, writer["flushes"]))
+    return samples
+
+registry.register_collector(_runtime_stats)
+
+@app.get("/healthz")
+def healthz():
+    """
+    Liveness: the process is up and serving. Never touches a dependency.
+    """
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz(response: Response):
+    """
+    Readiness: 200 once the database, vector store and RAG stack are loaded,
+    503 until then, and again while one is failing (required dependencies are
+    re-checked every WARMUP_RECHECK_SECONDS). Per-dependency state in the body.
+    """
+    report = warmup.report()
+    if not report["ready"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return report
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus text format: per-stage latency histograms, per-model LLM
+    latency, fallbacks, errors, cache outcomes and ingestion timings.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/api/ingest", status_code=status.HTTP_202_ACCEPTED)
 def ingest_ticker(
     request: TickerRequest,
     current_user: models.User = Depends(auth.get_current_user)
 ):
+    """
+    Queues a 10-K download + ingest and returns right away.
+    Poll GET /api/ingest/{job_id} for progress.
+    """
     ticker = request.ticker.upper()
     print(f"User {current_user.email} requested 10-K for {ticker}")
 
-    try:
-        num_chunks = download_and_ingest_10k(ticker)
-        return {"status": "success", "ticker": ticker, "chunks_added": num_chunks}
-    except Exception as e:
-        print(f"❌ Error ingesting {ticker}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    job, created = ingest_queue.submit(ticker)
+    return {"job_id": job.id, "ticker": job.ticker, "status": job.status, "deduplicated": not created}
+
+@app.get("/api/ingest/{job_id}")
+def get_ingest_status(
+    job_id: str,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    job = ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job.to_dict()
     
 if os.path.exists("app/static"):
     build_dir = "app/static"
@@ -0,0 +1,32 @@
+from sqlalchemy import inspect, text
+
+from app import models
+
+# Columns added after the first release: (table, column, DDL type)
+_ADDED_COLUMNS = [
+    ("messages", "conversation_id", "INTEGER REFERENCES conversations(id)"),
+]
+
+def run_migrations(engine):
+    """
+    Brings an existing database up to the current models. create_all() only
+    creates missing tables, so new columns and indexes on old tables are added
+    here. Safe to run on every startup: each step checks before it changes anything.
+    """
+    models.Base.metadata.create_all(bind=engine)
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, column, ddl in _ADDED_COLUMNS:
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column not in existing:
+                print(f"🛠️  Migrating: adding {table}.{column}")
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+    for table in (models.Message.__table__, models.Conversation.__table__, models.RiskDigest.__table__):
+        existing = {ix["name"] for ix in inspect(engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                # On a big Postgres table, build this by hand with CREATE INDEX CONCURRENTLY first
+                print(f"🛠️  Migrating: creating index {index.name}")
+                index.create(bind=engine, checkfirst=True)
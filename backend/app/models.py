@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, Text, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -14,6 +14,27 @@ class User(Base):
     # 🔗 RELATIONSHIP: One User has Many Messages
     # 'back_populates' creates a virtual link so we can access user.messages
     messages = relationship("Message", back_populates="owner")
+    conversations = relationship("Conversation", back_populates="owner")
+
+class Conversation(Base):
+    """
+    A chat session: groups messages so the UI can load one thread at a time.
+    """
+    __tablename__ = "conversations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    title = Column(String, default="New analysis")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow) # bumped on every new message
+
+    owner = relationship("User", back_populates="conversations")
+    messages = relationship("Message", back_populates="conversation")
+
+    # "My latest conversations" is one index range scan, no sort
+    __table_args__ = (
+        Index("ix_conversations_user_updated", "user_id", "updated_at", "id"),
+    )
 
 class Message(Base):
     __tablename__ = "messages"
@@ -25,6 +46,67 @@ class Message(Base):
     role = Column(String) # "user" or "assistant"
     content = Column(Text) # We use Text instead of String for long paragraphs
     timestamp = Column(DateTime, default=datetime.utcnow) # Auto-timestamp
+    # Optional: messages sent before conversations existed have none
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=True)
     
     # Link back to the User
-    owner = relationship("User", back_populates="messages")
\ No newline at end of file
+    owner = relationship("User", back_populates="messages")
+    conversation = relationship("Conversation", back_populates="messages")
+
+    # History pages are keyset scans over these: WHERE user_id = ? AND
+    # (timestamp, id) < cursor ORDER BY timestamp DESC, id DESC LIMIT n
+    __table_args__ = (
+        Index("ix_messages_user_ts_id", "user_id", "timestamp", "id"),
+        Index("ix_messages_conversation_ts_id", "conversation_id", "timestamp", "id"),
+    )
+
+class RiskDigest(Base):
+    """
+    Precomputed Item 1A digest of one filing (see services/risk_digest.py):
+    built in the background after ingestion so common "what are the key
+    risks" questions don't need retrieval plus a full generation.
+    """
+    __tablename__ = "risk_digests"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ticker = Column(String, nullable=False)
+    accession = Column(String, unique=True, nullable=False)
+    fiscal_year = Column(Integer, nullable=True)
+    # JSON columns (Text, so SQLite and Postgres store them the same way)
+    categories = Column(Text) # {category: number of risk headings}
+    top_risks = Column(Text) # [{"heading", "category", "chunk_ids"}], in filing order
+    headings = Column(Text) # every risk heading found in Item 1A
+    added_headings = Column(Text) # vs. the prior-year digest (compared_to)
+    removed_headings = Column(Text)
+    compared_to = Column(String, nullable=True) # accession of that prior-year filing
+    summary = Column(Text, nullable=True) # LLM overview; None when no model was available
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # "Latest digest for a ticker" and "digest for ticker + year"
+    __table_args__ = (
+        Index("ix_risk_digests_ticker_year", "ticker", "fiscal_year"),
+    )
+
+class IngestJobRecord(Base):
+    """
+    Ingestion job status shared by every uvicorn worker (see services/ingest_jobs.py):
+    any worker can answer GET /api/ingest/{job_id}, and at most one job per
+    ticker is active across all of them.
+    """
+    __tablename__ = "ingest_jobs"
+
+    id = Column(String, primary_key=True)
+    ticker = Column(String, nullable=False, index=True)
+    # The ticker while the job is queued or running, NULL once it finished.
+    # Unique, so a second worker can't start the same ticker (NULLs never collide).
+    active_ticker = Column(String, unique=True, nullable=True)
+    status = Column(String, nullable=False)
+    stage = Column(String, nullable=False)
+    chunks_done = Column(Integer, default=0)
+    chunks_total = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    # Epoch seconds, like IngestJob; updated_at doubles as the worker's heartbeat
+    created_at = Column(Float, nullable=False)
+    started_at = Column(Float, nullable=True)
+    finished_at = Column(Float, nullable=True)
+    updated_at = Column(Float, nullable=False)
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# --- CONFIGURATION ---
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # seconds
+# Cosine similarity above which a different question counts as a hit (off by default)
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0") or 0) or None
+
+_non_word = re.compile(r"[^\w\s]")
+_spaces = re.compile(r"\s+")
+
+def normalize_question(question: str) -> str:
+    """
+    "  What are the China risks?" and "what are the china risks" share a cache slot.
+    """
+    question = _non_word.sub(" ", question.lower())
+    return _spaces.sub(" ", question).strip()
+
+class AnswerCache:
+    """
+    Bounded LRU + TTL cache of final answers, keyed on the normalized question,
+    the retrieval scope (ticker/year/item filters) and the corpus version
+    (so any ingest invalidates everything at once).
+    Concurrent identical questions share one upstream computation.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl_seconds=ANSWER_CACHE_TTL,
+                 similarity_threshold=ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()  # key -> (expires_at, answer, unit vector or None)
+        self._in_flight = {}  # key -> asyncio.Task
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(question: str, corpus_version: int, scope=None):
+        return (normalize_question(question), corpus_version, tuple(sorted((scope or {}).items())))
+
+    def get(self, question: str, corpus_version: int, scope=None):
+        key = self._key(question, corpus_version, scope)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            return None
+
+    def get_similar(self, query_vector, corpus_version: int, scope=None):
+        """
+        Best cached answer whose question embedding is within the similarity threshold.
+        """
+        if not self.similarity_threshold or query_vector is None:
+            return None
+        query = _unit(query_vector)
+        scope_key = self._key("", corpus_version, scope)[1:]
+        now = time.monotonic()
+        best_key, best_score = None, self.similarity_threshold
+        with self._lock:
+            for key, (expires_at, _, vector) in self._entries.items():
+                if key[1:] != scope_key or vector is None or expires_at <= now:
+                    continue
+                score = float(np.dot(query, vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self.similar_hits += 1
+            return self._entries[best_key][1]
+
+    def put(self, question: str, corpus_version: int, answer: str, query_vector=None, scope=None):
+        key = self._key(question, corpus_version, scope)
+        vector = _unit(query_vector) if query_vector is not None else None
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, answer, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def get_or_compute(self, question: str, corpus_version: int, compute, query_vector=None, scope=None):
+        """
+        Returns the cached answer, or runs compute() once for all concurrent callers
+        asking the same question. Answers starting with "Error" are not cached.
+        """
+        cached = self.get(question, corpus_version, scope)
+        if cached is not None:
+            return cached
+        cached = self.get_similar(query_vector, corpus_version, scope)
+        if cached is not None:
+            return cached
+
+        key = self._key(question, corpus_version, scope)
+        task = self._in_flight.get(key)
+        if task is None:
+            with self._lock:
+                self.misses += 1
+
+            async def run():
+                answer = await compute()
+                if not answer.startswith("Error"):
+                    self.put(question, corpus_version, answer, query_vector, scope)
+                return answer
+
+            # A separate task, so one caller disconnecting doesn't cancel the others
+            task = asyncio.ensure_future(run())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            with self._lock:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "in_flight": len(self._in_flight),
+            }
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+# Process-wide cache used by the RAG engine
+answer_cache = AnswerCache()
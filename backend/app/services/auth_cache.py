@@ -0,0 +1,152 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+# --- CONFIGURATION ---
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+# Seconds a resolved user is trusted. This is the staleness bound: a user changed or
+# deleted by another worker, a bulk UPDATE or raw SQL (which skip the ORM events in
+# auth.py) keeps authenticating with their old row for at most this long.
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+GOOGLE_CERTS_REFRESH_AHEAD = float(os.getenv("GOOGLE_CERTS_REFRESH_AHEAD", "300"))  # seconds before expiry
+GOOGLE_CERTS_DEFAULT_MAX_AGE = 3600
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+class PrincipalCache:
+    """
+    Bounded LRU + TTL map of bearer token -> User, so an authenticated request
+    doesn't need a JWT decode and a DB round trip every time.
+    An entry never outlives its token's exp. invalidate_user() drops every
+    token of a user (hooked to User updates/deletes in auth.py); it only
+    sees ORM changes made by this process, so ttl_seconds bounds the rest.
+    """
+
+    def __init__(self, max_entries=AUTH_CACHE_SIZE, ttl_seconds=AUTH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # token -> (expires_at, user)
+        self._tokens_by_email = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[0] > time.time():
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._drop(token)
+            self.misses += 1
+            return None
+
+    def put(self, token: str, user, token_expires_at: float = None):
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            self._drop(token)
+            self._entries[token] = (expires_at, user)
+            self._tokens_by_email.setdefault(user.email, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, email: str):
+        with self._lock:
+            for token in list(self._tokens_by_email.get(email, ())):
+                self._drop(token)
+
+    def _drop(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            tokens = self._tokens_by_email.get(entry[1].email)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_email[entry[1].email]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_email.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+_max_age = re.compile(r"max-age=(\d+)")
+
+class GoogleCertStore:
+    """
+    Google's ID-token signing certificates, fetched once and reused until the
+    Cache-Control max-age runs out. Inside the last refresh_ahead seconds a
+    background refresh starts while callers keep using the current certs,
+    so sign-ins only ever wait on Google for the very first fetch.
+    """
+
+    def __init__(self, url=GOOGLE_CERTS_URL, refresh_ahead=GOOGLE_CERTS_REFRESH_AHEAD, timeout=5):
+        self.url = url
+        self.refresh_ahead = refresh_ahead
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._certs = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._fetched_at = 0.0
+        self.fetches = 0
+
+    def _fetch(self):
+        response = self._session.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        match = _max_age.search(response.headers.get("Cache-Control", ""))
+        max_age = int(match.group(1)) if match else GOOGLE_CERTS_DEFAULT_MAX_AGE
+        self._certs = response.json()
+        self._expires_at = time.time() + max_age
+        self._fetched_at = time.time()
+        self.fetches += 1
+
+    def _refresh_in_background(self):
+        try:
+            with self._lock:
+                self._fetch()
+        except Exception as e:
+            print(f"⚠️  Google cert refresh failed, keeping current certs: {e}")
+        finally:
+            self._refreshing = False
+
+    def get(self):
+        now = time.time()
+        if self._certs is None or now >= self._expires_at:
+            with self._lock:
+                if self._certs is None or time.time() >= self._expires_at:
+                    self._fetch()
+        elif now >= self._expires_at - self.refresh_ahead and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+        return self._certs
+
+    def verify(self, token: str, audience: str):
+        """
+        Verifies signature, expiry, audience and issuer; returns the claims.
+        """
+        from google.auth import jwt as google_jwt  # only Google sign-ins need it
+
+        certs = self.get()
+        key_id = google_jwt.decode_header(token).get("kid")
+        if key_id not in certs and time.time() - self._fetched_at > 30:
+            # Google rotated keys before our copy expired; refetch (at most every 30s)
+            with self._lock:
+                self._fetch()
+            certs = self._certs
+        claims = google_jwt.decode(token, certs=certs, audience=audience)
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {claims.get('iss')}")
+        return claims
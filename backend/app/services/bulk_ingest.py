@@ -0,0 +1,261 @@
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from pathlib import Path
+
+from app.services.edgar_parser import parse_filing, fiscal_year
+from app.services.filing_store import FilingStore, get_filing_store, SEC_COMPANY, SEC_EMAIL
+from app.services.metrics import INGEST_CHUNKS, INGEST_SECONDS
+
+# --- CONFIGURATION ---
+BULK_DOWNLOAD_WORKERS = int(os.getenv("BULK_DOWNLOAD_WORKERS", "4"))
+BULK_PARSE_WORKERS = int(os.getenv("BULK_PARSE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# With VECTOR_INDEX_ROOT set every publish copies the index, so publish once per this many filings
+BULK_PUBLISH_EVERY = int(os.getenv("BULK_PUBLISH_EVERY", "25"))
+
+def read_ticker_file(path: str):
+    """
+    One ticker per line (commas also work); blank lines and # comments are ignored.
+    """
+    tickers = []
+    for line in Path(path).read_text().splitlines():
+        line = line.split("#", 1)[0]
+        for ticker in line.replace(",", " ").split():
+            if ticker.upper() not in tickers:
+                tickers.append(ticker.upper())
+    return tickers
+
+class Checkpoint:
+    """
+    Per-filing progress in a small JSON file, rewritten atomically after every
+    filing. A rerun skips filings marked done (or out of range) and retries the rest;
+    a filing interrupted half-way is cheap to redo because sync_documents is idempotent.
+    """
+
+    FINISHED = ("done", "skipped")
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.filings = {}  # accession -> {"ticker", "status", ...}
+        if self.path.exists():
+            self.filings = json.loads(self.path.read_text()).get("filings", {})
+
+    def finished(self, accession: str):
+        entry = self.filings.get(accession)
+        return entry is not None and entry["status"] in self.FINISHED
+
+    def finished_for(self, ticker: str):
+        return {acc for acc, entry in self.filings.items() if entry["ticker"] == ticker and self.finished(acc)}
+
+    def mark(self, accession: str, ticker: str, status: str, **details):
+        with self._lock:
+            self.filings[accession] = {"ticker": ticker, "status": status, **details}
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps({"filings": self.filings}, indent=1))
+            os.replace(tmp, self.path)
+
+class StageStats:
+    """
+    Wall time and throughput for one pipeline stage.
+    """
+
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.units = 0
+        self.busy = 0.0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, started: float, units: int = 0):
+        now = time.perf_counter()
+        with self._lock:
+            self.items += 1
+            self.units += units
+            self.busy += now - started
+            self.started = started if self.started is None else min(self.started, started)
+            self.finished = now if self.finished is None else max(self.finished, now)
+        INGEST_SECONDS.observe(now - started, stage=self.name)
+        if self.unit == "chunks":
+            INGEST_CHUNKS.inc(units, stage=self.name)
+
+    @property
+    def wall(self):
+        return (self.finished - self.started) if self.started is not None else 0.0
+
+    def to_dict(self):
+        return {
+            "items": self.items, self.unit: self.units, "wall_seconds": round(self.wall, 3),
+            "busy_seconds": round(self.busy, 3),
+            f"{self.unit}_per_sec": round(self.units / self.wall, 2) if self.wall else None,
+        }
+
+    def summary(self):
+        rate = f"{self.units / self.wall:.1f} {self.unit}/s" if self.wall else "n/a"
+        return f"📊 {self.name:<9} {self.items:>6} items {self.units:>8} {self.unit:<8} {self.wall:>8.1f}s  ({rate})"
+
+def _parse_job(ticker, path, from_year, to_year):
+    # Runs in a worker process; the timing is the parse cost, not the queueing
+    started = time.perf_counter()
+    metadata, chunks = parse_filing(path, from_year, to_year)
+    return ticker, path, metadata, chunks, time.perf_counter() - started
+
+def run_bulk_ingest(tickers, from_year: int, to_year: int, checkpoint_path, download_dir=".",
+                    downloader=None, store=None, download_workers: int = BULK_DOWNLOAD_WORKERS,
+                    parse_workers: int = BULK_PARSE_WORKERS, filings: FilingStore = None):
+    """
+    Downloads, parses and embeds every 10-K for tickers with fiscal years in
+    [from_year, to_year], as three overlapping stages:
+      download - threads; sec-edgar-downloader throttles every SEC request in the
+                 process to 10/s, so more threads never exceed the fair-access limit
+      parse    - a process pool (HTML parsing is CPU bound), at most 2 filings
+                 per worker parsed ahead of the embedder
+      embed    - sync_documents on this thread, which batches and parallelizes
+                 the embedding calls through the shared rate-limited embedder
+    store(chunks, scope) defaults to vector_store.sync_documents; its writes are
+    then published every BULK_PUBLISH_EVERY filings and only published filings
+    are marked done.
+    Downloads are moved into the filing store (gzipped) as they land, and
+    accessions it already holds are not downloaded again.
+    Returns per-stage stats.
+    """
+    if downloader is None:
+        from sec_edgar_downloader import Downloader
+        downloader = Downloader(SEC_COMPANY, SEC_EMAIL, download_dir)
+    filings = filings or get_filing_store()
+    publish_every = 0
+    if store is None:
+        from app.services.vector_store import sync_documents as store, publishing
+        publish_every = BULK_PUBLISH_EVERY
+
+    checkpoint = Checkpoint(checkpoint_path)
+    stats = {
+        "download": StageStats("download", "filings"),
+        "parse": StageStats("parse", "chunks"),
+        "embed": StageStats("embed", "chunks"),
+    }
+    failures = []
+    batch = ExitStack()
+    unpublished = []  # checkpoint marks waiting for the next publish
+
+    def open_batch():
+        if publish_every:
+            batch.enter_context(publishing())
+
+    def publish_batch(reopen=True):
+        batch.close()
+        for accession, ticker, details in unpublished:
+            checkpoint.mark(accession, ticker, "done", **details)
+        unpublished.clear()
+        if reopen:
+            open_batch()
+
+    def download(ticker):
+        started = time.perf_counter()
+        # Filing dates, not fiscal years: a FY2023 10-K can be filed well into 2024.
+        # Anything outside the fiscal range is dropped at parse time.
+        downloader.get("10-K", ticker, after=f"{from_year}-01-01", before=f"{to_year + 1}-12-31",
+                       accession_numbers_to_skip=checkpoint.finished_for(ticker) | filings.accessions(ticker))
+        adopted = filings.adopt(download_dir, ticker)
+        stats["download"].record(started, units=len(adopted))
+        # Stored earlier but never finished (e.g. embedding failed): retried from disk
+        return filings.filings(ticker)
+
+    def store_parsed(future):
+        try:
+            ticker, path, metadata, chunks, parse_seconds = future.result()
+        except Exception as e:
+            print(f"❌ Parse failed: {e}")
+            failures.append(str(e))
+            return
+        accession = metadata["accession"]
+        # The worker timed the parse itself; count it as ending now
+        stats["parse"].record(time.perf_counter() - parse_seconds, units=len(chunks or []))
+        if chunks is None:
+            checkpoint.mark(accession, ticker, "skipped", reason="fiscal year out of range")
+            return
+        started = time.perf_counter()
+        try:
+            result = store(chunks, scope={"ticker": ticker, "accession": accession})
+        except Exception as e:
+            print(f"❌ Embedding failed for {ticker} {accession}: {e}")
+            checkpoint.mark(accession, ticker, "failed", error=str(e))
+            failures.append(f"{ticker} {accession}: {e}")
+            return
+        stats["embed"].record(started, units=result["total"])
+        details = {"fiscal_year": fiscal_year(metadata.get("period")),
+                   "chunks": result["total"], "added": result["added"]}
+        print(f"✅ {ticker} {accession}: {result['added']} new / {result['total']} chunks")
+        if not publish_every:
+            checkpoint.mark(accession, ticker, "done", **details)
+            return
+        unpublished.append((accession, ticker, details))
+        if len(unpublished) >= publish_every:
+            publish_batch()
+
+    # spawn, not fork: the download threads are already running when workers start
+    parse_pool = ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn"))
+    open_batch()
+    with batch, ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="sec-download") as download_pool, \
+            parse_pool:
+        downloads = {download_pool.submit(download, ticker): ticker for ticker in tickers}
+        pending = set()
+        for finished_download in as_completed(downloads):
+            ticker = downloads[finished_download]
+            try:
+                stored = finished_download.result()
+            except Exception as e:
+                print(f"❌ Download failed for {ticker}: {e}")
+                failures.append(f"{ticker}: {e}")
+                continue
+            for filing in stored:
+                if checkpoint.finished(filing["accession"]):
+                    continue
+                pending.add(parse_pool.submit(_parse_job, ticker, filing["path"], from_year, to_year))
+                while len(pending) >= parse_workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        store_parsed(future)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                store_parsed(future)
+        publish_batch(reopen=False)
+
+    for stage in stats.values():
+        print(stage.summary())
+    return {"stages": {name: stage.to_dict() for name, stage in stats.items()}, "failures": failures}
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Backfill 10-K filings for many tickers and years.",
+        epilog="Example: python -m app.services.bulk_ingest --tickers sp500.txt --from-year 2019 --to-year 2023",
+    )
+    parser.add_argument("--tickers", required=True, help="file with one ticker per line")
+    parser.add_argument("--from-year", type=int, required=True, help="first fiscal year")
+    parser.add_argument("--to-year", type=int, required=True, help="last fiscal year")
+    parser.add_argument("--checkpoint", default="bulk_ingest_checkpoint.json")
+    parser.add_argument("--download-dir", default=".")
+    parser.add_argument("--download-workers", type=int, default=BULK_DOWNLOAD_WORKERS)
+    parser.add_argument("--parse-workers", type=int, default=BULK_PARSE_WORKERS)
+    args = parser.parse_args()
+
+    tickers = read_ticker_file(args.tickers)
+    print(f"🚀 Bulk ingest: {len(tickers)} tickers, FY{args.from_year}-FY{args.to_year}")
+    result = run_bulk_ingest(
+        tickers, args.from_year, args.to_year, args.checkpoint, download_dir=args.download_dir,
+        download_workers=args.download_workers, parse_workers=args.parse_workers,
+    )
+    if result["failures"]:
+        print(f"⚠️  {len(result['failures'])} failures; rerun the same command to retry them")
+
+if __name__ == "__main__":
+    main()
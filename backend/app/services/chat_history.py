@@ -0,0 +1,84 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from app import models
+
+# --- CONFIGURATION ---
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """
+    Opaque keyset cursor: the (timestamp, id) of the last row on a page.
+    """
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+
+def _page_size(limit):
+    return max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+def _before(query, ts_column, id_column, before):
+    if not before:
+        return query
+    timestamp, row_id = decode_cursor(before)
+    return query.filter(or_(ts_column < timestamp, and_(ts_column == timestamp, id_column < row_id)))
+
+def fetch_messages(db, user_id: int, before: str = None, limit: int = None, conversation_id: int = None):
+    """
+    One page of a user's messages, newest page first, messages within the page
+    in chronological order. Returns (messages, next_cursor); next_cursor is
+    None on the oldest page.
+    Every page is an index range scan on (user_id, timestamp, id) (or the
+    conversation index), so the cost doesn't grow with the length of the history.
+    """
+    limit = _page_size(limit)
+    Message = models.Message
+    query = db.query(Message).filter(Message.user_id == user_id)
+    if conversation_id is not None:
+        query = query.filter(Message.conversation_id == conversation_id)
+    query = _before(query, Message.timestamp, Message.id, before)
+    # One extra row tells us whether an older page exists
+    rows = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1].timestamp, rows[limit - 1].id) if len(rows) > limit else None
+    return list(reversed(rows[:limit])), next_cursor
+
+def fetch_conversations(db, user_id: int, before: str = None, limit: int = None):
+    """
+    Most recently active conversations first; same (rows, next_cursor) contract.
+    Best effort while paging: updated_at moves on every new message, so a
+    conversation that becomes active after page 1 was served jumps to the top
+    and is not repeated on later pages, and one that was still unseen is
+    skipped until the list is reloaded from the first page. Nothing shows up twice.
+    """
+    limit = _page_size(limit)
+    Conversation = models.Conversation
+    query = db.query(Conversation).filter(Conversation.user_id == user_id)
+    query = _before(query, Conversation.updated_at, Conversation.id, before)
+    rows = query.order_by(Conversation.updated_at.desc(), Conversation.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1].updated_at, rows[limit - 1].id) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def get_conversation(db, user_id: int, conversation_id: int):
+    return db.query(models.Conversation)\
+        .filter(models.Conversation.id == conversation_id, models.Conversation.user_id == user_id)\
+        .first()
+
+def create_conversation(db, user_id: int, title: str = None):
+    conversation = models.Conversation(user_id=user_id, title=title or "New analysis")
+    db.add(conversation)
+    db.commit()
+    db.refresh(conversation)
+    return conversation
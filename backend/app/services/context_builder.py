@@ -0,0 +1,140 @@
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+import numpy as np
+from langchain_core.documents import Document
+
+# --- CONFIGURATION ---
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "12"))  # chunks retrieved before selection
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1 = pure relevance, 0 = pure diversity
+CHARS_PER_TOKEN = 4     # good enough for English prose; budgets should leave some headroom
+MIN_OVERLAP = 30        # shortest shared prefix/suffix (chars) we treat as chunk overlap
+MAX_OVERLAP = 1000
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def merge_overlap(first: str, second: str):
+    """
+    Joins two chunks when one continues the other: the splitter repeats the
+    tail of a chunk (chunk_overlap) at the start of the next one.
+    Returns the merged text, or None if they don't overlap.
+    """
+    if second in first:
+        return first
+    if first in second:
+        return second
+    for a, b in ((first, second), (second, first)):
+        for length in range(min(len(a), len(b), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+            if a.endswith(b[:length]):
+                return a + b[length:]
+    return None
+
+_words = re.compile(r"\w+")
+
+def _jaccard_matrix(docs):
+    sets = [set(_words.findall(doc.page_content.lower())) for doc in docs]
+    return np.array([[len(a & b) / (len(a | b) or 1) for b in sets] for a in sets])
+
+def _cosine_matrix(vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1, norms)
+    return matrix @ matrix.T
+
+def mmr_order(docs, vectors=None, lambda_: float = MMR_LAMBDA):
+    """
+    Maximal marginal relevance over docs in retrieval order.
+    Relevance comes from the rank (retrieval already fused dense + BM25
+    scores); redundancy is the cosine similarity of the stored chunk vectors,
+    or word-set overlap when we don't have vectors for every doc.
+    Returns indices, best first.
+    """
+    n = len(docs)
+    if n == 0:
+        return []
+    relevance = 1.0 - np.arange(n) / n
+    have_vectors = vectors is not None and all(v is not None for v in vectors)
+    similarity = _cosine_matrix(vectors) if have_vectors else _jaccard_matrix(docs)
+
+    chosen, remaining = [], list(range(n))
+    while remaining:
+        if chosen:
+            redundancy = similarity[np.ix_(remaining, chosen)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = lambda_ * relevance[remaining] - (1 - lambda_) * redundancy
+        best = remaining[int(np.argmax(scores))]
+        chosen.append(best)
+        remaining.remove(best)
+    return chosen
+
+@dataclass
+class ContextPack:
+    passages: List[Document] = field(default_factory=list)
+    tokens: int = 0
+    budget: int = 0
+    candidates: int = 0
+    merged: int = 0
+    dropped: int = 0
+
+    def stats(self):
+        return {
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "candidates": self.candidates,
+            "passages": len(self.passages),
+            "merged": self.merged,
+            "dropped": self.dropped,
+        }
+
+def _group(doc):
+    meta = doc.metadata
+    return (meta.get("accession") or meta.get("source"), meta.get("item"))
+
+def pack_context(docs, budget: int, vectors=None, render=lambda doc: doc.page_content,
+                 lambda_: float = MMR_LAMBDA):
+    """
+    Picks passages for the prompt: MMR order, chunks that overlap an already
+    picked chunk of the same filing section are merged into it (we only pay
+    for the new text), and we stop adding once budget tokens are used.
+    render(doc) is the text as it will appear in the prompt (label included).
+    """
+    pack = ContextPack(budget=budget, candidates=len(docs))
+    costs = []
+    for index in mmr_order(docs, vectors, lambda_):
+        doc = docs[index]
+        for slot, picked in enumerate(pack.passages):
+            if _group(picked) != _group(doc):
+                continue
+            merged = merge_overlap(picked.page_content, doc.page_content)
+            if merged is None:
+                continue
+            candidate = Document(page_content=merged, metadata=picked.metadata)
+            cost = estimate_tokens(render(candidate))
+            if pack.tokens - costs[slot] + cost <= budget:
+                pack.tokens += cost - costs[slot]
+                pack.passages[slot], costs[slot] = candidate, cost
+                pack.merged += 1
+            else:
+                pack.dropped += 1
+            break
+        else:
+            cost = estimate_tokens(render(doc))
+            if pack.tokens + cost <= budget:
+                pack.passages.append(doc)
+                costs.append(cost)
+                pack.tokens += cost
+            elif not pack.passages:
+                # Never send an empty context: cut the best chunk down to the budget
+                text = doc.page_content[:max(0, budget * CHARS_PER_TOKEN - (len(render(doc)) - len(doc.page_content)))]
+                doc = Document(page_content=text, metadata=doc.metadata)
+                pack.passages.append(doc)
+                costs.append(estimate_tokens(render(doc)))
+                pack.tokens += costs[-1]
+            else:
+                pack.dropped += 1
+    return pack
@@ -0,0 +1,303 @@
+import glob
+import gzip
+import re
+from html.parser import HTMLParser
+from pathlib import Path
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# --- CONFIGURATION ---
+# Only these <DOCUMENT> types are parsed; exhibits, XBRL and graphics are skipped
+DEFAULT_KEEP_TYPES = ("10-K",)
+READ_SIZE = 1 << 16     # max characters read per line fragment
+SPLIT_EVERY = 50_000    # characters of text buffered before we cut chunks
+FILING_CHUNK_SIZE = 2000     # 10-Ks are dense, so larger chunks
+FILING_CHUNK_OVERLAP = 200
+
+# SEC header fields we copy onto every chunk of a filing
+_HEADER_FIELDS = {
+    "ACCESSION NUMBER:": "accession",
+    "CONFORMED SUBMISSION TYPE:": "form",
+    "CONFORMED PERIOD OF REPORT:": "period",
+    "FILED AS OF DATE:": "filed",
+}
+
+def open_filing(path):
+    """
+    Text handle on a filing; the filing store keeps them gzipped (*.gz).
+    """
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="ignore")
+    return open(path, encoding="utf-8", errors="ignore")
+
+def filing_suffix(path) -> str:
+    path = Path(path)
+    return (path.with_suffix("") if path.suffix == ".gz" else path).suffix.lower()
+
+def read_filing_metadata(path: str):
+    """
+    Reads accession number, form, period and filing date from the
+    <SEC-HEADER> of a full-submission file, without loading the rest.
+    """
+    metadata = {}
+    with open_filing(path) as f:
+        for line_number, line in enumerate(f):
+            line = line.strip()
+            for prefix, key in _HEADER_FIELDS.items():
+                if line.startswith(prefix) and key not in metadata:
+                    metadata[key] = line[len(prefix):].strip()
+            if line.startswith("</SEC-HEADER>") or line_number > 500:
+                break
+    # sec-edgar-downloader names the folder after the accession number
+    metadata.setdefault("accession", Path(path).parent.name)
+    metadata.setdefault("form", "10-K")
+    return metadata
+
+def filing_text_splitter():
+    return RecursiveCharacterTextSplitter(chunk_size=FILING_CHUNK_SIZE, chunk_overlap=FILING_CHUNK_OVERLAP)
+
+def find_filings(download_dir, ticker: str, form: str = "10-K"):
+    """
+    Full-submission files sec-edgar-downloader saved for a ticker, sorted by path
+    (i.e. by accession). Falls back to .html primary documents.
+    """
+    base = Path(download_dir) / "sec-edgar-filings" / ticker / form
+    files = glob.glob(str(base / "**" / "*.txt"), recursive=True)  # Modern filings are often .txt (HTML inside)
+    if not files:
+        files = glob.glob(str(base / "**" / "*.html"), recursive=True)
+    return sorted(files)
+
+def _read_fragments(f):
+    """
+    Yields (fragment, at_line_start). Lines longer than READ_SIZE (whole
+    HTML documents on one line are common) come out in several pieces.
+    """
+    at_line_start = True
+    while True:
+        fragment = f.readline(READ_SIZE)
+        if not fragment:
+            return
+        yield fragment, at_line_start
+        at_line_start = fragment.endswith("\n")
+
+def iter_submission_documents(path: str, keep_types=DEFAULT_KEEP_TYPES):
+    """
+    Walks a full-submission .txt file and yields (header, fragments) for
+    each <DOCUMENT> whose <TYPE> is in keep_types. fragments is a generator
+    over the raw <TEXT> body; it must be consumed before the next document.
+    Documents we don't keep are skipped without being buffered.
+    """
+    keep_types = {t.upper() for t in keep_types}
+    with open_filing(path) as f:
+        fragments = _read_fragments(f)
+        if filing_suffix(path) in (".htm", ".html"):
+            # A bare primary document, not a full submission: it's all one document
+            yield {"type": next(iter(keep_types)), "filename": Path(path).name}, (frag for frag, _ in fragments)
+            return
+        header = None
+        for fragment, at_line_start in fragments:
+            if not at_line_start:
+                continue
+            line = fragment.strip()
+            if line == "<DOCUMENT>":
+                header = {}
+            elif header is not None and line.startswith("<") and not line.startswith("<TEXT>"):
+                match = re.match(r"<(TYPE|SEQUENCE|FILENAME|DESCRIPTION)>(.*)", line)
+                if match:
+                    header[match.group(1).lower()] = match.group(2).strip()
+            elif header is not None and line.startswith("<TEXT>"):
+                if header.get("type", "").upper() in keep_types:
+                    yield header, _text_body(fragments)
+                else:
+                    _skip_body(fragments)
+                header = None
+
+def _text_body(fragments):
+    for fragment, at_line_start in fragments:
+        if at_line_start and fragment.startswith("</TEXT>"):
+            return
+        yield fragment
+
+def _skip_body(fragments):
+    for fragment, at_line_start in fragments:
+        if at_line_start and fragment.startswith("</TEXT>"):
+            return
+
+class _TextExtractor(HTMLParser):
+    """
+    Incremental HTML -> text. feed() a fragment, then drain() what it produced.
+    """
+
+    _BLOCK_TAGS = {"p", "div", "br", "tr", "li", "table", "h1", "h2", "h3", "h4", "h5", "h6", "title"}
+    # Hidden inline-XBRL facts, scripts and styles never reach the reader
+    _SKIP_TAGS = {"script", "style", "head", "ix:header"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self._BLOCK_TAGS:
+            self._parts.append("\n")
+        elif tag in ("td", "th"):
+            self._parts.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self._BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._parts.append(data)
+
+    def drain(self):
+        text = "".join(self._parts)
+        self._parts = []
+        return text
+
+_spaces = re.compile(r"[ \t\xa0​]+")
+_blank_lines = re.compile(r"\n\s*\n\s*\n+")
+
+def _clean(text: str) -> str:
+    text = _spaces.sub(" ", text)
+    return _blank_lines.sub("\n\n", text)
+
+def iter_document_text(fragments):
+    """
+    Converts a document body to plain text as it streams in.
+    Plain-text (pre-HTML era) bodies pass through unchanged.
+    """
+    extractor = None
+    for fragment in fragments:
+        if extractor is None:
+            if not fragment.strip():
+                continue
+            if not fragment.lstrip().startswith("<"):
+                extractor = False  # plain-text document
+            else:
+                extractor = _TextExtractor()
+        if extractor is False:
+            yield fragment
+            continue
+        extractor.feed(fragment)
+        text = extractor.drain()
+        if text:
+            yield text
+    if extractor:
+        extractor.close()
+        text = extractor.drain()
+        if text:
+            yield text
+
+# "Item 1A. Risk Factors", "ITEM 7 - MANAGEMENT'S DISCUSSION ...", "Item 9A."
+_ITEM_HEADING = re.compile(r"^\s*item\s+(\d{1,2}[a-d]?)\b\s*[\.:\-–—]?\s*(.*)$", re.IGNORECASE)
+MAX_HEADING_LENGTH = 200
+
+def match_item_heading(line: str):
+    """
+    Returns the normalized item number ("1A", "7") if line is a 10-K Item heading.
+    """
+    if len(line) > MAX_HEADING_LENGTH:
+        return None
+    match = _ITEM_HEADING.match(line)
+    return match.group(1).upper() if match else None
+
+def _iter_lines(texts):
+    # Re-cut streamed text on newlines; very long lines are passed on in pieces
+    pending = ""
+    for text in texts:
+        pending += text
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+        if len(pending) >= SPLIT_EVERY:
+            yield pending
+            pending = ""
+    if pending:
+        yield pending
+
+class _SectionChunker:
+    """
+    Buffers one 10-K Item at a time and cuts it into chunks tagged with that
+    item, so no chunk straddles two sections.
+    """
+
+    def __init__(self, text_splitter, metadata):
+        self.text_splitter = text_splitter
+        self.metadata = metadata
+        self.item = None
+        self.parts, self.size = [], 0
+
+    def feed(self, line):
+        item = match_item_heading(line)
+        if item:
+            yield from self.flush()
+            self.item = item
+        self.parts.append(line)
+        self.size += len(line)
+        if self.size >= SPLIT_EVERY:
+            cleaned = _clean("".join(self.parts))
+            chunks = self.text_splitter.split_text(cleaned)
+            # Keep the trailing whitespace, or the carried chunk glues onto the next word
+            carry = (chunks.pop() if chunks else "") + cleaned[len(cleaned.rstrip()):]
+            self.parts, self.size = [carry], len(carry)
+            yield from self._documents(chunks)
+
+    def flush(self):
+        chunks = self.text_splitter.split_text(_clean("".join(self.parts)))
+        self.parts, self.size = [], 0
+        yield from self._documents(chunks)
+
+    def _documents(self, chunks):
+        metadata = dict(self.metadata)
+        if self.item:
+            metadata["item"] = self.item
+        for chunk in chunks:
+            yield Document(page_content=chunk, metadata=dict(metadata))
+
+def fiscal_year(period: str):
+    """
+    "20230930" -> 2023. The CONFORMED PERIOD OF REPORT is the fiscal year end.
+    """
+    return int(period[:4]) if period and period[:4].isdigit() else None
+
+def iter_filing_chunks(path: str, text_splitter, metadata: dict = None, keep_types=DEFAULT_KEEP_TYPES):
+    """
+    Streams chunks (Documents) out of a full-submission file.
+    Text is buffered only up to SPLIT_EVERY characters before being cut,
+    so memory stays flat no matter how large the filing or its exhibits are.
+    Chunks never cross a 10-K Item boundary and carry the item number
+    ("1A", "7", ...) and fiscal year, so retrieval can be scoped to them.
+    """
+    metadata = dict(metadata or {})
+    year = fiscal_year(metadata.get("period"))
+    if year:
+        metadata.setdefault("fiscal_year", year)
+    for header, fragments in iter_submission_documents(path, keep_types):
+        chunker = _SectionChunker(text_splitter, {
+            **metadata,
+            "source": str(path),
+            "document_type": header.get("type"),
+            "filename": header.get("filename", ""),
+        })
+        for line in _iter_lines(iter_document_text(fragments)):
+            yield from chunker.feed(line)
+        yield from chunker.flush()
+
+def parse_filing(path: str, from_year: int = None, to_year: int = None):
+    """
+    Reads and chunks one filing, returning (metadata, chunks).
+    chunks is None when the filing's fiscal year is outside [from_year, to_year].
+    Module-level so bulk ingestion can run it in a process pool.
+    """
+    metadata = read_filing_metadata(path)
+    year = fiscal_year(metadata.get("period"))
+    if year and ((from_year and year < from_year) or (to_year and year > to_year)):
+        return metadata, None
+    return metadata, list(iter_filing_chunks(path, filing_text_splitter(), metadata=metadata))
@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# --- CONFIGURATION ---
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+def _as_float32(vector):
+    # Round-trip through float32 so a fresh vector is identical to its cached copy
+    return np.asarray(vector, dtype=np.float32).tolist()
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with a content-addressed, on-disk cache.
+    Entries are keyed by sha256(model id + text), so re-ingesting a filing or
+    asking the same question twice costs no remote embedding calls.
+    The cache is a single SQLite file, trimmed back in LRU order once it
+    grows past max_entries.
+    """
+
+    def __init__(self, underlying: Embeddings, model_id: str, path, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.underlying = underlying
+        self.model_id = model_id
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._count = None
+
+    # --- storage ---
+    def _db(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+            self._count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode()).hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            db = self._db()
+            unique = list(dict.fromkeys(keys))
+            # SQLite caps bound parameters, so look up in slices
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                marks = ",".join("?" * len(part))
+                rows = db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", part)
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                db.commit()
+        return found
+
+    def _store(self, items):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+            )
+            self._count += db.total_changes - before
+            if self._count > self.max_entries:
+                # Trim to 90% so we don't evict on every single insert
+                excess = self._count - int(self.max_entries * 0.9)
+                db.execute(
+                    "DELETE FROM embeddings WHERE key IN"
+                    " (SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)", (excess,)
+                )
+                self._count -= excess
+            db.commit()
+
+    def _split(self, texts):
+        keys = [self._key(t) for t in texts]
+        cached = self._lookup(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text) # repeated boilerplate is embedded once
+        self.hits += len(texts) - sum(1 for k in keys if k in missing)
+        self.misses += len(missing)
+        return keys, cached, missing
+
+    # --- Embeddings interface ---
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = self._split(texts)
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), map(_as_float32, vectors)))
+            self._store(fresh)
+            cached.update(fresh)
+        return [cached[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        cached = self._lookup([key])
+        if key in cached:
+            self.hits += 1
+            return cached[key]
+        self.misses += 1
+        vector = _as_float32(self.underlying.embed_query(text))
+        self._store({key: vector})
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = await asyncio.to_thread(self._split, texts)
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), map(_as_float32, vectors)))
+            await asyncio.to_thread(self._store, fresh)
+            cached.update(fresh)
+        return [cached[k] for k in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        cached = await asyncio.to_thread(self._lookup, [key])
+        if key in cached:
+            self.hits += 1
+            return cached[key]
+        self.misses += 1
+        vector = _as_float32(await self.underlying.aembed_query(text))
+        await asyncio.to_thread(self._store, {key: vector})
+        return vector
+
+    def stats(self):
+        with self._lock:
+            entries = self._count if self._count is not None else 0
+        return {"entries": entries, "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,142 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+# --- CONFIGURATION ---
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+EMBED_RATE_PER_SEC = float(os.getenv("EMBED_RATE_PER_SEC", "8"))  # remote requests per second
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: acquire() blocks until a request may go out.
+    """
+
+    def __init__(self, rate_per_sec: float, capacity: float = None):
+        self.rate = rate_per_sec
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_sec)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_for = (tokens - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+def call_with_retry(fn, *args, retries: int = EMBED_MAX_RETRIES, base_delay: float = 0.5, max_delay: float = 20.0):
+    """
+    Retries transient failures (503s, timeouts, ...) with exponential backoff
+    and full jitter, so parallel workers don't retry in lockstep.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            print(f"⚠️  Embedding call failed ({e}); retry {attempt + 1}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+class ResilientEmbeddings(Embeddings):
+    """
+    Wraps the remote embedder: every request is rate limited and retried,
+    and large inputs are sent in batch_size slices.
+    """
+
+    def __init__(self, underlying: Embeddings, batch_size: int = EMBED_BATCH_SIZE,
+                 rate_per_sec: float = EMBED_RATE_PER_SEC, retries: int = EMBED_MAX_RETRIES,
+                 retry_base_delay: float = 0.5):
+        self.underlying = underlying
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_base_delay = retry_base_delay
+        self.bucket = TokenBucket(rate_per_sec)
+
+    def _embed_batch(self, texts):
+        self.bucket.acquire()
+        return call_with_retry(self.underlying.embed_documents, texts,
+                               retries=self.retries, base_delay=self.retry_base_delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[start:start + self.batch_size]))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        self.bucket.acquire()
+        return call_with_retry(self.underlying.embed_query, text,
+                               retries=self.retries, base_delay=self.retry_base_delay)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Interactive path: one attempt, no bucket wait; callers handle the error
+        return await self.underlying.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.underlying.aembed_query(text)
+
+def _batches(items, size):
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def embed_and_store(documents, embedder: Embeddings, write_batch, batch_size: int = EMBED_BATCH_SIZE,
+                    max_concurrency: int = EMBED_MAX_CONCURRENCY, on_progress=None):
+    """
+    Embeds documents in batches on up to max_concurrency threads and hands each
+    finished batch to write_batch(docs, vectors) right away, so the index fills
+    in incrementally instead of after the last chunk.
+    documents may be any iterable (including a generator); at most
+    2 * max_concurrency batches are held in memory at once.
+    Returns the number of documents written.
+    """
+    written = 0
+    batches = _batches(documents, batch_size)
+
+    def embed(batch):
+        return batch, embedder.embed_documents([doc.page_content for doc in batch])
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed") as pool:
+        pending = set()
+        for batch in batches:
+            pending.add(pool.submit(embed, batch))
+            if len(pending) < max_concurrency * 2:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            written += _drain(done, write_batch, on_progress, written)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            written += _drain(done, write_batch, on_progress, written)
+    return written
+
+def _drain(done, write_batch, on_progress, written_so_far):
+    # Writes happen on the caller's thread, so the store only ever sees one writer
+    written = 0
+    for future in done:
+        batch, vectors = future.result()
+        write_batch(batch, vectors)
+        written += len(batch)
+        if on_progress:
+            on_progress(written_so_far + written)
+    return written
@@ -0,0 +1,377 @@
+import argparse
+import contextlib
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from email.utils import formatdate
+from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+from app.services.edgar_parser import find_filings, read_filing_metadata, filing_suffix
+
+# --- CONFIGURATION ---
+current_file = Path(__file__).resolve()
+project_root = current_file.parent.parent.parent  # backend/
+# Raw filings (gzipped) and their index; override with a mounted volume in production
+FILING_STORE_DIR = Path(os.getenv("FILING_STORE_DIR", str(project_root / "filing_store")))
+# SEC endpoints. Point both at a local directory (a path or file:// URL) laid out like
+# SEC (files/company_tickers.json, submissions/CIK##########.json,
+# Archives/edgar/data/<cik>/<accession without dashes>/<accession>.txt) to run offline.
+EDGAR_BASE_URL = os.getenv("EDGAR_BASE_URL", "https://www.sec.gov").rstrip("/")
+EDGAR_DATA_URL = os.getenv("EDGAR_DATA_URL", os.getenv("EDGAR_BASE_URL", "https://data.sec.gov")).rstrip("/")
+# Seconds a ticker's filing list is trusted before SEC is asked again (with If-None-Match)
+FILING_STORE_TTL = float(os.getenv("FILING_STORE_TTL", "3600"))
+EDGAR_MIN_INTERVAL = 0.11    # SEC fair access: at most 10 requests per second
+EDGAR_TIMEOUT = float(os.getenv("EDGAR_TIMEOUT", "60"))
+COPY_BLOCK = 1 << 20         # bytes per read when streaming a filing to disk
+# SEC fair access wants a User-Agent with a contact address
+SEC_COMPANY = os.getenv("SEC_COMPANY", "RiskSentinel")
+SEC_EMAIL = os.getenv("SEC_EMAIL", "admin@risksentinel.com")
+
+class FilingNotFound(LookupError):
+    pass
+
+_throttle_lock = threading.Lock()
+_last_request = 0.0
+
+def _throttle():
+    global _last_request
+    with _throttle_lock:
+        wait = _last_request + EDGAR_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_request = time.monotonic()
+
+def _local_path(url: str):
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        return Path(url2pathname(parsed.path))
+    if not parsed.scheme or len(parsed.scheme) == 1:  # plain path (or a Windows drive letter)
+        return Path(url)
+    return None
+
+def fetch(url: str, etag: str = None, last_modified: str = None, stream: bool = False):
+    """
+    GET with If-None-Match / If-Modified-Since. Returns (status, body, headers);
+    body is None unless the status is 200. With stream, body is a binary file
+    object to read the response from (and close), so a filing of hundreds of
+    MB never sits in memory. Local fixture paths answer like a server would,
+    with an ETag made of the file's size and mtime.
+    """
+    path = _local_path(url)
+    if path is not None:
+        if not path.is_file():
+            return 404, None, {}
+        stat = path.stat()
+        headers = {"ETag": f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"',
+                   "Last-Modified": formatdate(stat.st_mtime, usegmt=True)}
+        if etag and etag == headers["ETag"]:
+            return 304, None, headers
+        return 200, open(path, "rb") if stream else path.read_bytes(), headers
+
+    import requests
+
+    request_headers = {"User-Agent": f"{SEC_COMPANY} {SEC_EMAIL}", "Accept-Encoding": "gzip, deflate"}
+    if etag:
+        request_headers["If-None-Match"] = etag
+    if last_modified:
+        request_headers["If-Modified-Since"] = last_modified
+    _throttle()
+    response = requests.get(url, headers=request_headers, timeout=EDGAR_TIMEOUT, stream=stream)
+    if response.status_code in (304, 404):
+        response.close()
+        return response.status_code, None, dict(response.headers)
+    try:
+        response.raise_for_status()
+    except Exception:
+        response.close()
+        raise
+    if not stream:
+        return response.status_code, response.content, dict(response.headers)
+    response.raw.decode_content = True  # undo the transfer gzip, we store our own
+    return response.status_code, response.raw, dict(response.headers)
+
+def _copy(source, out):
+    size = 0
+    while True:
+        block = source.read(COPY_BLOCK)
+        if not block:
+            return size
+        out.write(block)
+        size += len(block)
+
+class FilingStore:
+    """
+    Raw EDGAR filings on local disk, gzipped, with a SQLite index by ticker,
+    form, period and accession:
+
+        filings.sqlite3                       the index (plus ETags of SEC responses)
+        <TICKER>/<FORM>/<accession>.txt.gz    full-submission files
+
+    Filings never change once filed, so each accession is downloaded once;
+    after that SEC is only asked (conditionally) whether a newer one exists.
+    """
+
+    def __init__(self, root=FILING_STORE_DIR, base_url: str = None, data_url: str = None, ttl: float = None):
+        self.root = Path(root)
+        self.base_url = (base_url or EDGAR_BASE_URL).rstrip("/")
+        self.data_url = (data_url or (base_url if base_url else EDGAR_DATA_URL)).rstrip("/")
+        self.ttl = FILING_STORE_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.root / "filings.sqlite3"), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS filings (
+                    accession TEXT PRIMARY KEY,
+                    ticker TEXT NOT NULL,
+                    form TEXT NOT NULL,
+                    period TEXT,
+                    filed TEXT,
+                    cik INTEGER,
+                    primary_document TEXT,
+                    path TEXT NOT NULL,
+                    bytes INTEGER,
+                    stored_bytes INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS ix_filings_ticker_form ON filings (ticker, form, period, filed);
+                CREATE TABLE IF NOT EXISTS sources (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    checked_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS companies (
+                    ticker TEXT PRIMARY KEY,
+                    cik INTEGER NOT NULL
+                );
+            """)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # --- INDEX ---
+
+    def _row(self, row):
+        accession, ticker, form, period, filed, path = row
+        return {"accession": accession, "ticker": ticker, "form": form, "period": period,
+                "filed": filed, "path": str(self.root / path)}
+
+    def filings(self, ticker: str, form: str = "10-K"):
+        """
+        Stored filings of a ticker, newest first (by period, then filing date,
+        then accession, so the order never depends on the file system).
+        """
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT accession, ticker, form, period, filed, path FROM filings WHERE ticker = ? AND form = ? "
+                "ORDER BY period DESC, filed DESC, accession DESC", (ticker.upper(), form)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def accessions(self, ticker: str, form: str = "10-K"):
+        return {filing["accession"] for filing in self.filings(ticker, form)}
+
+    def latest(self, ticker: str, form: str = "10-K"):
+        filings = self.filings(ticker, form)
+        return filings[0] if filings else None
+
+    def _has(self, accession: str):
+        with self._lock:
+            return self._db().execute("SELECT 1 FROM filings WHERE accession = ?", (accession,)).fetchone() is not None
+
+    def put(self, ticker: str, source, form: str = "10-K", cik: int = None, primary_document: str = None):
+        """
+        Stores a full-submission file gzipped and indexes it under the accession
+        in its SEC header. source is a path or a binary file object (e.g. a
+        streaming download); either way it is copied through in blocks.
+        Returns the index entry.
+        """
+        ticker = ticker.upper()
+        directory = self.root / ticker / form
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp = directory / f".incoming-{os.getpid()}-{threading.get_ident()}.gz"
+        from_path = isinstance(source, (str, Path))
+        try:
+            with gzip.open(tmp, "wb", compresslevel=6) as out, \
+                    (open(source, "rb") if from_path else contextlib.nullcontext(source)) as f:
+                size = _copy(f, out)
+            # A downloaded file sits in a folder named after its accession, which
+            # covers filings without a header; a stream must carry one
+            metadata = read_filing_metadata(str(source) if from_path else str(tmp))
+            if metadata["accession"] == directory.name:
+                raise ValueError(f"{ticker}: filing has no ACCESSION NUMBER in its SEC header")
+            suffix = filing_suffix(source) if from_path else ".txt"
+            target = directory / f"{metadata['accession']}{suffix}.gz"
+            os.replace(tmp, target)
+        finally:
+            tmp.unlink(missing_ok=True)
+        relative = str(target.relative_to(self.root))
+        with self._lock:
+            conn = self._db()
+            conn.execute(
+                "INSERT OR REPLACE INTO filings (accession, ticker, form, period, filed, cik, primary_document, "
+                "path, bytes, stored_bytes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (metadata["accession"], ticker, form, metadata.get("period"), metadata.get("filed"), cik,
+                 primary_document, relative, size, target.stat().st_size))
+            conn.commit()
+        return self._row((metadata["accession"], ticker, form, metadata.get("period"),
+                          metadata.get("filed"), relative))
+
+    def adopt(self, download_dir, ticker: str, form: str = "10-K", remove: bool = True):
+        """
+        Moves what sec-edgar-downloader left in download_dir for a ticker into
+        the store (gzipped), deleting the uncompressed originals. Returns the new entries.
+        """
+        adopted = []
+        for path in find_filings(download_dir, ticker, form):
+            adopted.append(self.put(ticker, path, form))
+            if remove:
+                shutil.rmtree(Path(path).parent, ignore_errors=True)
+        return adopted
+
+    # --- SEC ---
+
+    def _source(self, url: str):
+        with self._lock:
+            row = self._db().execute("SELECT etag, last_modified, checked_at FROM sources WHERE url = ?",
+                                     (url,)).fetchone()
+        return row or (None, None, None)
+
+    def _checked(self, url: str, headers: dict = None):
+        with self._lock:
+            conn = self._db()
+            if headers is None:
+                conn.execute("UPDATE sources SET checked_at = ? WHERE url = ?", (time.time(), url))
+            else:
+                conn.execute("INSERT OR REPLACE INTO sources (url, etag, last_modified, checked_at) "
+                             "VALUES (?, ?, ?, ?)", (url, headers.get("ETag"), headers.get("Last-Modified"),
+                                                     time.time()))
+            conn.commit()
+
+    def _cik(self, ticker: str):
+        with self._lock:
+            row = self._db().execute("SELECT cik FROM companies WHERE ticker = ?", (ticker,)).fetchone()
+        if row:
+            return row[0]
+        url = f"{self.base_url}/files/company_tickers.json"
+        status, body, _ = fetch(url)
+        if status != 200:
+            raise FilingNotFound(f"Could not load the SEC ticker list ({status})")
+        companies = {entry["ticker"].upper(): int(entry["cik_str"]) for entry in json.loads(body).values()}
+        with self._lock:
+            conn = self._db()
+            conn.executemany("INSERT OR REPLACE INTO companies (ticker, cik) VALUES (?, ?)", companies.items())
+            conn.commit()
+        if ticker not in companies:
+            raise FilingNotFound(f"Unknown ticker {ticker}")
+        return companies[ticker]
+
+    def fetch_latest(self, ticker: str, form: str = "10-K"):
+        """
+        (metadata, path) of the newest filing of this form. Served from disk while
+        the ticker's filing list is fresh (ttl), or when SEC answers 304 or lists no
+        newer accession; only a new accession downloads the filing itself.
+        If SEC can't be reached, the newest stored filing is used.
+        """
+        ticker = ticker.upper()
+        stored = self.latest(ticker, form)
+        try:
+            cik = self._cik(ticker)
+            url = f"{self.data_url}/submissions/CIK{cik:010d}.json"
+            etag, last_modified, checked_at = self._source(url)
+            if stored and checked_at and time.time() - checked_at < self.ttl:
+                return self._metadata(stored)
+            status, body, headers = fetch(url, *((etag, last_modified) if stored else (None, None)))
+            if status == 304:
+                self._checked(url)
+                print(f"📦 {ticker} {form}: no new filing, using {stored['accession']}")
+                return self._metadata(stored)
+            if status != 200:
+                raise FilingNotFound(f"No EDGAR submissions for {ticker} ({status})")
+            newest = _newest(json.loads(body), form)
+            if newest is None:
+                raise FilingNotFound(f"No {form} filed by {ticker}")
+            accession, primary_document = newest
+            if not self._has(accession):
+                archive = f"{self.base_url}/Archives/edgar/data/{cik}/{accession.replace('-', '')}/{accession}.txt"
+                status, body, _ = fetch(archive, stream=True)
+                if status != 200:
+                    raise FilingNotFound(f"{ticker} {accession}: full submission not found ({status})")
+                with contextlib.closing(body):
+                    entry = self.put(ticker, body, form, cik=cik, primary_document=primary_document)
+                print(f"📥 Stored {ticker} {form} {accession} ({Path(entry['path']).stat().st_size >> 10} KB gzipped)")
+            else:
+                entry = next(f for f in self.filings(ticker, form) if f["accession"] == accession)
+                print(f"📦 {ticker} {form}: {accession} already stored")
+            self._checked(url, headers)
+            return self._metadata(entry)
+        except FilingNotFound:
+            raise
+        except Exception as e:
+            if stored is None:
+                raise
+            print(f"⚠️  EDGAR unreachable for {ticker} ({e}); using stored {stored['accession']}")
+            return self._metadata(stored)
+
+    def _metadata(self, entry):
+        metadata = {key: entry[key] for key in ("accession", "form", "period", "filed") if entry.get(key)}
+        return metadata, entry["path"]
+
+def _newest(submissions: dict, form: str):
+    """
+    (accession, primary document) of the newest filing of this exact form
+    (amendments like 10-K/A don't count) in an EDGAR submissions document.
+    """
+    recent = submissions.get("filings", {}).get("recent", {})
+    rows = zip(recent.get("accessionNumber", []), recent.get("form", []), recent.get("reportDate", []),
+               recent.get("filingDate", []), recent.get("primaryDocument", []))
+    candidates = [(report or "", filed or "", accession, primary)
+                  for accession, row_form, report, filed, primary in rows if row_form == form]
+    if not candidates:
+        return None
+    _, _, accession, primary = max(candidates)
+    return accession, primary
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_filing_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FilingStore()
+        return _store
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Move sec-edgar-downloader output into the filing store (gzipped, indexed).",
+        epilog="Example: python -m app.services.filing_store --download-dir . AAPL NVDA",
+    )
+    parser.add_argument("tickers", nargs="*", help="default: every ticker under sec-edgar-filings/")
+    parser.add_argument("--download-dir", default=".")
+    parser.add_argument("--keep", action="store_true", help="keep the uncompressed originals")
+    args = parser.parse_args()
+
+    base = Path(args.download_dir) / "sec-edgar-filings"
+    tickers = args.tickers or sorted(p.name for p in base.iterdir() if p.is_dir())
+    store = get_filing_store()
+    for ticker in tickers:
+        adopted = store.adopt(args.download_dir, ticker, remove=not args.keep)
+        print(f"📦 {ticker}: {len(adopted)} filings stored in {store.root}")
+
+if __name__ == "__main__":
+    main()
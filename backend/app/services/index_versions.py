@@ -0,0 +1,162 @@
+import fcntl
+import os
+import re
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# --- CONFIGURATION ---
+VECTOR_INDEX_KEEP = int(os.getenv("VECTOR_INDEX_KEEP", "3"))            # published versions kept on disk
+VECTOR_INDEX_GRACE = float(os.getenv("VECTOR_INDEX_GRACE", "300"))      # seconds before a superseded version may go
+VECTOR_INDEX_LOCK_TIMEOUT = float(os.getenv("VECTOR_INDEX_LOCK_TIMEOUT", "600"))
+
+CHROMA_DIR = "chroma_db"
+MMAP_DIR = "mmap_index"
+LEXICAL_FILE = "lexical_index.sqlite3"
+_version_name = re.compile(r"^v(\d{6,})$")
+
+class WriterBusy(Exception):
+    pass
+
+class IndexVersions:
+    """
+    Immutable, versioned copies of the vector store + BM25 index under root:
+
+        CURRENT          name of the published version, swapped with os.replace
+        versions/vNNNNNN chroma_db/ (or mmap_index/) and lexical_index.sqlite3 of one version
+        writer.lock      flock held by the (single) process publishing
+
+    Readers only ever open the version CURRENT names and never write to it.
+    A writer takes the lock, copies the current version to a new directory,
+    writes there, and flips CURRENT, so readers in other processes see either
+    the old or the new index, never a half-written one.
+    """
+
+    def __init__(self, root, seed_chroma=None, seed_lexical=None, seed_mmap=None):
+        self.root = Path(root)
+        self.versions_dir = self.root / "versions"
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+        # Pre-versioning directories to start from when nothing was published yet
+        self.seed_chroma = Path(seed_chroma) if seed_chroma else None
+        self.seed_lexical = Path(seed_lexical) if seed_lexical else None
+        self.seed_mmap = Path(seed_mmap) if seed_mmap else None
+
+    def current(self):
+        try:
+            name = (self.root / "CURRENT").read_text().strip()
+        except FileNotFoundError:
+            return None
+        return name or None
+
+    def path(self, name: str) -> Path:
+        return self.versions_dir / name
+
+    def chroma_path(self, name: str) -> Path:
+        return self.path(name) / CHROMA_DIR
+
+    def lexical_path(self, name: str) -> Path:
+        return self.path(name) / LEXICAL_FILE
+
+    def _names(self):
+        names = [p.name for p in self.versions_dir.iterdir() if _version_name.match(p.name)]
+        return sorted(names, key=lambda n: int(_version_name.match(n).group(1)))
+
+    def _next_name(self):
+        names = self._names()
+        number = int(_version_name.match(names[-1]).group(1)) + 1 if names else 1
+        return f"v{number:06d}"
+
+    @contextmanager
+    def _lock(self, timeout):
+        with open(self.root / "writer.lock", "a+") as lock_file:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise WriterBusy(f"Another process is publishing to {self.root}")
+                    time.sleep(0.1)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def publish(self, timeout: float = VECTOR_INDEX_LOCK_TIMEOUT):
+        """
+        Yields the directory of a new version, pre-filled with a copy of the
+        current one. Publishes it when the block exits cleanly; on error the
+        new directory is thrown away and CURRENT is left alone.
+        """
+        with self._lock(timeout):
+            name = self._next_name()
+            target = self.path(name)
+            current = self.current()
+            if current is not None:
+                shutil.copytree(self.path(current), target)
+            else:
+                self._seed(target)
+            try:
+                yield target
+            except BaseException:
+                shutil.rmtree(target, ignore_errors=True)
+                raise
+            self._set_current(name)
+            print(f"📚 Published index version {name}")
+            self.gc()
+
+    def _seed(self, target: Path):
+        target.mkdir()
+        if self.seed_chroma is not None and self.seed_chroma.exists():
+            shutil.copytree(self.seed_chroma, target / CHROMA_DIR)
+        if self.seed_mmap is not None and self.seed_mmap.exists():
+            shutil.copytree(self.seed_mmap, target / MMAP_DIR)
+        if self.seed_lexical is not None and self.seed_lexical.exists():
+            shutil.copy2(self.seed_lexical, target / LEXICAL_FILE)
+
+    def ensure_current(self, timeout: float = VECTOR_INDEX_LOCK_TIMEOUT):
+        """
+        Name of the published version. If nothing was published yet, publishes
+        the seed directories (or an empty index) first, deciding under the
+        writer lock so workers starting together publish one seed between them.
+        """
+        name = self.current()
+        if name is not None:
+            return name
+        with self._lock(timeout):
+            name = self.current()
+            if name is None:
+                name = self._next_name()
+                self._seed(self.path(name))
+                self._set_current(name)
+                print(f"📚 Published index version {name} (seed)")
+        return name
+
+    def _set_current(self, name: str):
+        tmp = self.root / "CURRENT.tmp"
+        with open(tmp, "w") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.root / "CURRENT")
+        # Remember when the previous version stopped being current (for gc)
+        os.utime(self.path(name))
+
+    def gc(self, keep: int = VECTOR_INDEX_KEEP, grace: float = VECTOR_INDEX_GRACE):
+        """
+        Deletes old versions: never the current one or the newest keep, and
+        only once a newer version has been out for grace seconds, so readers
+        have had time to move off them. Leftovers of crashed writers go the same way.
+        """
+        names = self._names()
+        current = self.current()
+        now = time.time()
+        for index, name in enumerate(names[:-keep] if keep else names):
+            if name == current:
+                continue
+            successor = self.path(names[index + 1])
+            if now - successor.stat().st_mtime >= grace:
+                shutil.rmtree(self.path(name), ignore_errors=True)
@@ -0,0 +1,222 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from app import models
+
+# --- CONFIGURATION ---
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_JOB_HISTORY = 200  # finished jobs kept around for status lookups
+INGEST_PROGRESS_EVERY = 1.0  # seconds between progress writes to the database
+# Each worker touches updated_at of its queued and running jobs this often, whatever
+# the job is doing (queued behind the pool, a long download, a lock wait) ...
+INGEST_HEARTBEAT_SECONDS = float(os.getenv("INGEST_HEARTBEAT_SECONDS", "30"))
+# ... so an active job without a heartbeat for this long belongs to a dead worker
+INGEST_STALE_SECONDS = float(os.getenv("INGEST_STALE_SECONDS", "900"))
+
+@dataclass
+class IngestJob:
+    id: str
+    ticker: str
+    status: str = "queued"  # queued -> running -> succeeded | failed
+    stage: str = "queued"   # downloading, parsing, chunking, embedding, digesting, done
+    chunks_done: int = 0
+    chunks_total: Optional[int] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def to_dict(self):
+        return asdict(self)
+
+_JOB_FIELDS = ("status", "stage", "chunks_done", "chunks_total", "error", "created_at", "started_at", "finished_at")
+
+class IngestJobQueue:
+    """
+    Runs ingestion in a small worker pool instead of inside the HTTP request.
+    A ticker that already has a queued or running job gets that job back
+    rather than a second download and a second set of embeddings.
+    runner(ticker, progress) does the actual work and returns the chunk count.
+
+    With a session_factory, jobs are also kept in the ingest_jobs table, so
+    with several uvicorn workers any of them can report a job's status and a
+    ticker is ingested by one worker at a time. Without one (or while the
+    database is unreachable) that only holds within this process.
+    """
+
+    def __init__(self, runner, max_workers: int = INGEST_WORKERS, session_factory=None):
+        self.runner = runner
+        self.session_factory = session_factory
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs = OrderedDict()  # job id -> IngestJob
+        self._active_by_ticker = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        if session_factory is not None:
+            threading.Thread(target=self._heartbeat, name="ingest-heartbeat", daemon=True).start()
+
+    def submit(self, ticker: str):
+        """
+        Returns (job, created). created is False when we attached to a running job.
+        """
+        ticker = ticker.upper()
+        with self._lock:
+            existing = self._active_by_ticker.get(ticker)
+            if existing is not None:
+                return existing, False
+            job = IngestJob(id=uuid.uuid4().hex, ticker=ticker)
+            other = self._claim(job)
+            if other is not None:
+                return other, False
+            self._jobs[job.id] = job
+            self._active_by_ticker[ticker] = job
+            self._trim()
+        self._pool.submit(self._run, job)
+        return job, True
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.session_factory is not None:
+            # Submitted to another worker
+            job = self._load(models.IngestJobRecord.id == job_id)
+        return job
+
+    # --- shared state (database) ---
+
+    def _claim(self, job: IngestJob):
+        """
+        Records job as the ticker's active job. Returns another worker's active
+        job for the ticker instead, if there is one.
+        """
+        if self.session_factory is None:
+            return None
+        for _ in range(3):
+            db = self.session_factory()
+            try:
+                db.add(models.IngestJobRecord(id=job.id, ticker=job.ticker, active_ticker=job.ticker,
+                                              updated_at=time.time(), **{f: getattr(job, f) for f in _JOB_FIELDS}))
+                db.commit()
+                return None
+            except IntegrityError:
+                db.rollback()
+                row = db.query(models.IngestJobRecord).filter(
+                    models.IngestJobRecord.active_ticker == job.ticker).first()
+                if row is None:
+                    continue  # it finished in the meantime
+                if time.time() - row.updated_at < INGEST_STALE_SECONDS:
+                    return _job_from_row(row)
+                print(f"⚠️  Ingestion job {row.id} for {row.ticker} went stale; starting over")
+                row.status, row.error, row.active_ticker = "failed", "worker stopped reporting progress", None
+                row.finished_at = row.updated_at = time.time()
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️  Could not record ingestion job in the database ({e}); tracking it in this worker only")
+                return None
+            finally:
+                db.close()
+        return None
+
+    def _save(self, job: IngestJob):
+        if self.session_factory is None:
+            return
+        db = self.session_factory()
+        try:
+            values = {f: getattr(job, f) for f in _JOB_FIELDS}
+            values["updated_at"] = time.time()
+            if not job.active:
+                values["active_ticker"] = None
+            db.query(models.IngestJobRecord).filter(models.IngestJobRecord.id == job.id).update(values)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️  Could not save ingestion job {job.id}: {e}")
+        finally:
+            db.close()
+
+    def _heartbeat(self):
+        # Keeps this worker's active jobs from looking stale to the others
+        while not self._stopped.wait(INGEST_HEARTBEAT_SECONDS):
+            with self._lock:
+                job_ids = [job.id for job in self._active_by_ticker.values()]
+            if not job_ids:
+                continue
+            db = self.session_factory()
+            try:
+                db.query(models.IngestJobRecord).filter(
+                    models.IngestJobRecord.id.in_(job_ids),
+                    models.IngestJobRecord.active_ticker.isnot(None),
+                ).update({"updated_at": time.time()}, synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️  Ingestion heartbeat failed: {e}")
+            finally:
+                db.close()
+
+    def _load(self, condition):
+        db = self.session_factory()
+        try:
+            row = db.query(models.IngestJobRecord).filter(condition).first()
+            return _job_from_row(row) if row is not None else None
+        finally:
+            db.close()
+
+    def _run(self, job: IngestJob):
+        job.status = "running"
+        job.started_at = time.time()
+        self._save(job)
+        saved_at = time.monotonic()
+
+        def progress(stage, chunks_done=None, chunks_total=None):
+            nonlocal saved_at
+            changed = stage != job.stage
+            job.stage = stage
+            if chunks_done is not None:
+                job.chunks_done = chunks_done
+            if chunks_total is not None:
+                job.chunks_total = chunks_total
+            # Stage changes right away, counters at most every INGEST_PROGRESS_EVERY
+            if changed or time.monotonic() - saved_at >= INGEST_PROGRESS_EVERY:
+                self._save(job)
+                saved_at = time.monotonic()
+
+        try:
+            job.chunks_done = self.runner(job.ticker, progress)
+            job.stage = "done"
+            job.status = "succeeded"
+        except Exception as e:
+            print(f"❌ Error ingesting {job.ticker}: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+            with self._lock:
+                self._active_by_ticker.pop(job.ticker, None)
+
+    def _trim(self):
+        # Forget the oldest finished jobs; active ones are always kept
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(finished) - INGEST_JOB_HISTORY)]:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+        self._stopped.set()
+
+def _job_from_row(row):
+    return IngestJob(id=row.id, ticker=row.ticker, **{f: getattr(row, f) for f in _JOB_FIELDS})
@@ -0,0 +1,130 @@
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+# Words that match nearly every chunk of a 10-K; dropping them keeps
+# posting lists short and BM25 focused on the terms that matter
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "could", "did", "do", "does", "for",
+    "from", "has", "have", "how", "in", "is", "it", "its", "of", "on", "or", "our", "that", "the",
+    "their", "there", "these", "this", "to", "was", "we", "were", "what", "when", "which", "who",
+    "why", "will", "with", "would", "you", "your", "company", "companies", "mentioned", "report",
+}
+
+# Metadata we copy into real columns so filters don't have to parse JSON
+FILTER_COLUMNS = ("ticker", "fiscal_year", "item", "form")
+
+_token = re.compile(r"\w+")
+
+def tokenize(text: str):
+    return [t for t in _token.findall(text.lower()) if t not in STOPWORDS]
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the same chunks as the vector store, kept in a
+    SQLite FTS5 table. Search is fully local: no embedding call, and exact
+    terms like "Section 232" or a subsidiary name score the way you expect.
+    Rows are keyed by the chunk ids sync_documents assigns.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    rowid INTEGER PRIMARY KEY,
+                    chunk_id TEXT UNIQUE NOT NULL,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    ticker TEXT, fiscal_year INTEGER, item TEXT, form TEXT
+                );
+                CREATE INDEX IF NOT EXISTS ix_chunks_ticker_year ON chunks (ticker, fiscal_year);
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                    text, content='chunks', content_rowid='rowid'
+                );
+                CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+                    INSERT INTO chunks_fts(rowid, text) VALUES (new.rowid, new.text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+                    INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+                END;
+            """)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        # The last connection to close checkpoints the WAL into the main file
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def add(self, documents, ids=None):
+        """
+        Inserts (or replaces) chunks. ids default to metadata["chunk_id"].
+        """
+        if ids is None:
+            ids = [doc.metadata["chunk_id"] for doc in documents]
+        rows = [
+            (cid, doc.page_content, json.dumps(doc.metadata), *(doc.metadata.get(c) for c in FILTER_COLUMNS))
+            for cid, doc in zip(ids, documents)
+        ]
+        with self._lock:
+            db = self._db()
+            # Delete first so the FTS trigger drops the old text of replaced rows
+            db.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(r[0],) for r in rows])
+            db.executemany(
+                "INSERT INTO chunks (chunk_id, text, metadata, ticker, fiscal_year, item, form)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            db.commit()
+
+    def delete(self, ids):
+        with self._lock:
+            db = self._db()
+            db.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(cid,) for cid in ids])
+            db.commit()
+
+    def count(self):
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def search(self, query: str, k: int = 10, filters: dict = None):
+        """
+        Top-k chunks by BM25. Returns [(Document, score)], higher score = better.
+        filters uses the same keys as vector_store.build_filter.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in terms)
+        sql = (
+            "SELECT c.text, c.metadata, bm25(chunks_fts) AS score"
+            " FROM chunks_fts JOIN chunks c ON c.rowid = chunks_fts.rowid"
+            " WHERE chunks_fts MATCH ?"
+        )
+        params = [match]
+        for column, value in (filters or {}).items():
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Unsupported lexical filter: {column}")
+            sql += f" AND c.{column} = ?"
+            params.append(value)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(k)
+
+        with self._lock:
+            rows = self._db().execute(sql, params).fetchall()
+        # FTS5's bm25() is "lower is better"; flip it so callers can sort descending
+        return [(Document(page_content=text, metadata=json.loads(meta)), -score) for text, meta, score in rows]
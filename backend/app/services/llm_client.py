@@ -0,0 +1,320 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import weakref
+from collections import deque
+
+import httpx
+import numpy as np
+
+from app.services.metrics import FALLBACKS, LLM_ANSWERS, LLM_SECONDS
+
+# --- CONFIGURATION ---
+# OpenAI-compatible chat endpoint; point it at a stub or self-hosted server for tests
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://router.huggingface.co/v1")
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_DEFAULT_TIMEOUT = float(os.getenv("LLM_DEFAULT_TIMEOUT", "30"))
+# Start the next model in parallel once the current one takes longer than this (0 = off)
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+# Circuit breaker, evaluated over the last LLM_HEALTH_WINDOW calls of each model
+LLM_HEALTH_WINDOW = int(os.getenv("LLM_HEALTH_WINDOW", "50"))
+LLM_CIRCUIT_MIN_CALLS = int(os.getenv("LLM_CIRCUIT_MIN_CALLS", "5"))
+LLM_CIRCUIT_ERROR_RATE = float(os.getenv("LLM_CIRCUIT_ERROR_RATE", "0.5"))
+LLM_CIRCUIT_P95 = float(os.getenv("LLM_CIRCUIT_P95", "25"))       # seconds
+LLM_CIRCUIT_COOLDOWN = float(os.getenv("LLM_CIRCUIT_COOLDOWN", "30"))  # seconds before a probe call
+
+class LLMUnavailable(Exception):
+    pass
+
+class ModelHealth:
+    """
+    Rolling latency / error stats for one model plus a circuit breaker.
+    closed    - calls go through
+    open      - error rate or p95 latency crossed the limit; calls are skipped
+                for cooldown seconds
+    half_open - one probe call is let through; success closes, failure reopens,
+                and a probe that is abandoned (cancelled) is released unjudged
+    """
+
+    def __init__(self, window=LLM_HEALTH_WINDOW, min_calls=LLM_CIRCUIT_MIN_CALLS,
+                 max_error_rate=LLM_CIRCUIT_ERROR_RATE, max_p95=LLM_CIRCUIT_P95, cooldown=LLM_CIRCUIT_COOLDOWN):
+        self.samples = deque(maxlen=window)  # (seconds, ok)
+        self.min_calls = min_calls
+        self.max_error_rate = max_error_rate
+        self.max_p95 = max_p95
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opened_until = 0.0
+        self.times_opened = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() >= self.opened_until:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def release(self):
+        """
+        The probe ended without a verdict (cancelled): let the next call probe.
+        """
+        with self._lock:
+            self._probing = False
+
+    def record(self, seconds: float, ok: bool):
+        with self._lock:
+            if self.state == "half_open":
+                self._probing = False
+                if ok:
+                    # Start from a clean slate, or the old failures would reopen it at once
+                    self.samples.clear()
+                    self.state = "closed"
+                else:
+                    self._open()
+            self.samples.append((seconds, ok))
+            if self.state == "closed" and len(self.samples) >= self.min_calls and self._degraded():
+                self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_until = time.monotonic() + self.cooldown
+        self.times_opened += 1
+
+    def _degraded(self):
+        return self._error_rate() >= self.max_error_rate or (self._percentile(95) or 0) > self.max_p95
+
+    def _error_rate(self):
+        return sum(not ok for _, ok in self.samples) / len(self.samples) if self.samples else 0.0
+
+    def _percentile(self, q):
+        # Failures count with the time they took: a timeout is a slow call too
+        return float(np.percentile([s for s, _ in self.samples], q)) if self.samples else None
+
+    def snapshot(self):
+        with self._lock:
+            p50, p95 = self._percentile(50), self._percentile(95)
+            return {
+                "state": self.state,
+                "calls": len(self.samples),
+                "error_rate": round(self._error_rate(), 3),
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "times_opened": self.times_opened,
+            }
+
+class LLMClient:
+    """
+    Chat completions over pooled HTTP connections, trying models in order.
+    Each model has its own timeout and ModelHealth; a model whose circuit is
+    open is skipped instead of making the user wait for it to fail again.
+    With hedge_after set, an async call still running after hedge_after
+    seconds gets a parallel request to the next model and the first answer wins.
+    """
+
+    def __init__(self, models, base_url: str = LLM_BASE_URL, timeouts: dict = None,
+                 hedge_after: float = LLM_HEDGE_AFTER, health_kwargs: dict = None):
+        self.models = list(models)
+        self.base_url = base_url.rstrip("/")
+        self.timeouts = {model: (timeouts or {}).get(model, LLM_DEFAULT_TIMEOUT) for model in self.models}
+        self.hedge_after = hedge_after
+        self.health = {model: ModelHealth(**(health_kwargs or {})) for model in self.models}
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+        self._sync_client = None
+        # httpx async pools belong to the event loop that created them
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"{self.base_url}/chat/completions"
+
+    def _timeout(self, model):
+        return httpx.Timeout(self.timeouts[model], connect=LLM_CONNECT_TIMEOUT)
+
+    def _client(self):
+        if self._sync_client is None:
+            with self._lock:
+                if self._sync_client is None:
+                    self._sync_client = httpx.Client(limits=self._limits)
+        return self._sync_client
+
+    def _aclient(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(limits=self._limits)
+            self._async_clients[loop] = client
+        return client
+
+    @staticmethod
+    def _request(model, messages, max_tokens, token, stream=False):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        payload = {"model": model, "messages": messages, "max_tokens": max_tokens}
+        if stream:
+            payload["stream"] = True
+        return payload, headers
+
+    def _record(self, model, started, ok):
+        seconds = time.monotonic() - started
+        self.health[model].record(seconds, ok=ok)
+        LLM_SECONDS.observe(seconds, model=model, outcome="ok" if ok else "error")
+
+    def _failed_over(self, model, e):
+        print(f"⚠️  {model} failed ({type(e).__name__}: {e}); trying next model")
+        FALLBACKS.inc(kind="next_model")
+
+    def _candidates(self, start=0, skip=()):
+        for model in self.models[start:]:
+            if model not in skip and self.health[model].allow():
+                yield model
+
+    # --- sync ---
+
+    def _call(self, model, messages, max_tokens, token):
+        payload, headers = self._request(model, messages, max_tokens, token)
+        started = time.monotonic()
+        try:
+            response = self._client().post(self.url, json=payload, headers=headers, timeout=self._timeout(model))
+            response.raise_for_status()
+            answer = response.json()["choices"][0]["message"]["content"]
+        except Exception:
+            self._record(model, started, ok=False)
+            raise
+        self._record(model, started, ok=True)
+        return answer
+
+    def complete(self, messages, max_tokens=1000, token=None):
+        for model in self._candidates():
+            try:
+                answer = self._call(model, messages, max_tokens, token)
+                LLM_ANSWERS.inc(model=model)
+                return answer
+            except Exception as e:
+                self._failed_over(model, e)
+        raise LLMUnavailable("No model available")
+
+    # --- async ---
+
+    async def _acall(self, model, messages, max_tokens, token):
+        payload, headers = self._request(model, messages, max_tokens, token)
+        started = time.monotonic()
+        try:
+            # httpx timeouts are per read; wait_for caps the whole call
+            response = await asyncio.wait_for(
+                self._aclient().post(self.url, json=payload, headers=headers, timeout=self._timeout(model)),
+                self.timeouts[model],
+            )
+            response.raise_for_status()
+            answer = response.json()["choices"][0]["message"]["content"]
+        except asyncio.CancelledError:
+            # Lost a hedge race or the caller went away: not the model's fault,
+            # but a half-open probe must not stay claimed forever
+            self.health[model].release()
+            raise
+        except Exception:
+            self._record(model, started, ok=False)
+            raise
+        self._record(model, started, ok=True)
+        return answer, model
+
+    async def acomplete(self, messages, max_tokens=1000, token=None):
+        tried = set()
+        for index, model in enumerate(self.models):
+            if model in tried or not self.health[model].allow():
+                continue
+            tried.add(model)
+            tasks = [asyncio.ensure_future(self._acall(model, messages, max_tokens, token))]
+            try:
+                if self.hedge_after:
+                    done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+                    backup = None if done else next(self._candidates(index + 1, skip=tried), None)
+                    if backup:
+                        tried.add(backup)
+                        self.hedged += 1
+                        FALLBACKS.inc(kind="hedge")
+                        tasks.append(asyncio.ensure_future(self._acall(backup, messages, max_tokens, token)))
+                (answer, answered_by), winner = await self._first_success(tasks)
+                if winner is not tasks[0]:
+                    self.hedge_wins += 1
+                LLM_ANSWERS.inc(model=answered_by)
+                return answer
+            except Exception as e:
+                self._failed_over(model, e)
+            finally:
+                for task in tasks:
+                    task.cancel()
+        raise LLMUnavailable("No model available")
+
+    @staticmethod
+    async def _first_success(tasks):
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), task
+                error = task.exception()
+        raise error
+
+    async def astream(self, messages, max_tokens=1000, token=None):
+        """
+        Yields content deltas. Falls back to the next model only if the current
+        one fails before its first token; its timeout is the longest gap
+        allowed between chunks. Latency is recorded as time to first token.
+        """
+        for model in self._candidates():
+            payload, headers = self._request(model, messages, max_tokens, token, stream=True)
+            started = time.monotonic()
+            first_token = False
+            try:
+                async with self._aclient().stream("POST", self.url, json=payload, headers=headers,
+                                                  timeout=self._timeout(model)) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        choices = json.loads(data).get("choices") or []
+                        delta = choices[0].get("delta", {}).get("content") if choices else None
+                        if delta:
+                            if not first_token:
+                                first_token = True
+                                self._record(model, started, ok=True)
+                            yield delta
+                if not first_token:
+                    self._record(model, started, ok=True)
+                LLM_ANSWERS.inc(model=model)
+                return
+            except (asyncio.CancelledError, GeneratorExit):
+                # Client disconnected before the first token: no verdict on the model
+                if not first_token:
+                    self.health[model].release()
+                raise
+            except Exception as e:
+                if first_token:
+                    raise
+                self._record(model, started, ok=False)
+                self._failed_over(model, e)
+        raise LLMUnavailable("No model available")
+
+    def stats(self):
+        return {
+            "models": {model: {**health.snapshot(), "timeout_s": self.timeouts[model]}
+                       for model, health in self.health.items()},
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+        }
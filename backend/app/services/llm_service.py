@@ -1,37 +1,86 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from huggingface_hub import InferenceClient
+from app.services.llm_client import LLMClient, LLMUnavailable
+from app.services.metrics import timed
 
 load_dotenv()
 
 api_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
 
+# Priority list: Huge model -> Fast model -> Backup
+MODELS = [
+    "Qwen/Qwen2.5-72B-Instruct",
+    "Qwen/Qwen2.5-7B-Instruct",
+]
+
+# Seconds we give each model before moving on (a hung 72B call used to block forever)
+MODEL_TIMEOUTS = {
+    "Qwen/Qwen2.5-72B-Instruct": float(os.getenv("LLM_PRIMARY_TIMEOUT", "30")),
+    "Qwen/Qwen2.5-7B-Instruct": float(os.getenv("LLM_FALLBACK_TIMEOUT", "15")),
+}
+
+# Context tokens we pack into the prompt for each model (see context_builder)
+CONTEXT_TOKEN_BUDGETS = {
+    "Qwen/Qwen2.5-72B-Instruct": int(os.getenv("LLM_PRIMARY_CONTEXT_TOKENS", "2000")),
+    "Qwen/Qwen2.5-7B-Instruct": int(os.getenv("LLM_FALLBACK_CONTEXT_TOKENS", "1500")),
+}
+
+def context_token_budget():
+    """
+    The prompt is built before we know which model answers, so it has to
+    fit the tightest budget in the fallback chain.
+    """
+    return min(CONTEXT_TOKEN_BUDGETS[model] for model in MODELS)
+
+# One pooled client per process: keeps connections warm and remembers model health
+llm_client = LLMClient(MODELS, timeouts=MODEL_TIMEOUTS)
+
+def _build_messages(sys_prompt, user_prompt):
+    return [
+        {"role": "system", "content": sys_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
 def get_llm_response_internal(sys_prompt, user_prompt):
     token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
-    if not token: 
+    if not token:
         return "Error: Token missing."
-        
-    client = InferenceClient(api_key=token)
-    
-    # Priority list: Huge model -> Fast model -> Backup
-    models = [
-        "Qwen/Qwen2.5-72B-Instruct", 
-        "Qwen/Qwen2.5-7B-Instruct",
-    ]
-    
-    for model in models:
-        try:
-            # print(f"Trying model: {model}...") 
-            completion = client.chat.completions.create(
-                model=model, 
-                messages=[
-                    {"role": "system", "content": sys_prompt},
-                    {"role": "user", "content": user_prompt}
-                ], 
-                max_tokens=1000
-            )
-            return completion.choices[0].message.content
-        except Exception:
-            continue
-    return "Error: Could not connect to any AI models."
+
+    try:
+        with timed("llm"):
+            return llm_client.complete(_build_messages(sys_prompt, user_prompt), max_tokens=1000, token=token)
+    except LLMUnavailable:
+        return "Error: Could not connect to any AI models."
+
+async def aget_llm_response_internal(sys_prompt, user_prompt):
+    """
+    Async twin of get_llm_response_internal. Awaiting the model doesn't hold
+    a threadpool worker, so slow generations don't starve other endpoints.
+    """
+    token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+    if not token:
+        return "Error: Token missing."
+
+    try:
+        with timed("llm"):
+            return await llm_client.acomplete(_build_messages(sys_prompt, user_prompt), max_tokens=1000, token=token)
+    except LLMUnavailable:
+        return "Error: Could not connect to any AI models."
+
+async def astream_llm_response(sys_prompt, user_prompt):
+    """
+    Yields the answer token by token as the model produces it.
+    We only fall back to the next model if the current one fails before
+    sending anything; once tokens went out to the user we can't retract them.
+    """
+    token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+    if not token:
+        yield "Error: Token missing."
+        return
+
+    try:
+        async for delta in llm_client.astream(_build_messages(sys_prompt, user_prompt), max_tokens=1000, token=token):
+            yield delta
+    except LLMUnavailable:
+        yield "Error: Could not connect to any AI models."
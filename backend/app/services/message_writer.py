@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from app import models
+from app.services.metrics import ERRORS, timed
+
+# --- CONFIGURATION ---
+MESSAGE_FLUSH_INTERVAL = float(os.getenv("MESSAGE_FLUSH_INTERVAL", "0.05"))  # seconds
+MESSAGE_FLUSH_BATCH = int(os.getenv("MESSAGE_FLUSH_BATCH", "200"))  # flush early at this many rows
+MESSAGE_FLUSH_RETRY = 1.0  # seconds between attempts while the DB is unreachable
+MESSAGE_FLUSH_ATTEMPTS = int(os.getenv("MESSAGE_FLUSH_ATTEMPTS", "3"))  # before a failing batch is written row by row
+# wait_for_user() only sees this process's queue. With several uvicorn workers
+# (WEB_CONCURRENCY > 1) the next read may be served by another one, so requests
+# wait for their own messages to commit before responding (still batched).
+MESSAGE_WRITE_THROUGH = os.getenv(
+    "MESSAGE_WRITE_THROUGH", "1" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "0") == "1"
+
+class MessageWriter:
+    """
+    Write-behind persistence for chat messages. Requests enqueue() and move on;
+    one background thread writes everything queued in a single multi-row
+    INSERT + commit every flush_interval seconds (sooner once batch_size rows
+    are waiting), so concurrent requests share a transaction instead of each
+    paying for its own commit.
+    - Timestamps are taken at enqueue time and rows are inserted in queue
+      order, so history order is the same as with direct commits.
+    - wait_for_user() blocks until that user's queued messages are committed;
+      read paths call it first (read-your-writes). That covers one process
+      only; see MESSAGE_WRITE_THROUGH for several workers.
+    - close() drains the queue; a failed flush keeps its rows and retries.
+      Rows still unwritten when close() gives up are reported, never dropped silently.
+    - A batch that keeps failing for a reason other than a lost connection
+      is written one row at a time; a row the database rejects on its own
+      (say a dangling conversation_id) is logged and dropped, so it can't
+      hold up every later message.
+    """
+
+    def __init__(self, session_factory, flush_interval: float = MESSAGE_FLUSH_INTERVAL,
+                 batch_size: int = MESSAGE_FLUSH_BATCH):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = []
+        self._pending_by_user = {}
+        self._enqueued = 0   # sequence number of the last queued row
+        self._committed = 0  # sequence number of the last committed row
+        self._cond = threading.Condition()
+        self._closed = False
+        self._abandoned = False  # close() gave up: stop retrying
+        self._urgent = False
+        self.flushes = 0
+        self.rows_written = 0
+        self.failures = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, user_id: int, role: str, content: str, conversation_id: int = None):
+        row = {
+            "user_id": user_id, "role": role, "content": content,
+            "conversation_id": conversation_id, "timestamp": datetime.utcnow(),
+        }
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MessageWriter is closed")
+            self._queue.append(row)
+            self._enqueued += 1
+            self._pending_by_user[user_id] = self._enqueued
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def wait_for_user(self, user_id: int, timeout: float = 5.0):
+        """
+        Returns once every message queued so far for user_id is committed
+        (immediately if there are none; rows dropped as rejected count as done).
+        Returns False on timeout.
+        """
+        with self._cond:
+            target = self._pending_by_user.get(user_id)
+            if target is None or self._committed >= target:
+                return True
+            self._urgent = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._committed >= target, timeout)
+
+    def flush(self, timeout: float = None):
+        """
+        Blocks until everything queued so far is committed.
+        """
+        with self._cond:
+            target = self._enqueued
+            self._urgent = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._committed >= target, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                # Let a batch build up unless someone is waiting on it
+                deadline = time.monotonic() + self.flush_interval
+                while (not self._closed and not self._urgent and len(self._queue) < self.batch_size
+                       and time.monotonic() < deadline):
+                    self._cond.wait(deadline - time.monotonic())
+                if not self._queue and self._closed:
+                    return
+                batch, self._queue = self._queue, []
+                self._urgent = False
+                last = self._enqueued
+            attempts = 0
+            while batch:
+                outcome = self._write(batch)
+                if outcome == "ok" or self._abandoned:
+                    break
+                attempts += 1
+                if attempts >= MESSAGE_FLUSH_ATTEMPTS and outcome == "rejected":
+                    batch, attempts = self._write_rows_apart(batch), 0
+                    if not batch:
+                        break
+                time.sleep(MESSAGE_FLUSH_RETRY)
+            if self._abandoned:
+                return
+            with self._cond:
+                self._committed = last
+                for user_id, seq in list(self._pending_by_user.items()):
+                    if seq <= last:
+                        del self._pending_by_user[user_id]
+                self._cond.notify_all()
+
+    def _write(self, batch):
+        db = None
+        try:
+            with timed("db_flush"):
+                db = self.session_factory()
+                db.execute(insert(models.Message), batch)
+                touched = {}
+                for row in batch:
+                    if row["conversation_id"] is not None:
+                        touched[row["conversation_id"]] = row["timestamp"]
+                for conversation_id, timestamp in touched.items():
+                    db.execute(
+                        update(models.Conversation)
+                        .where(models.Conversation.id == conversation_id)
+                        .values(updated_at=timestamp)
+                    )
+                db.commit()
+        except Exception as e:
+            if db is not None:
+                db.rollback()
+            self.failures += 1
+            print(f"⚠️  Message flush of {len(batch)} rows failed, retrying: {e}")
+            # No session, or the connection went away: the database is down, not refusing these rows
+            return "outage" if db is None or _is_outage(e) else "rejected"
+        finally:
+            if db is not None:
+                db.close()
+        self.flushes += 1
+        self.rows_written += len(batch)
+        return "ok"
+
+    def _write_rows_apart(self, batch):
+        """
+        Writes the rows of a failing batch one by one and drops the ones the
+        database rejects. Returns the rows left when the connection goes away
+        midway, to be retried like any other batch.
+        """
+        for i, row in enumerate(batch):
+            outcome = self._write([row])
+            if outcome == "outage":
+                return batch[i:]
+            if outcome == "rejected":
+                self.dropped += 1
+                ERRORS.inc(stage="message_writer_drop")
+                print(f"❌ Dropped a chat message the database rejects "
+                      f"(user {row['user_id']}, conversation {row['conversation_id']})")
+        return []
+
+    def close(self, timeout: float = 30.0):
+        """
+        Stops accepting messages and writes out whatever is still queued.
+        Returns how many messages could not be written within timeout
+        (the database is down or too slow); those are lost with the process.
+        """
+        with self._cond:
+            if not self._closed:
+                self._closed = True
+                self._cond.notify_all()
+        self._thread.join(timeout)
+        with self._cond:
+            unwritten = self._enqueued - self._committed
+            self._abandoned = bool(unwritten)
+        if unwritten:
+            ERRORS.inc(stage="message_writer_close")
+            print(f"❌ MessageWriter closed with {unwritten} chat messages NOT written "
+                  f"after {timeout:.0f}s ({self.failures} failed flushes); they will be lost")
+        return unwritten
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": len(self._queue), "flushes": self.flushes,
+                "rows_written": self.rows_written, "failures": self.failures, "dropped": self.dropped,
+                "rows_per_flush": round(self.rows_written / self.flushes, 2) if self.flushes else None,
+            }
+
+def _is_outage(error):
+    return isinstance(error, (OperationalError, InterfaceError)) or getattr(error, "connection_invalidated", False)
@@ -0,0 +1,221 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# --- CONFIGURATION ---
+# Add a Server-Timing header (per-stage milliseconds) to every API response
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"
+# Seconds; covers a sub-millisecond cache hit up to a timed-out 72B generation
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels):
+        series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+        return series[-1] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, series):
+                    le = (("le", _number(bound)),)
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {bucket_count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+class Registry:
+    """
+    Metrics in Prometheus text format. Besides counters and histograms that
+    code updates directly, collectors are called at scrape time to export
+    existing stats() dicts (caches, circuit breakers) without touching them.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collect):
+        """
+        collect() returns [(name, type, help, {label: value}, number), ...];
+        type is "counter" or "gauge".
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        collected = {}
+        for collect in self._collectors:
+            try:
+                for name, kind, help, labels, value in collect():
+                    collected.setdefault(name, (kind, help, []))[2].append((labels, value))
+            except Exception as e:
+                print(f"⚠️  Metrics collector failed: {e}")
+        for name, (kind, help, samples) in collected.items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# --- METRICS ---
+STAGE_SECONDS = registry.histogram(
+    "risksentinel_stage_seconds", "Time spent per request stage.", ["stage"])
+LLM_SECONDS = registry.histogram(
+    "risksentinel_llm_call_seconds", "LLM calls per model (time to first token when streaming).", ["model", "outcome"])
+LLM_ANSWERS = registry.counter(
+    "risksentinel_llm_answers_total", "Answers by the model that produced them.", ["model"])
+FALLBACKS = registry.counter(
+    "risksentinel_fallbacks_total", "Degraded paths taken (next model, BM25-only retrieval, hedges).", ["kind"])
+ERRORS = registry.counter(
+    "risksentinel_errors_total", "Errors by stage.", ["stage"])
+HTTP_SECONDS = registry.histogram(
+    "risksentinel_http_request_seconds", "Time to response headers per route.", ["method", "route", "status"])
+INGEST_SECONDS = registry.histogram(
+    "risksentinel_ingest_stage_seconds", "Ingestion time per stage and filing.", ["stage"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+INGEST_CHUNKS = registry.counter(
+    "risksentinel_ingest_chunks_total", "Chunks processed by ingestion stage.", ["stage"])
+
+# --- PER-REQUEST TIMINGS ---
+# Set by MetricsMiddleware; tasks and threads started by the request inherit it
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+@contextmanager
+def timed(stage: str, histogram=None, /, **labels):
+    """
+    Times the block into risksentinel_stage_seconds (or histogram with labels)
+    and adds it to the current request's Server-Timing breakdown.
+    Stages that raise are counted in risksentinel_errors_total.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        if histogram is None:
+            STAGE_SECONDS.observe(elapsed, stage=stage)
+        else:
+            histogram.observe(elapsed, **labels)
+        record_timing(stage, elapsed)
+
+def record_timing(stage: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+def server_timing(timings: dict):
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (not BaseHTTPMiddleware, which buffers streaming
+    responses): times every HTTP request by route template and, with
+    SERVER_TIMING on, sends the stages recorded so far as a Server-Timing
+    header. For streamed answers that is everything up to the first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                route = scope.get("route")
+                HTTP_SECONDS.observe(elapsed, method=scope["method"],
+                                     route=getattr(route, "path", "unmatched"), status=message["status"])
+                if SERVER_TIMING and timings:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing({**timings, "total": elapsed}).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
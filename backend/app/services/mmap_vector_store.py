@@ -0,0 +1,431 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+# --- CONFIGURATION ---
+# Storage type for new indexes: float32, float16 (half the size) or int8 (a quarter)
+MMAP_DTYPE = os.getenv("MMAP_DTYPE", "int8")
+MMAP_RESCORE = int(os.getenv("MMAP_RESCORE", "4"))            # candidates per result re-scored at full precision
+MMAP_BLOCK_ROWS = int(os.getenv("MMAP_BLOCK_ROWS", "16384"))  # rows scored per matrix multiply
+MMAP_IVF_MIN_ROWS = int(os.getenv("MMAP_IVF_MIN_ROWS", "50000"))  # below this a full scan is fast enough
+MMAP_IVF_PROBE = int(os.getenv("MMAP_IVF_PROBE", "8"))        # partitions searched per query
+MMAP_IVF_RETRAIN = 0.2   # retrain once this share of rows arrived after the last training
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def _equalities(where):
+    """
+    The Chroma where clauses vector_store builds ({k: v} or {"$and": [...]})
+    as a flat {key: value} dict.
+    """
+    if not where:
+        return {}
+    if "$and" in where:
+        merged = {}
+        for clause in where["$and"]:
+            merged.update(_equalities(clause))
+        return merged
+    result = {}
+    for key, value in where.items():
+        if isinstance(value, dict):
+            if set(value) != {"$eq"}:
+                raise ValueError(f"Unsupported filter on {key}: {value}")
+            value = value["$eq"]
+        result[key] = value
+    return result
+
+class MmapVectorStore(VectorStore):
+    """
+    Embeddings in flat files under one directory, memory-mapped read-only
+    for search, so every worker shares the same pages through the OS cache
+    instead of holding its own copy:
+
+        vectors.bin   one row per chunk, in the store's dtype
+        scales.f32    per-row scale (int8 only)
+        full.f32      full-precision rows (quantized stores only; read for rescoring)
+        alive.u8      1 per live row, 0 once deleted or replaced
+        rows.sqlite3  row -> chunk id, text, metadata
+        ivf.npz       optional coarse partitions (spherical k-means)
+
+    Vectors are stored normalized and scored by cosine similarity (the same
+    ranking Chroma's L2 gives for normalized embeddings). Rows are append-only;
+    deletes only clear the alive flag. Quantized stores scan the compact rows,
+    then re-score MMAP_RESCORE x k candidates against full.f32.
+    Writes must come from one process (see IndexVersions for several workers).
+    """
+
+    def __init__(self, path, embedding_function, dtype: str = None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._embedding = embedding_function
+        self._lock = threading.Lock()
+        self._conn = None
+        self._rows = 0          # rows visible in the current maps
+        self._maps = {}
+        self._ivf = None
+        self._ivf_mtime = None
+        meta_path = self.path / "meta.json"
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+            self.dtype, self.dim = meta["dtype"], meta["dim"]
+        else:
+            self.dtype, self.dim = dtype or MMAP_DTYPE, None
+        if self.dtype not in DTYPES:
+            raise ValueError(f"MMAP_DTYPE must be one of {', '.join(DTYPES)}, not {self.dtype!r}")
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    @property
+    def _collection(self):
+        # vector_store talks to Chroma's collection (get/upsert/delete/count);
+        # this store implements the same calls itself
+        return self
+
+    # --- STORAGE ---
+    def _db(self):
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path / "rows.sqlite3"), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rows (
+                    row INTEGER PRIMARY KEY,
+                    chunk_id TEXT UNIQUE NOT NULL,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+            """)
+            self._conn = conn
+        return self._conn
+
+    def _files(self):
+        files = {"vectors": (self.path / "vectors.bin", DTYPES[self.dtype])}
+        if self.dtype != "float32":
+            files["full"] = (self.path / "full.f32", np.float32)
+        if self.dtype == "int8":
+            files["scales"] = (self.path / "scales.f32", np.float32)
+        return files
+
+    def _row_count(self):
+        # alive.u8 is appended last, so its length is the number of complete rows
+        try:
+            return (self.path / "alive.u8").stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _view(self):
+        """
+        Current maps, reopened when another writer (or this one) appended rows.
+        """
+        rows = self._row_count()
+        ivf_path = self.path / "ivf.npz"
+        ivf_mtime = ivf_path.stat().st_mtime if ivf_path.exists() else None
+        if rows == self._rows and ivf_mtime == self._ivf_mtime:
+            return self._maps, self._rows
+        with self._lock:
+            if rows != self._rows and rows:
+                maps = {}
+                for name, (file, dtype) in self._files().items():
+                    width = 1 if name == "scales" else self.dim
+                    maps[name] = np.memmap(file, dtype=dtype, mode="r", shape=(rows, width))
+                maps["alive"] = np.memmap(self.path / "alive.u8", dtype=np.uint8, mode="r", shape=(rows,))
+                self._maps, self._rows = maps, rows
+            if ivf_mtime != self._ivf_mtime:
+                self._ivf = dict(np.load(ivf_path)) if ivf_mtime is not None else None
+                self._ivf_mtime = ivf_mtime
+        return self._maps, self._rows
+
+    def _quantize(self, vectors):
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1, keepdims=True) / 127.0
+            scales = np.maximum(scales, 1e-12).astype(np.float32)
+            return np.round(vectors / scales).astype(np.int8), scales
+        return vectors.astype(DTYPES[self.dtype]), None
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        """
+        Appends the rows; an id that already exists is replaced (its old row
+        marked dead). Same arguments as Chroma's collection.upsert.
+        """
+        if not ids:
+            return
+        latest = {cid: i for i, cid in enumerate(ids)}  # the last copy of a repeated id wins
+        keep = sorted(latest.values())
+        ids = [ids[i] for i in keep]
+        vectors = _normalize(embeddings)[keep]
+        documents = [documents[i] for i in keep] if documents else [""] * len(ids)
+        metadatas = [metadatas[i] for i in keep] if metadatas else [None] * len(ids)
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                (self.path / "meta.json").write_text(json.dumps({"dtype": self.dtype, "dim": self.dim}))
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+            db = self._db()
+            self._tombstone(db, ids)
+            start = self._row_count()
+            quantized, scales = self._quantize(vectors)
+            parts = {"vectors": quantized, "full": vectors, "scales": scales}
+            for name, (file, dtype) in self._files().items():
+                with open(file, "ab") as f:
+                    # Drop the tail of a write that crashed before alive.u8 was appended
+                    f.truncate(start * (1 if name == "scales" else self.dim) * np.dtype(dtype).itemsize)
+                    f.write(np.ascontiguousarray(parts[name], dtype=dtype).tobytes())
+            db.executemany(
+                "INSERT INTO rows (row, chunk_id, text, metadata) VALUES (?, ?, ?, ?)",
+                [(start + i, cid, text, json.dumps(meta or {}))
+                 for i, (cid, text, meta) in enumerate(zip(ids, documents, metadatas))],
+            )
+            db.commit()
+            with open(self.path / "alive.u8", "ab") as f:
+                f.write(b"\x01" * len(ids))
+
+    def _tombstone(self, db, ids):
+        placeholders = ",".join("?" * len(ids))
+        rows = [r for (r,) in db.execute(f"SELECT row FROM rows WHERE chunk_id IN ({placeholders})", ids)]
+        if not rows:
+            return
+        db.execute(f"DELETE FROM rows WHERE chunk_id IN ({placeholders})", ids)
+        with open(self.path / "alive.u8", "r+b") as f:
+            for row in rows:
+                f.seek(row)
+                f.write(b"\x00")
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return
+        with self._lock:
+            db = self._db()
+            self._tombstone(db, list(ids))
+            db.commit()
+
+    def count(self):
+        return self._db().execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents")):
+        """
+        Chroma-style get: {"ids": [...], plus "documents", "metadatas" and
+        "embeddings" (normalized) when asked for in include}.
+        """
+        sql, params = "SELECT row, chunk_id, text, metadata FROM rows WHERE 1=1", []
+        if ids is not None:
+            if not ids:
+                return {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+            sql += f" AND chunk_id IN ({','.join('?' * len(ids))})"
+            params += list(ids)
+        for key, value in _equalities(where).items():
+            sql += f" AND json_extract(metadata, '$.\"{key}\"') = ?"
+            params.append(value)
+        found = self._db().execute(sql + " ORDER BY row", params).fetchall()
+        result = {"ids": [cid for _, cid, _, _ in found]}
+        if "documents" in include:
+            result["documents"] = [text for _, _, text, _ in found]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(meta) for _, _, _, meta in found]
+        if "embeddings" in include:
+            maps, _ = self._view()
+            full = maps.get("full", maps.get("vectors"))
+            result["embeddings"] = [np.array(full[row], dtype=np.float32) for row, _, _, _ in found]
+        return result
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._maps, self._rows = {}, 0
+
+    # --- SEARCH ---
+    def _approx_scores(self, maps, rows, queries):
+        # rows is a slice (a view of the map, no copy) or an array of row numbers
+        block = np.asarray(maps["vectors"][rows], dtype=np.float32)
+        scores = block @ queries.T
+        if self.dtype == "int8":
+            scores *= maps["scales"][rows]
+        return scores
+
+    def _scan(self, maps, queries, depth, candidates=None, total=0):
+        """
+        Top depth rows per query by (approximate) score, scanning candidates
+        (a sorted row array) or rows [0, total) block by block.
+        """
+        best_rows = np.empty((0, len(queries)), dtype=np.int64)
+        best_scores = np.empty((0, len(queries)), dtype=np.float32)
+        size = len(candidates) if candidates is not None else total
+        for start in range(0, size, MMAP_BLOCK_ROWS):
+            if candidates is not None:
+                rows = index = candidates[start:start + MMAP_BLOCK_ROWS]
+            else:
+                end = min(start + MMAP_BLOCK_ROWS, size)
+                rows, index = np.arange(start, end), slice(start, end)
+            scores = self._approx_scores(maps, index, queries)
+            scores[maps["alive"][index] == 0] = -np.inf
+            # Keep the block's best depth, then merge with the best so far
+            if len(scores) > depth:
+                top = np.argpartition(-scores, depth - 1, axis=0)[:depth]
+                scores, rows = np.take_along_axis(scores, top, axis=0), rows[top]
+            else:
+                rows = np.repeat(rows[:, None], len(queries), axis=1)
+            best_scores = np.concatenate([best_scores, scores])
+            best_rows = np.concatenate([best_rows, rows])
+            if len(best_scores) > depth:
+                top = np.argpartition(-best_scores, depth - 1, axis=0)[:depth]
+                best_scores = np.take_along_axis(best_scores, top, axis=0)
+                best_rows = np.take_along_axis(best_rows, top, axis=0)
+        return best_rows, best_scores
+
+    def _ivf_candidates(self, query, total):
+        ivf = self._ivf
+        lists = np.argsort(-(ivf["centroids"] @ query))[:MMAP_IVF_PROBE]
+        offsets, order = ivf["offsets"], ivf["order"]
+        parts = [order[offsets[l]:offsets[l + 1]] for l in lists]
+        # Rows added since the last training aren't partitioned yet
+        parts.append(np.arange(int(ivf["trained_rows"]), total))
+        return np.sort(np.concatenate(parts).astype(np.int64))
+
+    def search_by_vectors(self, query_vectors, k: int = 4, filter: dict = None):
+        """
+        Batch search: one list of (row, score) per query vector, best first.
+        """
+        queries = _normalize(query_vectors)
+        maps, total = self._view()
+        if not total:
+            return [[] for _ in queries]
+        depth = min(k * MMAP_RESCORE if "full" in maps else k, total)
+        candidates = None
+        if filter:
+            equalities = _equalities(filter)
+            sql = "SELECT row FROM rows WHERE " + " AND ".join(
+                f"json_extract(metadata, '$.\"{key}\"') = ?" for key in equalities)
+            candidates = np.array([r for (r,) in self._db().execute(sql, list(equalities.values()))
+                                   if r < total], dtype=np.int64)
+            candidates.sort()
+
+        if candidates is None and self._ivf is not None:
+            # Partitions differ per query, so IVF searches one query at a time
+            found = [self._scan(maps, q[None, :], min(depth, total), self._ivf_candidates(q, total))
+                     for q in queries]
+        else:
+            rows, scores = self._scan(maps, queries, depth, candidates, total)
+            found = [(rows[:, i:i + 1], scores[:, i:i + 1]) for i in range(len(queries))]
+
+        results = []
+        for query, (rows, scores) in zip(queries, found):
+            rows, scores = rows[:, 0], scores[:, 0]
+            live = np.isfinite(scores)
+            rows, scores = rows[live], scores[live]
+            if "full" in maps and len(rows):
+                order = np.argsort(rows)  # read full-precision rows in file order
+                rows = rows[order]
+                scores = maps["full"][rows] @ query
+            best = np.argsort(-scores)[:k]
+            results.append([(int(rows[i]), float(scores[i])) for i in best])
+        return results
+
+    def _documents(self, hits):
+        if not hits:
+            return []
+        placeholders = ",".join("?" * len(hits))
+        found = {row: (text, json.loads(meta), cid) for row, cid, text, meta in self._db().execute(
+            f"SELECT row, chunk_id, text, metadata FROM rows WHERE row IN ({placeholders})",
+            [row for row, _ in hits])}
+        # A row replaced since the scan has no entry any more
+        return [(Document(page_content=found[row][0], metadata=found[row][1], id=found[row][2]), score)
+                for row, score in hits if row in found]
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, filter: dict = None, **kwargs):
+        return self._documents(self.search_by_vectors([embedding], k=k, filter=filter)[0])
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, filter: dict = None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: dict = None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: dict = None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] -> [0, 1]
+        return lambda score: (score + 1) / 2
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        self.upsert(ids, self._embedding.embed_documents(texts), texts, metadatas)
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path=None, **kwargs):
+        store = cls(path, embedding, dtype=kwargs.get("dtype"))
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    # --- IVF ---
+    def train_ivf(self, lists: int = None, iterations: int = 10, sample: int = 50000, seed: int = 0):
+        """
+        Partitions the live rows with spherical k-means (about 4 * sqrt(rows)
+        partitions by default); searches then only score MMAP_IVF_PROBE of them
+        plus rows added afterwards. Readers pick the new partitions up on
+        their next search.
+        """
+        maps, total = self._view()
+        live = np.flatnonzero(maps["alive"][:total]) if total else np.empty(0, dtype=np.int64)
+        lists = lists or max(1, int(4 * np.sqrt(len(live))))
+        if len(live) < lists:
+            return
+        full = maps.get("full", maps["vectors"])
+        rng = np.random.default_rng(seed)
+        training = full[np.sort(rng.choice(live, min(sample, len(live)), replace=False))].astype(np.float32)
+        centroids = training[rng.choice(len(training), lists, replace=False)]
+        for _ in range(iterations):
+            assigned = np.argmax(training @ centroids.T, axis=1)
+            for l in range(lists):
+                members = training[assigned == l]
+                if len(members):
+                    centroids[l] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+
+        assignment = np.empty(total, dtype=np.int32)
+        for start in range(0, total, MMAP_BLOCK_ROWS):
+            block = np.asarray(full[start:start + MMAP_BLOCK_ROWS], dtype=np.float32)
+            assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assignment[live], kind="stable")
+        order = live[order].astype(np.int32)
+        offsets = np.searchsorted(assignment[order], np.arange(lists + 1))
+
+        tmp = self.path / "ivf.npz.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, centroids=centroids.astype(np.float32), order=order, offsets=offsets,
+                     trained_rows=np.int64(total))
+        os.replace(tmp, self.path / "ivf.npz")
+        print(f"🧭 Trained {lists} IVF partitions over {len(live)} vectors")
+
+    def maybe_train_ivf(self):
+        """
+        (Re)trains the partitions once the store is big enough for them to pay
+        off and enough rows arrived since the last training.
+        """
+        _, total = self._view()
+        if total < MMAP_IVF_MIN_ROWS:
+            return
+        trained = int(self._ivf["trained_rows"]) if self._ivf is not None else 0
+        if total - trained > MMAP_IVF_RETRAIN * total:
+            self.train_ivf()
@@ -3,12 +3,8 @@ from pathlib import Path
 from dotenv import load_dotenv
 from huggingface_hub import InferenceClient
 import os
-import glob
-from sec_edgar_downloader import Downloader
-from langchain_community.document_loaders import BSHTMLLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEndpointEmbeddings
+import asyncio
+import time
 
 # --- PATH FIX (CRITICAL) ---
 # This ensures Python knows where 'backend' is
@@ -17,93 +13,133 @@ project_root = current_file.parent.parent.parent
 sys.path.append(str(project_root))
 
 # NOW we can import from 'app'
-from app.services.vector_store import get_retriever
+from app.services.vector_store import (
+    retrieve, aretrieve, aembed_question, aembed_questions, build_filter,
+    get_corpus_version, bump_corpus_version, sync_documents, get_chunk_vectors
+)
+from app.services.answer_cache import answer_cache
+from app.services.edgar_parser import iter_filing_chunks, filing_text_splitter
+from app.services.filing_store import get_filing_store, FilingNotFound
+from app.services.context_builder import CONTEXT_CANDIDATES, pack_context, estimate_tokens
+from app.services.metrics import INGEST_SECONDS, INGEST_CHUNKS, LLM_ANSWERS, timed
+from app.services import risk_digest
 
 # --- CONFIGURATION ---
 env_path = project_root / ".env"
 load_dotenv(dotenv_path=env_path)
-
-# -- Setup Vector DB (Chroma) ---
-PERSIST_DIRECTORY = "./chroma_db"
-repo_id = "sentence-transformers/all-MiniLM-L6-v2"
-
-EMBEDDING_MODEL = HuggingFaceEndpointEmbeddings(
-    model=repo_id,
-    task="feature-extraction",
-    huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN")
-)
-
-vector_db = Chroma(
-    persist_directory=PERSIST_DIRECTORY,
-    embedding_function=EMBEDDING_MODEL
-)
+# LLM calls one risk matrix request may have in flight at once
+RISK_MATRIX_CONCURRENCY = int(os.getenv("RISK_MATRIX_CONCURRENCY", "4"))
 
 # --- THE RAG ENGINE ---
 
-def download_and_ingest_10k(ticker: str):
+def _no_progress(stage, chunks_done=None, chunks_total=None):
+    pass
+
+def download_and_ingest_10k(ticker: str, progress=_no_progress):
     """
     Downloads the latest 10-K for a ticker and ingests it.
+    progress(stage, chunks_done=None, chunks_total=None) is called as the
+    job moves through downloading -> parsing -> embedding (-> digesting).
     """
     print(f"🚀 Starting SEC Download for: {ticker}")
+    progress("downloading")
     
-    # 1. Setup Downloader (Requires an email for User-Agent compliance)
-    dl = Downloader("RiskSentinel", "admin@risksentinel.com")
-    
-    # 2. Download latest 10-K
-    # This saves to: ./sec-edgar-filings/{ticker}/10-K/...
+    # 1-3. Latest 10-K from the local filing store. SEC is only asked whether
+    # there is a newer accession (a conditional request, at most once per
+    # FILING_STORE_TTL); the filing itself is downloaded, gzipped, only once.
     try:
-        dl.get("10-K", ticker, limit=1)
+        with timed("download", INGEST_SECONDS, stage="download"):
+            filing, target_file = get_filing_store().fetch_latest(ticker, "10-K")
+    except FilingNotFound as e:
+        raise FileNotFoundError(f"No 10-K file found for {ticker}: {e}")
     except Exception as e:
         raise ValueError(f"Failed to download 10-K for {ticker}: {e}")
-
-    # 3. Find the file (It's deeply nested)
-    # We look for the .html or .txt file in the download folder
-    search_path = f"sec-edgar-filings/{ticker}/10-K/**/*.txt" # Modern filings are often .txt (HTML inside)
-    files = glob.glob(search_path, recursive=True)
+    print(f"📂 Found filing: {target_file} (accession {filing['accession']})")
     
-    if not files:
-        # Fallback for some companies that use .html
-        search_path = f"sec-edgar-filings/{ticker}/10-K/**/*.html"
-        files = glob.glob(search_path, recursive=True)
-        
-    if not files:
-        raise FileNotFoundError(f"No 10-K file found for {ticker}")
-        
-    target_file = files[0]
-    print(f"📂 Found filing: {target_file}")
-    
-    # 4. Load and Clean (HTML -> Text)
-    # We use BSHTMLLoader because SEC filings are HTML
-    loader = BSHTMLLoader(target_file)
-    docs = loader.load()
-    
-    # 5. Split and Vectorize
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=2000, # 10-Ks are dense, so larger chunks
-        chunk_overlap=200
-    )
-    splits = text_splitter.split_documents(docs)
-    
-    # 6. Store in DB
-    vector_db.add_documents(documents=splits)
-    print(f"✅ Ingested {len(splits)} chunks for {ticker}")
-    
-    return len(splits)
+    # 4. Parse, Clean and Split as one stream (HTML -> Text -> chunks).
+    # Only the 10-K document itself is read; exhibits, XBRL and graphics are
+    # skipped without being loaded, so memory stays flat for huge filings.
+    progress("parsing")
+    splits = iter_filing_chunks(target_file, filing_text_splitter(), metadata=filing)
+    # Item 1A chunks are kept aside (a few hundred KB) for the risk digest
+    risk_chunks = []
 
-def query_rag(user_question: str):
-    print(f"🔎 Analyzing PDF for: '{user_question}'")
-    
-    # 1. RETRIEVE
-    try:
-        retriever = get_retriever()
-        relevant_docs = retriever.invoke(user_question)
-    except Exception as e:
-        return f"Error accessing Vector DB: {e}. Did you run vector_store.py?"
-    
-    context_text = "\n\n".join([doc.page_content for doc in relevant_docs])
+    def keep_risk_factors(chunks):
+        for chunk in chunks:
+            if risk_digest.RISK_DIGEST and chunk.metadata.get("item") == "1A":
+                risk_chunks.append(chunk)
+            yield chunk
+
+    # 5. Store in DB (same shared handle the query path reads from).
+    # Chunk ids come from ticker + accession + content hash, so ingesting the
+    # same filing again only embeds and writes chunks that actually changed.
+    progress("embedding", chunks_done=0)
+    # Parsing is lazy, so this times parse + embed + write together
+    with timed("parse_embed", INGEST_SECONDS, stage="parse_embed"):
+        result = sync_documents(
+            keep_risk_factors(splits),
+            scope={"ticker": ticker, "accession": filing["accession"]},
+            on_progress=lambda done: progress("embedding", chunks_done=done)
+        )
+    INGEST_CHUNKS.inc(result["total"], stage="parsed")
+    INGEST_CHUNKS.inc(result["added"], stage="embedded")
+    print(f"✅ Ingested {ticker}: {result['added']} new, {result['skipped']} unchanged, {result['deleted']} removed chunks")
+
+    # 6. Digest Item 1A now, in this background job, so overview questions
+    # don't pay for retrieval + generation later. Optional: ingestion succeeded either way.
+    # An unchanged filing that already has its digest needs neither the LLM call
+    # nor a version bump (which would throw away every cached answer)
+    unchanged = result["added"] == 0 and result["deleted"] == 0
+    if risk_digest.RISK_DIGEST and unchanged and risk_digest.has_digest(filing["accession"]):
+        print(f"🧾 {ticker} {filing['accession']} unchanged; keeping its risk digest")
+    elif risk_digest.RISK_DIGEST:
+        progress("digesting")
+        try:
+            with timed("digest", INGEST_SECONDS, stage="digest"):
+                risk_digest.materialize_digest(ticker, filing, risk_chunks)
+            # Answers cached since the sync bumped the version were built without the digest
+            bump_corpus_version()
+        except Exception as e:
+            print(f"⚠️  Risk digest for {ticker} failed: {e}")
     
+    return result["total"]
+
+def _label(doc):
+    # "[NVDA FY2024 Item 1A]" so the model can tell filings apart
+    meta = doc.metadata
+    parts = [meta.get("ticker"), f"FY{meta['fiscal_year']}" if meta.get("fiscal_year") else None,
+             f"Item {meta['item']}" if meta.get("item") else None]
+    parts = [p for p in parts if p]
+    return f"[{' '.join(parts)}]\n" if parts else ""
+
+def _select_context(relevant_docs, reserved_tokens: int = 0):
+    """
+    Retrieval returns CONTEXT_CANDIDATES chunks; keep a diverse, de-duplicated
+    subset that fits the model's context token budget (minus reserved_tokens,
+    e.g. for the risk digest).
+    """
+    with timed("context_pack"):
+        try:
+            vectors = get_chunk_vectors(relevant_docs)
+        except Exception as e:
+            print(f"⚠️  No stored vectors for MMR ({e}); using word overlap")
+            vectors = None
+        budget = context_token_budget()
+        # Never let the reservation starve the passages, whatever the caller asks for
+        reserved_tokens = min(reserved_tokens, int(budget * risk_digest.RISK_DIGEST_CONTEXT_SHARE))
+        pack = pack_context(relevant_docs, budget - reserved_tokens, vectors,
+                            render=lambda doc: _label(doc) + doc.page_content)
+    print(f"📦 Context: {pack.tokens}/{pack.budget} tokens, {len(pack.passages)} passages "
+          f"from {pack.candidates} candidates ({pack.merged} merged, {pack.dropped} dropped)")
+    return pack
+
+def _build_prompts(user_question: str, relevant_docs, digest_text: str = None):
+    context_text = "\n\n".join([_label(doc) + doc.page_content for doc in relevant_docs])
+
     if not context_text:
-        return "I couldn't find any relevant information in the uploaded PDF."
+        return None
+    if digest_text:
+        context_text = digest_text + "\n\n" + context_text
 
     print(f"✅ Found {len(relevant_docs)} relevant sections.")
 
@@ -120,12 +156,237 @@ def query_rag(user_question: str):
     USER QUESTION: 
     {user_question}
     """
+    return system_prompt, final_prompt
+
+def query_rag(user_question: str, filters: dict = None):
+    """
+    filters (from vector_store.build_filter) scope retrieval to e.g. one
+    ticker, fiscal year or 10-K Item.
+    """
+    print(f"🔎 Analyzing PDF for: '{user_question}'")
+
+    corpus_version = get_corpus_version()
+    cached = answer_cache.get(user_question, corpus_version, filters)
+    if cached is not None:
+        return cached
+
+    digest = _find_digest(filters) if filters else None
+    answer = risk_digest.answer_from_digest(user_question, digest)
+    if answer is not None:
+        LLM_ANSWERS.inc(model="risk_digest")
+        return answer
+    digest_text = _digest_section(digest)
+    
+    # 1. RETRIEVE
+    try:
+        relevant_docs = retrieve(user_question, k=CONTEXT_CANDIDATES, filters=filters)
+    except Exception as e:
+        return f"Error accessing Vector DB: {e}. Did you run vector_store.py?"
+    
+    pack = _select_context(relevant_docs, _reserved(digest_text))
+    prompts = _build_prompts(user_question, pack.passages, digest_text)
+    if prompts is None:
+        return "I couldn't find any relevant information in the uploaded PDF."
 
     # 3. GENERATE
-    return get_llm_response_internal(system_prompt, final_prompt)
+    answer = get_llm_response_internal(*prompts)
+    if not answer.startswith("Error"):
+        answer_cache.put(user_question, corpus_version, answer, scope=filters)
+    return answer
+
+def _digest_section(digest):
+    # Capped to a share of the context budget, so retrieved evidence always has room
+    if not digest:
+        return None
+    return risk_digest.digest_context(
+        digest, max_tokens=int(context_token_budget() * risk_digest.RISK_DIGEST_CONTEXT_SHARE))
+
+def _reserved(digest_text):
+    return estimate_tokens(digest_text) if digest_text else 0
+
+def _find_digest(filters: dict):
+    # A missing or broken digest only means we answer the slow way
+    try:
+        return risk_digest.digest_for_filters(filters)
+    except Exception as e:
+        print(f"⚠️  Risk digest lookup failed: {e}")
+        return None
+
+async def _agenerate_answer(user_question: str, query_vector=None, filters: dict = None, llm_slots=None):
+    # 0. Overview questions about one filing are answered from its precomputed digest
+    digest = await asyncio.to_thread(_find_digest, filters) if filters else None
+    answer = risk_digest.answer_from_digest(user_question, digest)
+    if answer is not None:
+        LLM_ANSWERS.inc(model="risk_digest")
+        return answer
+    digest_text = _digest_section(digest)
+
+    # 1. RETRIEVE
+    try:
+        relevant_docs = await aretrieve(user_question, k=CONTEXT_CANDIDATES, query_vector=query_vector, filters=filters)
+    except Exception as e:
+        return f"Error accessing Vector DB: {e}. Did you run vector_store.py?"
+
+    pack = await asyncio.to_thread(_select_context, relevant_docs, _reserved(digest_text))
+    prompts = _build_prompts(user_question, pack.passages, digest_text)
+    if prompts is None:
+        return "I couldn't find any relevant information in the uploaded PDF."
+
+    # 3. GENERATE (llm_slots, a semaphore, caps how many calls a batch runs at once)
+    if llm_slots is None:
+        return await aget_llm_response_internal(*prompts)
+    async with llm_slots:
+        return await aget_llm_response_internal(*prompts)
+
+async def aquery_rag(user_question: str, filters: dict = None):
+    """
+    Async version of query_rag: the embedding and LLM calls are awaited,
+    so one worker can keep many slow analyses in flight.
+    Answers are cached per corpus version, and identical questions that
+    arrive together share a single LLM call.
+    """
+    print(f"🔎 Analyzing PDF for: '{user_question}'")
+
+    corpus_version = get_corpus_version()
+    cached = answer_cache.get(user_question, corpus_version, filters)
+    if cached is not None:
+        return cached
+
+    # Similar-question lookups need the embedding; reuse it for retrieval
+    query_vector = None
+    if answer_cache.similarity_threshold:
+        try:
+            query_vector = await aembed_question(user_question)
+        except Exception as e:
+            return f"Error accessing Vector DB: {e}. Did you run vector_store.py?"
+
+    return await answer_cache.get_or_compute(
+        user_question,
+        corpus_version,
+        lambda: _agenerate_answer(user_question, query_vector, filters),
+        query_vector=query_vector,
+        scope=filters
+    )
+
+async def astream_risk_matrix(questions, tickers, year: int = None, item: str = None, concurrency: int = None):
+    """
+    Answers every (question, ticker) cell of a comparison grid. The questions
+    are embedded in one request, every cell's ticker-filtered retrieval starts
+    right away and at most `concurrency` (default RISK_MATRIX_CONCURRENCY)
+    LLM calls run at once. Yields ("cell", {...}) as each cell finishes, then
+    ("done", {...}), so the grid takes about as long as its slowest cell
+    rather than the sum of all of them.
+    """
+    print(f"🧮 Risk matrix: {len(questions)} questions x {len(tickers)} tickers")
+    started = time.perf_counter()
+    corpus_version = get_corpus_version()
+    try:
+        vectors = await aembed_questions(questions)
+    except Exception as e:
+        # Each cell's retrieval embeds on its own (and falls back to BM25 if that fails too)
+        print(f"⚠️  Batch question embedding failed ({e}); embedding per cell")
+        vectors = [None] * len(questions)
+    llm_slots = asyncio.Semaphore(concurrency or RISK_MATRIX_CONCURRENCY)
+
+    async def answer_cell(row, col):
+        question, ticker = questions[row], tickers[col]
+        filters = build_filter(ticker=ticker, year=year, item=item)
+        cell_started = time.perf_counter()
+        cell = {"row": row, "col": col, "question": question, "ticker": ticker}
+        try:
+            cell["answer"] = await answer_cache.get_or_compute(
+                question,
+                corpus_version,
+                lambda: _agenerate_answer(question, vectors[row], filters, llm_slots),
+                query_vector=vectors[row],
+                scope=filters
+            )
+        except Exception as e:
+            print(f"❌ Risk matrix cell {ticker} / {question!r} failed: {e}")
+            cell["error"] = str(e)
+        cell["seconds"] = round(time.perf_counter() - cell_started, 3)
+        return cell
+
+    tasks = [asyncio.ensure_future(answer_cell(row, col))
+             for row in range(len(questions)) for col in range(len(tickers))]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield "cell", await finished
+    finally:
+        # The client went away: don't keep generating cells nobody will read
+        for task in tasks:
+            task.cancel()
+    yield "done", {"cells": len(tasks), "seconds": round(time.perf_counter() - started, 3)}
+
+def _describe_sources(relevant_docs):
+    # Small, JSON-friendly summary of what the answer is grounded on
+    return [
+        {
+            "index": i,
+            "source": doc.metadata.get("source"),
+            "page": doc.metadata.get("page"),
+            "ticker": doc.metadata.get("ticker"),
+            "fiscal_year": doc.metadata.get("fiscal_year"),
+            "item": doc.metadata.get("item"),
+            "preview": doc.page_content[:200],
+        }
+        for i, doc in enumerate(relevant_docs)
+    ]
+
+async def astream_rag(user_question: str, filters: dict = None):
+    """
+    Streaming version of aquery_rag. Yields (event, payload) pairs:
+    one "sources" event as soon as retrieval is done, a "context" event with
+    the token budget used, then "token" events.
+    """
+    print(f"🔎 Streaming analysis for: '{user_question}'")
+
+    corpus_version = get_corpus_version()
+    cached = answer_cache.get(user_question, corpus_version, filters)
+    if cached is not None:
+        yield "sources", []
+        yield "token", cached
+        return
+
+    digest = await asyncio.to_thread(_find_digest, filters) if filters else None
+    answer = risk_digest.answer_from_digest(user_question, digest)
+    if answer is not None:
+        LLM_ANSWERS.inc(model="risk_digest")
+        yield "sources", []
+        yield "token", answer
+        return
+    digest_text = _digest_section(digest)
+
+    # 1. RETRIEVE
+    try:
+        relevant_docs = await aretrieve(user_question, k=CONTEXT_CANDIDATES, filters=filters)
+    except Exception as e:
+        yield "token", f"Error accessing Vector DB: {e}. Did you run vector_store.py?"
+        return
+
+    pack = await asyncio.to_thread(_select_context, relevant_docs, _reserved(digest_text))
+    yield "sources", _describe_sources(pack.passages)
+    yield "context", pack.stats()
+
+    prompts = _build_prompts(user_question, pack.passages, digest_text)
+    if prompts is None:
+        yield "token", "I couldn't find any relevant information in the uploaded PDF."
+        return
+
+    # 3. GENERATE
+    pieces = []
+    async for piece in astream_llm_response(*prompts):
+        pieces.append(piece)
+        yield "token", piece
+
+    answer = "".join(pieces)
+    if not answer.startswith("Error"):
+        answer_cache.put(user_question, corpus_version, answer, scope=filters)
 
 # Internal helper to call Qwen
-from app.services.llm_service import get_llm_response_internal
+from app.services.llm_service import (
+    get_llm_response_internal, aget_llm_response_internal, astream_llm_response, context_token_budget
+)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,279 @@
+import json
+import os
+import re
+
+from app import models
+from app.database import SessionLocal
+from app.services.context_builder import estimate_tokens
+from app.services.edgar_parser import match_item_heading, fiscal_year
+
+# --- CONFIGURATION ---
+RISK_DIGEST = os.getenv("RISK_DIGEST", "1") == "1"                  # build a digest after each ingestion
+RISK_DIGEST_SUMMARY = os.getenv("RISK_DIGEST_SUMMARY", "1") == "1"  # one LLM call per filing for the overview
+RISK_DIGEST_TOP = int(os.getenv("RISK_DIGEST_TOP", "10"))           # risks listed in answers and context
+MIN_HEADING_CHARS = 40    # shorter lines are section titles ("Risks Related to Our Business")
+MAX_HEADING_CHARS = 350   # risk factor headings are one (long) sentence
+HEADING_MATCH = 0.6       # word overlap at which two headings count as the same risk year over year
+# Most of the context budget the digest may take; the retrieved passages get the rest
+RISK_DIGEST_CONTEXT_SHARE = float(os.getenv("RISK_DIGEST_CONTEXT_SHARE", "0.25"))
+
+# Keyword stems per category; a heading goes to the category with the most hits
+CATEGORIES = {
+    "geopolitical & trade": ("china", "taiwan", "tariff", "trade", "export", "sanction", "geopolitic", "international"),
+    "supply chain": ("supply", "supplier", "manufactur", "component", "outsourc", "logistic", "single source"),
+    "cybersecurity": ("cyber", "breach", "ransomware", "hack", "information technology", "security incident"),
+    "legal & regulatory": ("regulat", "law", "legal", "litigation", "lawsuit", "antitrust", "patent",
+                           "investigation", "compliance", "privacy", "tax"),
+    "macroeconomic": ("economic", "inflation", "recession", "interest rate", "currency", "exchange rate"),
+    "financial": ("liquidity", "debt", "credit", "capital", "impairment", "goodwill", "indebtedness"),
+    "competition": ("compet", "market share", "pricing pressure", "new entrants"),
+    "people & operations": ("personnel", "talent", "employee", "key executive", "outage", "disruption"),
+    "climate & environment": ("climate", "weather", "environment", "carbon", "emission", "natural disaster"),
+}
+
+_sentence_end = re.compile(r"[.!?](?:\s|$)")
+_words = re.compile(r"[a-z]{3,}")
+
+def _is_heading(line: str):
+    line = line.strip()
+    if not MIN_HEADING_CHARS <= len(line) <= MAX_HEADING_CHARS or not line[0].isupper():
+        return False
+    if match_item_heading(line):
+        return False
+    # Body text runs several sentences (or wraps mid-sentence); a heading is one
+    return not _sentence_end.search(line[:-1])
+
+def categorize(text: str) -> str:
+    text = text.lower()
+    hits = {name: sum(stem in text for stem in stems) for name, stems in CATEGORIES.items()}
+    best = max(hits, key=hits.get)
+    return best if hits[best] else "other"
+
+def extract_risks(chunks, scope: dict):
+    """
+    Risk factor headings from Item 1A chunks, in filing order, each with the
+    ids of the chunk it appears in and the one after (where its text continues).
+    Chunks overlap, so a heading seen twice is kept once.
+    """
+    from app.services.vector_store import chunk_id
+
+    chunks = [c for c in chunks if c.metadata.get("item") == "1A"]
+    ids = [chunk_id(scope, c.page_content) for c in chunks]
+    risks, seen = [], set()
+    for index, chunk in enumerate(chunks):
+        for line in chunk.page_content.split("\n"):
+            heading = line.strip()
+            key = heading.lower()
+            if key in seen or not _is_heading(heading):
+                continue
+            seen.add(key)
+            risks.append({
+                "heading": heading,
+                "category": categorize(heading),
+                "chunk_ids": ids[index:index + 2],
+            })
+    return risks
+
+def _word_set(heading: str):
+    return set(_words.findall(heading.lower()))
+
+def diff_headings(previous, current, threshold: float = HEADING_MATCH):
+    """
+    (added, removed) headings between two years. Companies reword risk
+    factors a little every year, so headings match on word overlap, not equality.
+    """
+    def matched(heading, others):
+        words = _word_set(heading)
+        for other in others:
+            union = words | other
+            if union and len(words & other) / len(union) >= threshold:
+                return True
+        return False
+
+    previous_words = [_word_set(h) for h in previous]
+    current_words = [_word_set(h) for h in current]
+    added = [h for h in current if not matched(h, previous_words)]
+    removed = [h for h in previous if not matched(h, current_words)]
+    return added, removed
+
+def _summarize(ticker, year, risks):
+    from app.services.llm_service import get_llm_response_internal
+
+    headings = "\n".join(f"- {r['heading']}" for r in risks[:RISK_DIGEST_TOP * 2])
+    system_prompt = """You are a Senior Risk Analyst. Summarize the most material risks of a company
+    from its 10-K risk factor headings. Use 3 to 6 short bullet points. Do not invent risks."""
+    user_prompt = f"{ticker} FY{year or '?'} 10-K, Item 1A risk factor headings:\n{headings}"
+    answer = get_llm_response_internal(system_prompt, user_prompt)
+    return None if answer.startswith("Error") else answer
+
+def to_dict(row: models.RiskDigest):
+    return {
+        "ticker": row.ticker,
+        "accession": row.accession,
+        "fiscal_year": row.fiscal_year,
+        "categories": json.loads(row.categories or "{}"),
+        "top_risks": json.loads(row.top_risks or "[]"),
+        "headings": json.loads(row.headings or "[]"),
+        "added_headings": json.loads(row.added_headings or "[]"),
+        "removed_headings": json.loads(row.removed_headings or "[]"),
+        "compared_to": row.compared_to,
+        "summary": row.summary,
+    }
+
+def materialize_digest(ticker: str, metadata: dict, chunks, session_factory=SessionLocal, summarize: bool = None):
+    """
+    Builds and stores the digest of one filing from its chunks (only Item 1A
+    is read): categories, top risks with supporting chunk ids and the headings
+    added or removed since the prior year's digest. Re-running it for the same
+    accession replaces the digest. Returns it as a dict, or None when no risk
+    factor headings were found.
+    """
+    ticker = ticker.upper()
+    accession = metadata["accession"]
+    year = metadata.get("fiscal_year") or fiscal_year(metadata.get("period"))
+    risks = extract_risks(chunks, {"ticker": ticker, "accession": accession})
+    if not risks:
+        print(f"⚠️  No risk factor headings found for {ticker} {accession}; no digest")
+        return None
+    headings = [r["heading"] for r in risks]
+    categories = {}
+    for risk in risks:
+        categories[risk["category"]] = categories.get(risk["category"], 0) + 1
+
+    db = session_factory()
+    try:
+        previous = None
+        if year:
+            previous = (db.query(models.RiskDigest)
+                        .filter(models.RiskDigest.ticker == ticker,
+                                models.RiskDigest.fiscal_year < year)
+                        .order_by(models.RiskDigest.fiscal_year.desc())
+                        .first())
+        previous = to_dict(previous) if previous is not None else None
+    finally:
+        db.close()
+    added, removed = diff_headings(previous["headings"], headings) if previous else ([], [])
+
+    # The slow part; the database session isn't held open while the model writes
+    if summarize is None:
+        summarize = RISK_DIGEST_SUMMARY
+    summary = _summarize(ticker, year, risks) if summarize else None
+
+    db = session_factory()
+    try:
+        row = db.query(models.RiskDigest).filter(models.RiskDigest.accession == accession).first()
+        if row is None:
+            row = models.RiskDigest(accession=accession)
+            db.add(row)
+        row.ticker = ticker
+        row.fiscal_year = year
+        row.categories = json.dumps(dict(sorted(categories.items(), key=lambda c: -c[1])))
+        row.top_risks = json.dumps(risks[:RISK_DIGEST_TOP])
+        row.headings = json.dumps(headings)
+        row.added_headings = json.dumps(added)
+        row.removed_headings = json.dumps(removed)
+        row.compared_to = previous["accession"] if previous else None
+        row.summary = summary
+        db.commit()
+        digest = to_dict(row)
+    finally:
+        db.close()
+    print(f"🧾 Risk digest for {ticker} FY{year}: {len(risks)} risks, "
+          f"{len(added)} added / {len(removed)} removed vs. prior year")
+    return digest
+
+def has_digest(accession: str, session_factory=SessionLocal):
+    db = session_factory()
+    try:
+        return db.query(models.RiskDigest.id).filter(models.RiskDigest.accession == accession).first() is not None
+    finally:
+        db.close()
+
+def find_digest(ticker: str, year: int = None, session_factory=SessionLocal):
+    """
+    The digest of a ticker's filing for that fiscal year, or its latest one.
+    """
+    db = session_factory()
+    try:
+        query = db.query(models.RiskDigest).filter(models.RiskDigest.ticker == ticker.upper())
+        if year:
+            query = query.filter(models.RiskDigest.fiscal_year == int(year))
+        row = query.order_by(models.RiskDigest.fiscal_year.desc(), models.RiskDigest.id.desc()).first()
+        return to_dict(row) if row is not None else None
+    finally:
+        db.close()
+
+def digest_for_filters(filters: dict, session_factory=SessionLocal):
+    """
+    The digest that covers a retrieval scope (from vector_store.build_filter):
+    one ticker, optionally a year, and no Item other than 1A.
+    """
+    if not RISK_DIGEST or not filters or not filters.get("ticker"):
+        return None
+    if filters.get("item") not in (None, "1A") or filters.get("form") not in (None, "10-K"):
+        return None
+    return find_digest(filters["ticker"], filters.get("fiscal_year"), session_factory)
+
+# --- QUERY PATH ---
+_changes = re.compile(r"\b(new|added|emerging|removed|dropped|changed|changes|year[- ]over[- ]year)\b", re.IGNORECASE)
+_overview = re.compile(r"\b(main|key|top|biggest|major|primary|principal|most (important|significant|material)|"
+                       r"summar\w*|overview)\b[\w\s,'’-]*\brisk", re.IGNORECASE)
+# "key risks about China" asks for one topic: that needs retrieval, not the overview
+_topic = re.compile(r"\b(about|related to|regarding|concerning|involving)\b", re.IGNORECASE)
+
+def _title(digest):
+    year = f" FY{digest['fiscal_year']}" if digest.get("fiscal_year") else ""
+    return f"{digest['ticker']}{year} 10-K"
+
+def _top_lines(digest):
+    return [f"{i}. {risk['heading']} [{risk['category']}]" for i, risk in enumerate(digest["top_risks"], start=1)]
+
+def _category_line(digest):
+    return ", ".join(f"{name} ({count})" for name, count in digest["categories"].items())
+
+def answer_from_digest(question: str, digest: dict):
+    """
+    Answers overview questions ("what are the key risks?", "which risks are
+    new this year?") straight from the digest. None when the question asks
+    for something the digest can't answer; the caller then runs the RAG path.
+    """
+    if not digest or "risk" not in question.lower() or _topic.search(question):
+        return None
+    if _changes.search(question):
+        if not digest["compared_to"]:
+            return None
+        lines = [f"Changes in the risk factors of the {_title(digest)} compared with the prior-year filing:"]
+        lines += ["", "Added:"] + [f"- {h}" for h in digest["added_headings"] or ["(none)"]]
+        lines += ["", "Removed:"] + [f"- {h}" for h in digest["removed_headings"] or ["(none)"]]
+        return "\n".join(lines)
+    if not _overview.search(question):
+        return None
+    lines = [f"Key risk factors in the {_title(digest)} (Item 1A):"]
+    if digest["summary"]:
+        lines += ["", digest["summary"].strip()]
+    lines += [""] + _top_lines(digest)
+    lines += ["", f"Risk factors by category: {_category_line(digest)}"]
+    return "\n".join(lines)
+
+def digest_context(digest: dict, max_tokens: int = None):
+    """
+    The digest as a compact prompt section, placed ahead of the retrieved passages.
+    With max_tokens, the year-over-year lines and then the lowest-ranked risks
+    are left out until it fits; None if not even one risk fits.
+    """
+    header = [f"RISK DIGEST ({_title(digest)}, Item 1A)", f"Categories: {_category_line(digest)}", "Top risks:"]
+    risks = [f"- {risk['heading'][:200]}" for risk in digest["top_risks"]]
+    changes = []
+    if digest["compared_to"] and (digest["added_headings"] or digest["removed_headings"]):
+        changes.append(f"New vs. prior year: {'; '.join(h[:120] for h in digest['added_headings']) or 'none'}")
+        changes.append(f"Dropped vs. prior year: {'; '.join(h[:120] for h in digest['removed_headings']) or 'none'}")
+    text = "\n".join(header + risks + changes)
+    while max_tokens is not None and estimate_tokens(text) > max_tokens:
+        if changes:
+            changes = []
+        elif len(risks) > 1:
+            risks.pop()
+        else:
+            return None
+        text = "\n".join(header + risks + changes)
+    return text
@@ -1,29 +1,360 @@
+import asyncio
+import hashlib
 import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEndpointEmbeddings
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.embedding_pipeline import ResilientEmbeddings, embed_and_store
+from app.services.lexical_index import LexicalIndex
+from app.services.index_versions import IndexVersions, CHROMA_DIR, LEXICAL_FILE, MMAP_DIR
+from app.services.metrics import FALLBACKS, timed
 
 # --- CONFIGURATION ---
 current_file = Path(__file__).resolve()
 project_root = current_file.parent.parent.parent # backend/
 data_folder = project_root / "data"
-vector_db_path = project_root / "chroma_db" # Where we save the DB
+# Where we save the DB (override with CHROMA_PERSIST_DIR, e.g. a mounted volume)
+vector_db_path = Path(os.getenv("CHROMA_PERSIST_DIR", str(project_root / "chroma_db")))
+# On-disk embedding cache, kept next to the vector DB by default
+embedding_cache_path = Path(os.getenv("EMBEDDING_CACHE_PATH", str(vector_db_path.parent / "embedding_cache.sqlite3")))
+# BM25 index over the same chunks, also next to the vector DB
+lexical_index_path = Path(os.getenv("LEXICAL_INDEX_PATH", str(vector_db_path.parent / "lexical_index.sqlite3")))
+
+# "chroma", or "mmap": a memory-mapped, optionally quantized NumPy index that
+# worker processes share through the page cache (see mmap_vector_store)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+mmap_index_path = Path(os.getenv("MMAP_INDEX_PATH", str(vector_db_path.parent / "mmap_index")))
+
+# "hybrid" (dense + BM25, fused), "dense" or "lexical"
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+RRF_K = 60                # reciprocal rank fusion constant (60 is the usual choice)
+DENSE_TIMEOUT = float(os.getenv("DENSE_TIMEOUT", "3"))         # seconds before we answer from BM25 alone
+DENSE_BACKOFF = float(os.getenv("DENSE_BACKOFF", "30"))        # seconds to skip dense search after a failure
+
+# Multi-process mode (several uvicorn workers, a separate ingestion process):
+# every process reads the version published under VECTOR_INDEX_ROOT and follows
+# new ones; writes go to a fresh copy that is published atomically (see IndexVersions).
+# Unset, everything lives in vector_db_path / lexical_index_path as before (one process only).
+VECTOR_INDEX_ROOT = os.getenv("VECTOR_INDEX_ROOT")
+VECTOR_INDEX_POLL = float(os.getenv("VECTOR_INDEX_POLL", "2"))  # seconds between checks for a new version
 
 # Define the Embedding Model (Converts text -> numbers)
 # We use a small, fast model explicitly for this
 repo_id = "sentence-transformers/all-MiniLM-L6-v2"
+# Point at a self-hosted (or stub) feature-extraction server instead of the HF API
+embedding_endpoint = os.getenv("EMBEDDING_ENDPOINT_URL") or repo_id
 
-embedding_model = HuggingFaceEndpointEmbeddings(
-    model=repo_id,
-    task="feature-extraction",
-    huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN")
+# Every text is embedded remotely at most once; repeats come from the disk cache.
+# Cache misses go out rate limited, batched and retried.
+embedding_model = CachedEmbeddings(
+    ResilientEmbeddings(
+        HuggingFaceEndpointEmbeddings(
+            model=embedding_endpoint,
+            task="feature-extraction",
+            huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN")
+        )
+    ),
+    model_id=embedding_endpoint,
+    path=embedding_cache_path
 )
 
+# --- SHARED STORE HANDLE ---
+# One Chroma client per process. Opening the persistent directory is expensive,
+# so ingestion and queries all go through get_vector_store() instead.
+_store_lock = threading.Lock()
+_vector_store = None
+_retrievers = {}
+_lexical_index = None
+# While the embedding endpoint is failing, hybrid retrieval goes lexical-only until this time
+_dense_down_until = 0.0
+# Bumped whenever documents are added, so caches built on the old corpus go stale
+_corpus_version = 0
+
+_versions = IndexVersions(VECTOR_INDEX_ROOT, seed_chroma=vector_db_path, seed_lexical=lexical_index_path,
+                          seed_mmap=mmap_index_path) if VECTOR_INDEX_ROOT else None
+_open_version = None   # version our handles point at (multi-process mode)
+_version_checked_at = 0.0
+_retired_versions = []  # (name, store, lexical index) kept open for in-flight queries
+_publishing = threading.local()
+
+def _open_store(path):
+    if VECTOR_BACKEND == "mmap":
+        from app.services.mmap_vector_store import MmapVectorStore
+        return MmapVectorStore(path, embedding_model)
+    return Chroma(persist_directory=str(path), embedding_function=embedding_model)
+
+def _close_store(store, path):
+    if VECTOR_BACKEND == "mmap":
+        store.close()
+    else:
+        _close_chroma(path)
+
+def _finish_writes(store):
+    if VECTOR_BACKEND == "mmap":
+        store.maybe_train_ivf()
+
+def _close_chroma(path):
+    # Chroma keeps one client system per directory for the life of the process
+    from chromadb.api.client import SharedSystemClient
+    system = SharedSystemClient._identifier_to_system.pop(str(path), None)
+    if system is not None:
+        system.stop()
+
+def _follow_current_version():
+    """
+    Multi-process mode: at most every VECTOR_INDEX_POLL seconds, look at
+    CURRENT and move this process's handles to a newly published version.
+    Queries already running keep the handles they hold.
+    """
+    global _open_version, _version_checked_at, _vector_store, _lexical_index
+    now = time.monotonic()
+    if _open_version is not None and now - _version_checked_at < VECTOR_INDEX_POLL:
+        return
+    _version_checked_at = now
+    # Nothing published yet: publish the pre-versioning directories (or an empty index)
+    name = _versions.ensure_current()
+    if name == _open_version:
+        return
+    with _store_lock:
+        if name == _open_version:
+            return
+        previous, _open_version = _open_version, name
+        if previous is not None:
+            _retired_versions.append((previous, _vector_store, _lexical_index))
+        _vector_store = None
+        _lexical_index = None
+        _retrievers.clear()
+        # Keep the previous version open for in-flight queries; close the one before
+        while len(_retired_versions) > 1:
+            _close_version(*_retired_versions.pop(0))
+    if previous is not None:
+        print(f"🔄 Switched to index version {name}")
+        bump_corpus_version()
+
+def _close_version(name, store, lexical):
+    path = _versions.path(name) / _store_dir()
+    if store is not None:
+        _close_store(store, path)
+    elif VECTOR_BACKEND != "mmap":
+        _close_chroma(path)  # a client may exist even if we never kept the handle
+    if lexical is not None:
+        lexical.close()
+
+def _store_dir():
+    return MMAP_DIR if VECTOR_BACKEND == "mmap" else CHROMA_DIR
+
+def _store_path():
+    if _versions is not None:
+        return _versions.path(_open_version) / _store_dir()
+    return mmap_index_path if VECTOR_BACKEND == "mmap" else vector_db_path
+
+def _lexical_path():
+    return _versions.lexical_path(_open_version) if _versions is not None else lexical_index_path
+
+def get_vector_store():
+    """
+    Returns the process-wide vector store handle (Chroma or MmapVectorStore,
+    per VECTOR_BACKEND), opening it on first use.
+    """
+    global _vector_store
+    if _versions is not None:
+        _follow_current_version()
+    if _vector_store is None:
+        with _store_lock:
+            if _vector_store is None:
+                _vector_store = _open_store(_store_path())
+    return _vector_store
+
+def get_lexical_index():
+    global _lexical_index
+    if _versions is not None:
+        _follow_current_version()
+    if _lexical_index is None:
+        with _store_lock:
+            if _lexical_index is None:
+                _lexical_index = LexicalIndex(_lexical_path())
+    return _lexical_index
+
+@contextmanager
+def publishing():
+    """
+    Yields (store, lexical index) to write to. In multi-process mode that is a
+    new index version, published to every process when the block exits, so
+    wrap a batch of sync_documents calls in one publishing() to pay for one
+    copy instead of one per filing. Nested calls join the outer block.
+    Otherwise it is just the live handles.
+    """
+    global _version_checked_at
+    active = getattr(_publishing, "target", None)
+    if active is not None:
+        yield active
+        return
+    if _versions is None:
+        store, lexical = get_vector_store(), get_lexical_index()
+        _publishing.target = (store, lexical)
+        try:
+            yield store, lexical
+        finally:
+            _publishing.target = None
+        _finish_writes(store)
+        return
+    with _versions.publish() as path:
+        store, lexical = _open_store(path / _store_dir()), LexicalIndex(path / LEXICAL_FILE)
+        _publishing.target = (store, lexical)
+        try:
+            yield store, lexical
+            _finish_writes(store)
+        finally:
+            _publishing.target = None
+            # Flush everything to disk before the version becomes visible
+            lexical.close()
+            _close_store(store, path / _store_dir())
+    # Our own write is visible to us right away, not after the next poll
+    _version_checked_at = 0.0
+    _follow_current_version()
+
+def refresh_vector_store():
+    """
+    Drops the cached handle so the next call reopens the persistent directory.
+    Call this after the index was rebuilt or written by someone else.
+    """
+    global _vector_store, _lexical_index, _dense_down_until, _open_version
+    with _store_lock:
+        _vector_store = None
+        _lexical_index = None
+        _open_version = None
+        _dense_down_until = 0.0
+        _retrievers.clear()
+        # Chroma caches clients per path; clear it or we'd get the old one back
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
+
+def get_corpus_version():
+    # Answer-cache keys must move as soon as another process publishes a
+    # version, not at this worker's next retrieval (still VECTOR_INDEX_POLL limited)
+    if _versions is not None:
+        _follow_current_version()
+    return _corpus_version
+
+def bump_corpus_version():
+    global _corpus_version
+    with _store_lock:
+        _corpus_version += 1
+        return _corpus_version
+
+def add_embedded_documents(documents, vectors, ids=None, target=None):
+    """
+    Writes already-embedded chunks, so the store doesn't embed them a second time.
+    target is a (store, lexical index) pair from publishing(); defaults to the live handles.
+    """
+    if not documents:
+        return
+    store, lexical = target or (get_vector_store(), get_lexical_index())
+    if ids is None:
+        ids = [doc.metadata.get("chunk_id") or str(uuid.uuid4()) for doc in documents]
+    store._collection.upsert(
+        ids=ids,
+        embeddings=vectors,
+        documents=[doc.page_content for doc in documents],
+        # Chroma rejects empty metadata dicts
+        metadatas=[doc.metadata or None for doc in documents]
+    )
+    lexical.add(documents, ids=ids)
+
+def get_chunk_vectors(documents):
+    """
+    Stored embeddings for retrieved chunks, aligned with documents (None where
+    a doc has no chunk_id). A local lookup; nothing is re-embedded.
+    """
+    ids = [doc.metadata.get("chunk_id") for doc in documents]
+    wanted = [cid for cid in ids if cid]
+    if not wanted:
+        return [None] * len(documents)
+    stored = get_vector_store()._collection.get(ids=wanted, include=["embeddings"])
+    by_id = dict(zip(stored["ids"], stored["embeddings"]))
+    return [by_id.get(cid) if cid else None for cid in ids]
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def chunk_id(scope: dict, text: str) -> str:
+    """
+    Deterministic id: the same text in the same filing always maps to the same row.
+    """
+    key = "|".join(f"{k}={scope[k]}" for k in sorted(scope))
+    return hashlib.sha256(f"{key}|{content_hash(text)}".encode()).hexdigest()
+
+def _where(scope: dict):
+    clauses = [{k: v} for k, v in sorted(scope.items())]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def sync_documents(documents, scope: dict, on_progress=None):
+    """
+    Idempotent ingest for one filing (or file), identified by scope,
+    e.g. {"ticker": "AAPL", "accession": "0000320193-23-000106"}.
+    Chunks get ids from scope + content hash and the scope as metadata.
+    Unchanged chunks are skipped, new ones embedded and added, and chunks
+    that disappeared from this filing are deleted.
+    documents may be a generator: chunks are embedded as they stream in and
+    only their ids are kept, so memory doesn't grow with the filing.
+    Returns {"total", "added", "skipped", "deleted"}.
+    In multi-process mode the change is published as a new index version
+    (or joins the enclosing publishing() block).
+    """
+    with publishing() as target:
+        return _sync_into(target, documents, scope, on_progress)
+
+def _sync_into(target, documents, scope: dict, on_progress=None):
+    store, lexical = target
+    existing = set(store._collection.get(where=_where(scope), include=[])["ids"])
+    seen = set()
+    added = 0
+
+    def new_chunks():
+        nonlocal added
+        for doc in documents:
+            cid = chunk_id(scope, doc.page_content)
+            if cid in seen:
+                continue # identical chunks collapse into one
+            seen.add(cid)
+            if cid in existing:
+                continue
+            doc.metadata = {**doc.metadata, **scope, "chunk_hash": content_hash(doc.page_content), "chunk_id": cid}
+            added += 1
+            yield doc
+
+    def write(batch, vectors):
+        add_embedded_documents(batch, vectors, target=target)
+
+    embed_and_store(new_chunks(), store.embeddings, write, on_progress=on_progress)
+
+    to_delete = list(existing - seen)
+    if to_delete:
+        store._collection.delete(ids=to_delete)
+        lexical.delete(to_delete)
+    if added or to_delete:
+        bump_corpus_version()
+
+    return {
+        "total": len(seen),
+        "added": added,
+        "skipped": len(seen) - added,
+        "deleted": len(to_delete),
+    }
+
 def build_vector_db():
+    # Only this legacy PDF path needs these; they add seconds to every import of this module
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     pdf_path = data_folder / "apple_10k.pdf"
-    
+
     if not pdf_path.exists():
         print(f"❌ CRITICAL ERROR: File not found at {pdf_path}")
         print("Please download a 10-K PDF and rename it to 'apple_10k.pdf'")
@@ -42,20 +373,149 @@ def build_vector_db():
 
     print("--- 3. CREATING VECTOR DATABASE (This may take a minute) ---")
     # This actually sends data to the embedding model and saves to disk
-    vectorstore = Chroma.from_documents(
-        documents=splits,
-        embedding=embedding_model,
-        persist_directory=str(vector_db_path)
-    )
+    # Re-running the script only embeds what changed in the PDF
+    sync_documents(splits, scope={"source": str(pdf_path)})
     print(f"🎉 Success! Vector DB saved to {vector_db_path}")
 
-def get_retriever():
-    # Helper function to load the DB later for querying
-    vectorstore = Chroma(
-        persist_directory=str(vector_db_path), 
-        embedding_function=embedding_model
-    )
-    return vectorstore.as_retriever(search_kwargs={"k": 3}) # Retrieve top 3 matches
+def build_filter(ticker: str = None, year: int = None, item: str = None, form: str = None):
+    """
+    Metadata filter for retrieval, e.g. build_filter(ticker="NVDA", item="1A").
+    Returns None when nothing is set (search the whole corpus).
+    """
+    scope = {}
+    if ticker:
+        scope["ticker"] = ticker.upper()
+    if year:
+        scope["fiscal_year"] = int(year)
+    if item:
+        scope["item"] = item.upper().removeprefix("ITEM").strip()
+    if form:
+        scope["form"] = form.upper()
+    return scope or None
+
+def get_retriever(k: int = 3, filters: dict = None):
+    """
+    filters (see build_filter) are applied by the store before scoring,
+    so only the matching slice of the corpus is searched.
+    """
+    if filters:
+        return get_vector_store().as_retriever(search_kwargs={"k": k, "filter": _where(filters)})
+    # Retrievers are thin wrappers, but there is no reason to rebuild them per query
+    retriever = _retrievers.get(k)
+    if retriever is None:
+        retriever = get_vector_store().as_retriever(search_kwargs={"k": k}) # Retrieve top k matches
+        _retrievers[k] = retriever
+    return retriever
+
+async def aembed_question(question: str):
+    with timed("embed_question"):
+        return await get_vector_store().embeddings.aembed_query(question)
+
+async def aembed_questions(questions):
+    """
+    Several questions in one embedding request (the cache keys them like
+    single questions, so either path reuses the other's vectors).
+    """
+    with timed("embed_question"):
+        return await get_vector_store().embeddings.aembed_documents(list(questions))
+
+async def _adense(question: str, k: int, query_vector=None, filters: dict = None):
+    store = get_vector_store()
+    if query_vector is None:
+        query_vector = await aembed_question(question)
+    with timed("vector_search"):
+        if filters:
+            return await store.asimilarity_search_by_vector(query_vector, k=k, filter=_where(filters))
+        return await store.asimilarity_search_by_vector(query_vector, k=k)
+
+def _doc_key(doc):
+    return doc.metadata.get("chunk_id") or doc.page_content
+
+def rrf_fuse(rankings, k: int, rrf_k: int = RRF_K):
+    """
+    Reciprocal rank fusion: each list contributes 1 / (rrf_k + rank) per document.
+    Documents found by several retrievers float to the top; scores never
+    have to be comparable across retrievers.
+    """
+    scores, docs = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in best]
+
+def lexical_search(question: str, k: int = 3, filters: dict = None):
+    """
+    BM25-only retrieval: no embedding call, a few milliseconds locally.
+    """
+    with timed("lexical_search"):
+        return [doc for doc, _ in get_lexical_index().search(question, k=k, filters=filters)]
+
+def _dense_unavailable(e: Exception):
+    """
+    Whether a dense-search failure means the endpoint is down or overloaded:
+    timeouts, connection errors and 429/5xx responses.
+    """
+    status = getattr(e, "status", None) or getattr(getattr(e, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    # aiohttp/httpx connection errors don't all derive from OSError
+    return isinstance(e, (asyncio.TimeoutError, TimeoutError, OSError)) \
+        or type(e).__module__.split(".")[0] in ("aiohttp", "httpx")
+
+async def aretrieve(question: str, k: int = 3, query_vector=None, filters: dict = None, mode: str = None):
+    """
+    Async retrieval: the embedding call is awaited on the endpoint's async client,
+    only the local lookups run in an executor.
+    Pass query_vector if the question was already embedded.
+    In hybrid mode BM25 and dense search run side by side and are fused with RRF.
+    If the embedding endpoint is slow (DENSE_TIMEOUT) or unreachable, we answer
+    from BM25 alone and leave dense search alone for DENSE_BACKOFF seconds;
+    any other error is raised.
+    """
+    global _dense_down_until
+    mode = mode or RETRIEVAL_MODE
+    if mode == "dense":
+        return await _adense(question, k, query_vector, filters)
+    if mode == "lexical":
+        return await asyncio.to_thread(lexical_search, question, k, filters)
+
+    # Fetch deeper than k from each side so fusion has something to work with
+    fetch_k = max(4 * k, 20)
+    lexical = asyncio.ensure_future(asyncio.to_thread(lexical_search, question, fetch_k, filters))
+    if query_vector is None and time.monotonic() < _dense_down_until:
+        FALLBACKS.inc(kind="bm25_only")
+        return (await lexical)[:k]
+
+    try:
+        dense = await asyncio.wait_for(_adense(question, fetch_k, query_vector, filters), DENSE_TIMEOUT)
+    except Exception as e:
+        if not _dense_unavailable(e):
+            # A bug or a bad request: surface it, don't switch dense off for everyone
+            lexical.cancel()
+            raise
+        _dense_down_until = time.monotonic() + DENSE_BACKOFF
+        print(f"⚠️  Dense retrieval unavailable ({type(e).__name__}: {e}); using BM25 only")
+        FALLBACKS.inc(kind="bm25_only")
+        return (await lexical)[:k]
+    return rrf_fuse([dense, await lexical], k)
+
+def retrieve(question: str, k: int = 3, filters: dict = None, mode: str = None):
+    """
+    Sync wrapper around aretrieve, for scripts and the sync query_rag path.
+    Called from inside a running event loop (where asyncio.run refuses to
+    start), it runs on a worker thread and blocks that loop until done;
+    async code should await aretrieve instead.
+    """
+    coro = aretrieve(question, k=k, filters=filters, mode=mode)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
 
 if __name__ == "__main__":
-    build_vector_db()
\ No newline at end of file
+    build_vector_db()
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+# --- CONFIGURATION ---
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "10"))  # wait between retries of a failed check
+WARMUP_RECHECK_SECONDS = float(os.getenv("WARMUP_RECHECK_SECONDS", "30"))  # re-check of required ones once all are up
+
+@dataclass
+class DependencyState:
+    name: str
+    required: bool
+    status: str = "pending"  # pending -> ready | failed (retried); ready -> failed if a re-check fails
+    error: Optional[str] = None
+    attempts: int = 0
+    seconds: Optional[float] = None  # how long the successful check took
+    ready_at: Optional[float] = None
+
+    def to_dict(self):
+        return asdict(self)
+
+class Warmup:
+    """
+    Brings heavy dependencies up in a background thread after the server
+    started listening, instead of at import time. checks maps a name to
+    (callable, required); a check that raises is retried every retry_seconds.
+    The service is ready once every required check has passed; the others
+    only show up in the report (e.g. an LLM without a token is degraded, not down).
+    Once everything is up, required checks keep running every recheck_seconds,
+    so a dependency that goes away later makes the service not ready again.
+    """
+
+    def __init__(self, checks: dict, retry_seconds: float = WARMUP_RETRY_SECONDS,
+                 recheck_seconds: float = WARMUP_RECHECK_SECONDS):
+        self.checks = checks
+        self.retry_seconds = retry_seconds
+        self.recheck_seconds = recheck_seconds
+        self.states = {name: DependencyState(name, required) for name, (_, required) in checks.items()}
+        self.started_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        recheck = False
+        while not self._stop.is_set():
+            for name, (check, required) in self.checks.items():
+                state = self.states[name]
+                if state.status == "ready" and not (recheck and required):
+                    continue
+                self._check(name, check, state)
+            recheck = all(state.status == "ready" for state in self.states.values())
+            self._stop.wait(self.recheck_seconds if recheck else self.retry_seconds)
+
+    def _check(self, name, check, state):
+        was_ready = state.status == "ready"
+        if not was_ready:
+            state.attempts += 1
+        started = time.perf_counter()
+        try:
+            check()
+        except Exception as e:
+            state.status = "failed"
+            state.error = f"{type(e).__name__}: {e}"
+            print(f"⚠️  Warm-up: {name} {'went down' if was_ready else 'not ready'} ({state.error})")
+            return
+        if was_ready:
+            return
+        state.seconds = round(time.perf_counter() - started, 3)
+        state.status = "ready"
+        state.error = None
+        state.ready_at = time.time()
+        print(f"✅ Warm-up: {name} ready in {state.seconds}s")
+
+    def wait(self, timeout: float = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def ready(self):
+        return all(state.status == "ready" for state in self.states.values() if state.required)
+
+    def report(self):
+        return {
+            "ready": self.ready,
+            "dependencies": {name: state.to_dict() for name, state in self.states.items()},
+        }
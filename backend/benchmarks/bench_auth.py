@@ -0,0 +1,90 @@
+"""
+Per-request auth overhead: principal cache on vs off, and Google sign-in
+verification with the cached cert store vs fetching certs every time.
+
+    cd backend && python -m benchmarks.bench_auth --requests 2000 --cert-latency 0.05
+
+Uses a throwaway SQLite database and a local stub of Google's cert endpoint.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_servers import StubCertServer, make_google_id_token, make_signing_key
+
+
+def report(name, latencies):
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(0.95 * (len(latencies) - 1))] * 1000
+    print(f"{name:<28} {p50:>9.3f} {p95:>9.3f}")
+
+
+async def resolve(auth, token, requests, cached):
+    from app.database import SessionLocal
+
+    latencies = []
+    for _ in range(requests):
+        if not cached:
+            auth.principal_cache.clear()
+        db = SessionLocal()
+        start = time.perf_counter()
+        await auth.get_current_user(token=token, db=db)
+        latencies.append(time.perf_counter() - start)
+        db.close()
+    return latencies
+
+
+def verify(store_factory, token, audience, requests):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        store_factory().verify(token, audience)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--google-requests", type=int, default=50)
+    parser.add_argument("--cert-latency", type=float, default=0.05, help="stub seconds per cert fetch")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        from app import auth, models
+        from app.database import SessionLocal, engine
+        from app.services.auth_cache import GoogleCertStore
+
+        models.Base.metadata.create_all(bind=engine)
+        db = SessionLocal()
+        db.add(models.User(email="bench@example.com", hashed_password=auth.get_password_hash("pw")))
+        db.commit()
+        db.close()
+        token = auth.create_access_token({"sub": "bench@example.com"})
+
+        print(f"{'case':<28} {'p50 ms':>9} {'p95 ms':>9}")
+        report("principal, uncached", asyncio.run(resolve(auth, token, args.requests, cached=False)))
+        report("principal, cached", asyncio.run(resolve(auth, token, args.requests, cached=True)))
+
+        signer, certs = make_signing_key()
+        id_token = make_google_id_token(signer, "bench@example.com", "bench-client")
+        with StubCertServer(certs, latency=args.cert_latency) as stub:
+            report("google, fetch per sign-in",
+                   verify(lambda: GoogleCertStore(url=stub.url), id_token, "bench-client", args.google_requests))
+            shared = GoogleCertStore(url=stub.url)
+            report("google, cached certs",
+                   verify(lambda: shared, id_token, "bench-client", args.google_requests))
+            print(f"\ncert fetches: {stub.requests}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Ingestion throughput against a local stub embedding server.
+
+    cd backend && python -m benchmarks.bench_ingest --chunks 2000 --latency 0.2
+
+Compares the old single add_documents() style (one request, no parallelism)
+with the batched, concurrent pipeline, and reports chunks/sec for each.
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_huggingface import HuggingFaceEndpointEmbeddings
+
+from app.services.embedding_pipeline import ResilientEmbeddings, embed_and_store
+from benchmarks.stub_servers import StubEmbeddingServer
+
+
+def make_chunks(n):
+    return [
+        Document(page_content=f"Item 1A chunk {i}: supply chain, tariffs and litigation risk " * 20, metadata={"n": i})
+        for i in range(n)
+    ]
+
+
+def run_case(stub, chunks, batch_size, concurrency, rate):
+    remote = HuggingFaceEndpointEmbeddings(model=stub.url, task="feature-extraction", huggingfacehub_api_token="stub")
+    embedder = ResilientEmbeddings(remote, batch_size=batch_size, rate_per_sec=rate)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = Chroma(persist_directory=tmp, embedding_function=embedder)
+
+        def write(batch, vectors):
+            store._collection.upsert(
+                ids=[str(doc.metadata["n"]) for doc in batch],
+                embeddings=vectors,
+                documents=[doc.page_content for doc in batch],
+                metadatas=[doc.metadata for doc in batch],
+            )
+
+        start = time.perf_counter()
+        written = embed_and_store(chunks, embedder, write, batch_size=batch_size, max_concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+    return written / elapsed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.1, help="stub seconds per request")
+    parser.add_argument("--per-item-latency", type=float, default=0.002, help="stub seconds per text")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of stub requests that 503")
+    parser.add_argument("--rate", type=float, default=50.0, help="client requests per second")
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.chunks)
+    cases = [
+        ("single request (old path)", args.chunks, 1),
+        ("batch=32, concurrency=1", 32, 1),
+        ("batch=32, concurrency=4", 32, 4),
+        ("batch=32, concurrency=8", 32, 8),
+    ]
+    with StubEmbeddingServer(latency=args.latency, per_item_latency=args.per_item_latency, fail_rate=args.fail_rate) as stub:
+        print(f"{'case':<28} {'chunks/sec':>12} {'seconds':>9}")
+        for name, batch_size, concurrency in cases:
+            rate, elapsed = run_case(stub, chunks, batch_size, concurrency, args.rate)
+            print(f"{name:<28} {rate:>12.1f} {elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
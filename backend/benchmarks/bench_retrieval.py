@@ -0,0 +1,128 @@
+"""
+Retrieval latency and recall@k: BM25 only, dense only, and hybrid (RRF).
+
+    cd backend && python -m benchmarks.bench_retrieval --latency 0.15 --k 3
+
+Builds a synthetic 10-K corpus (a few tickers x risk topics, plus filler),
+ingests it through sync_documents into a temporary store and asks one
+question per gold chunk. Dense search embeds against a local stub server
+with hashed vectors; pass --endpoint to measure a real embedding model.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.documents import Document
+
+from benchmarks.stub_servers import StubEmbeddingServer
+
+TICKERS = {
+    "AAPL": "Braeburn Capital",
+    "NVDA": "Mellanox Technologies",
+    "TSLA": "Maxwell Technologies",
+    "XOM": "XTO Energy",
+    "JPM": "Chase Bank USA",
+}
+
+# (topic, chunk template, question template); questions mix exact terms and paraphrase
+TOPICS = [
+    ("tariffs", "{t} imports components subject to Section 232 tariffs on steel and aluminum, which could raise costs.",
+     "What does {t} say about Section 232 tariffs?"),
+    ("china", "A significant portion of {t} manufacturing is performed by partners located in China and Taiwan.",
+     "How dependent is {t} on manufacturing partners in China?"),
+    ("subsidiary", "{t} relies on its subsidiary {s} for a material share of operations and cash management.",
+     "What role does {s} play for {t}?"),
+    ("cyber", "{t} could suffer breaches of its information technology systems, ransomware or other cyberattacks.",
+     "Is {t} exposed to cyberattacks or data breaches?"),
+    ("rates", "Changes in interest rates and foreign exchange rates may adversely affect {t} results of operations.",
+     "How do interest rate and currency movements affect {t}?"),
+    ("litigation", "{t} is party to patent infringement lawsuits and antitrust investigations in several jurisdictions.",
+     "Which lawsuits or antitrust investigations involve {t}?"),
+    ("climate", "Climate change regulation, carbon pricing and extreme weather events may disrupt {t} facilities.",
+     "What climate risks does {t} disclose?"),
+    ("talent", "{t} competes intensely for engineering talent and depends on retaining key personnel.",
+     "Does {t} worry about losing key employees?"),
+]
+
+FILLER = (
+    "The Company's results may fluctuate due to general economic conditions, competition, demand, "
+    "pricing pressure, product transitions, supplier performance and other factors described herein."
+)
+
+
+def build_corpus(filler_per_ticker, seed=7):
+    rng = random.Random(seed)
+    vocabulary = sorted({w for _, template, _ in TOPICS for w in template.format(t="", s="").split()})
+    docs, questions = [], []
+    for ticker, subsidiary in TICKERS.items():
+        for topic, template, question in TOPICS:
+            fixture_id = f"{ticker}:{topic}"
+            docs.append(Document(
+                page_content=template.format(t=ticker, s=subsidiary) + " " + FILLER,
+                metadata={"ticker": ticker, "item": "1A", "fixture_id": fixture_id},
+            ))
+            questions.append((question.format(t=ticker, s=subsidiary), fixture_id))
+        for n in range(filler_per_ticker):
+            # Near-misses: boilerplate mixed with vocabulary from the real risk topics
+            words = FILLER.split() + rng.sample(vocabulary, 12)
+            rng.shuffle(words)
+            docs.append(Document(
+                page_content=f"{ticker} " + " ".join(words),
+                metadata={"ticker": ticker, "item": "7", "fixture_id": f"{ticker}:filler{n}"},
+            ))
+    return docs, questions
+
+
+async def run_mode(vector_store, mode, questions, k):
+    latencies, hits = [], 0
+    for question, gold in questions:
+        start = time.perf_counter()
+        docs = await vector_store.aretrieve(question, k=k, mode=mode)
+        latencies.append(time.perf_counter() - start)
+        hits += any(d.metadata.get("fixture_id") == gold for d in docs)
+    return hits / len(questions), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--filler", type=int, default=200, help="filler chunks per ticker")
+    parser.add_argument("--latency", type=float, default=0.1, help="stub seconds per embedding request")
+    parser.add_argument("--endpoint", help="real feature-extraction endpoint instead of the stub")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            StubEmbeddingServer(latency=args.latency, vectors="hashed") as stub:
+        os.environ["CHROMA_PERSIST_DIR"] = str(Path(tmp) / "chroma_db")
+        from langchain_huggingface import HuggingFaceEndpointEmbeddings
+        from app.services import vector_store
+
+        # No embedding cache: every question pays the remote call, as a new question would
+        vector_store.embedding_model = HuggingFaceEndpointEmbeddings(
+            model=args.endpoint or stub.url, task="feature-extraction",
+            huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN", "stub"),
+        )
+        docs, questions = build_corpus(args.filler)
+        vector_store.sync_documents(docs, scope={"source": "fixture"})
+        print(f"corpus: {len(docs)} chunks, {len(questions)} questions, k={args.k}\n")
+
+        print(f"{'mode':<10} {'recall@k':>9} {'p50 ms':>9} {'p95 ms':>9}")
+        for mode in ("lexical", "dense", "hybrid"):
+            recall, latencies = asyncio.run(run_mode(vector_store, mode, questions, args.k))
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000
+            p95 = latencies[int(0.95 * (len(latencies) - 1))] * 1000
+            print(f"{mode:<10} {recall:>9.2f} {p50:>9.1f} {p95:>9.1f}")
+        vector_store.refresh_vector_store()
+
+
+if __name__ == "__main__":
+    main()
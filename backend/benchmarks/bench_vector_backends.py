@@ -0,0 +1,156 @@
+"""
+Vector backends: Chroma (HNSW) vs the memory-mapped NumPy index
+(VECTOR_BACKEND=mmap) at float32, float16 and int8, with and without IVF.
+
+    cd backend && python -m benchmarks.bench_vector_backends --rows 200000
+
+Every backend indexes the same synthetic clustered 384-d vectors (the size
+of all-MiniLM-L6-v2) in its own process and answers the same queries.
+Reports build time, size on disk, memory after the queries (private heap vs
+file pages the OS can share between workers), query p50/p95 and recall@10
+against an exact search.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BACKEND_DIR))
+
+RESULT_PREFIX = "BENCH-RESULT "
+DIM = 384
+# name -> (backend, dtype, ivf)
+BACKENDS = {
+    "chroma": ("chroma", None, False),
+    "mmap-float32": ("mmap", "float32", False),
+    "mmap-float16": ("mmap", "float16", False),
+    "mmap-int8": ("mmap", "int8", False),
+    "mmap-int8-ivf": ("mmap", "int8", True),
+}
+
+
+def make_vectors(rows, queries, seed=7):
+    """
+    Clustered unit vectors (chunks of one filing sit close together) and
+    queries drawn near existing rows, like questions about indexed text.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, rows // 200), DIM)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=rows)] + 0.5 * rng.normal(size=(rows, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picks = vectors[rng.integers(rows, size=queries)]
+    probes = picks + 0.3 * rng.normal(size=picks.shape).astype(np.float32) / np.sqrt(DIM)
+    return vectors, probes / np.linalg.norm(probes, axis=1, keepdims=True)
+
+
+def _memory_mb():
+    memory = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon", "RssFile")):
+                name, value, _ = line.split()
+                memory[name.rstrip(":")] = round(int(value) / 1024, 1)
+    return memory
+
+
+def _disk_mb(path):
+    return round(sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file()) / (1 << 20), 1)
+
+
+def child(name, rows, queries, k, workdir):
+    backend, dtype, ivf = BACKENDS[name]
+    vectors, probes = make_vectors(rows, queries)
+    exact = np.argsort(-(probes @ vectors.T), axis=1)[:, :k]
+    ids = [f"c{i}" for i in range(rows)]
+    path = Path(workdir) / name
+    batch = 5000
+
+    started = time.perf_counter()
+    if backend == "chroma":
+        import chromadb
+        collection = chromadb.PersistentClient(path=str(path)).get_or_create_collection("bench")
+        for start in range(0, rows, batch):
+            collection.add(ids=ids[start:start + batch], embeddings=vectors[start:start + batch],
+                           documents=ids[start:start + batch])
+
+        def search(query):
+            return [int(cid[1:]) for cid in collection.query(query_embeddings=[query], n_results=k)["ids"][0]]
+    else:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from app.services.mmap_vector_store import MmapVectorStore
+        store = MmapVectorStore(path, DeterministicFakeEmbedding(size=DIM), dtype=dtype)
+        for start in range(0, rows, batch):
+            store.upsert(ids[start:start + batch], vectors[start:start + batch], ids[start:start + batch])
+        if ivf:
+            store.train_ivf()
+
+        def search(query):
+            return [row for row, _ in store.search_by_vectors([query], k=k)[0]]
+    build_seconds = time.perf_counter() - started
+    del vectors  # what's left in memory from here on is the index, not the fixture
+
+    latencies, recall = [], []
+    for probe, truth in zip(probes, exact):
+        started = time.perf_counter()
+        found = search(probe)
+        latencies.append(time.perf_counter() - started)
+        recall.append(len(set(found) & set(truth.tolist())) / k)
+    latencies.sort()
+    return {
+        "build_s": round(build_seconds, 2),
+        "disk_mb": _disk_mb(path),
+        **{f"{key.lower()}_mb": value for key, value in _memory_mb().items()},
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+        f"recall@{k}": round(float(np.mean(recall)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="comma-separated subset")
+    parser.add_argument("--output", help="also write the results as JSON")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = child(args.child, args.rows, args.queries, args.k, args.workdir)
+        print(RESULT_PREFIX + json.dumps(result), flush=True)
+        return
+
+    results = {}
+    print(f"{args.rows} vectors x {DIM} dims, {args.queries} queries, k={args.k}\n")
+    header = f"{'backend':<15} {'build s':>8} {'disk MB':>8} {'anon MB':>8} {'file MB':>8} " \
+             f"{'p50 ms':>8} {'p95 ms':>8} {'recall':>7}"
+    print(header)
+    with tempfile.TemporaryDirectory(prefix="bench-vectors-") as workdir:
+        for name in args.backends.split(","):
+            command = [sys.executable, "-m", "benchmarks.bench_vector_backends", "--child", name,
+                       "--rows", str(args.rows), "--queries", str(args.queries), "--k", str(args.k),
+                       "--workdir", workdir]
+            process = subprocess.run(command, cwd=BACKEND_DIR, env=os.environ, capture_output=True, text=True)
+            lines = [l for l in process.stdout.splitlines() if l.startswith(RESULT_PREFIX)]
+            if not lines:
+                print(f"{name:<15} failed (exit {process.returncode}): {process.stderr[-500:]}")
+                continue
+            r = results[name] = json.loads(lines[-1][len(RESULT_PREFIX):])
+            print(f"{name:<15} {r['build_s']:>8} {r['disk_mb']:>8} {r.get('rssanon_mb', '-'):>8} "
+                  f"{r.get('rssfile_mb', '-'):>8} {r['p50_ms']:>8} {r['p95_ms']:>8} {r[f'recall@{args.k}']:>7}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
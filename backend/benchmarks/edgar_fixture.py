@@ -0,0 +1,80 @@
+"""
+Synthetic EDGAR full-submission files (the .txt sec-edgar-downloader saves),
+sized like real 10-Ks, so parsing and ingestion can be measured offline.
+"""
+import random
+from pathlib import Path
+
+ITEMS = [
+    ("1", "Business"),
+    ("1A", "Risk Factors"),
+    ("1B", "Unresolved Staff Comments"),
+    ("7", "Management's Discussion and Analysis of Financial Condition and Results of Operations"),
+    ("7A", "Quantitative and Qualitative Disclosures About Market Risk"),
+    ("8", "Financial Statements and Supplementary Data"),
+]
+
+SENTENCES = [
+    "The Company's operations and performance depend significantly on global and regional economic conditions.",
+    "A significant portion of manufacturing is performed by outsourcing partners located primarily in China and Taiwan.",
+    "Tariffs, export controls and other trade restrictions could materially increase costs and reduce demand.",
+    "The Company is subject to complex and changing laws and regulations worldwide, including data privacy rules.",
+    "Information technology systems may be compromised by cyberattacks, ransomware or other malicious conduct.",
+    "Changes in interest rates and foreign currency exchange rates may adversely affect results of operations.",
+    "The Company is party to patent infringement lawsuits and antitrust investigations in several jurisdictions.",
+    "Climate change regulation and extreme weather events may disrupt facilities and supply chains.",
+    "The Company competes intensely for engineering talent and depends on retaining key personnel.",
+    "Net sales decreased compared to the prior year due to lower demand and pricing pressure in several segments.",
+]
+
+def _paragraphs(rng, target_chars):
+    written = 0
+    while written < target_chars:
+        paragraph = " ".join(rng.choice(SENTENCES) for _ in range(rng.randint(3, 8)))
+        html = f"<p style=\"font-family:Times New Roman;font-size:10pt\">{paragraph}</p>\n"
+        written += len(html)
+        yield html
+
+def write_filing(directory, ticker="BENCH", fiscal_year=2023, size_mb=5.0, accession=None, seed=7):
+    """
+    Writes <directory>/<accession>/full-submission.txt of roughly size_mb:
+    an SEC header, the 10-K HTML (items spread across the size) and an
+    exhibit plus a graphic that the parser should skip. Returns the path.
+    """
+    rng = random.Random(seed)
+    accession = accession or f"0000000000-{fiscal_year % 100:02d}-{seed:06d}"
+    path = Path(directory) / accession / "full-submission.txt"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    primary_chars = int(size_mb * 1_000_000 * 0.8)
+    per_item = primary_chars // len(ITEMS)
+
+    with open(path, "w") as f:
+        f.write(
+            f"<SEC-DOCUMENT>{accession}.txt : {fiscal_year + 1}0201\n"
+            f"<SEC-HEADER>{accession}.hdr.sgml : {fiscal_year + 1}0201\n"
+            f"ACCESSION NUMBER:\t\t{accession}\n"
+            "CONFORMED SUBMISSION TYPE:\t10-K\n"
+            f"CONFORMED PERIOD OF REPORT:\t{fiscal_year}1231\n"
+            f"FILED AS OF DATE:\t\t{fiscal_year + 1}0201\n"
+            f"COMPANY CONFORMED NAME:\t\t{ticker} INC\n"
+            "</SEC-HEADER>\n"
+        )
+        f.write(f"<DOCUMENT>\n<TYPE>10-K\n<SEQUENCE>1\n<FILENAME>{ticker.lower()}-{fiscal_year}1231.htm\n<TEXT>\n")
+        f.write("<html><head><style>p {margin:0}</style></head><body>\n")
+        f.write("<div style=\"display:none\"><ix:header><ix:hidden>HIDDEN-XBRL-FACT</ix:hidden></ix:header></div>\n")
+        for number, title in ITEMS:
+            f.write(f"<p><b>Item {number}. {title}</b></p>\n")
+            for paragraph in _paragraphs(rng, per_item):
+                f.write(paragraph)
+        f.write("</body></html>\n</TEXT>\n</DOCUMENT>\n")
+
+        # The rest of a real submission: exhibits and uuencoded graphics
+        f.write("<DOCUMENT>\n<TYPE>EX-21.1\n<SEQUENCE>2\n<FILENAME>ex21.htm\n<TEXT>\n<html><body>\n")
+        for paragraph in _paragraphs(rng, int(size_mb * 1_000_000 * 0.1)):
+            f.write(paragraph)
+        f.write("</body></html>\n</TEXT>\n</DOCUMENT>\n")
+        f.write("<DOCUMENT>\n<TYPE>GRAPHIC\n<SEQUENCE>3\n<FILENAME>logo.jpg\n<TEXT>\nbegin 644 logo.jpg\n")
+        line = "M" + "A" * 60 + "\n"
+        f.write(line * int(size_mb * 1_000_000 * 0.1 / len(line)))
+        f.write("end\n</TEXT>\n</DOCUMENT>\n</SEC-DOCUMENT>\n")
+    return path
@@ -0,0 +1,249 @@
+"""
+Local stand-ins for the remote services RiskSentinel talks to, so tests and
+benchmarks run offline with controllable latency and failure rates.
+"""
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubServer:
+    """
+    Runs a ThreadingHTTPServer on a free localhost port in a daemon thread.
+    Use as a context manager; .url is the base URL.
+    """
+
+    handler_class = None
+
+    def __init__(self):
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(self.handler_class):
+            server_stub = stub
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up (timeout, hedge lost); that's the point of the test
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_json(self, payload, status=200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def fake_vector(text, dim):
+    # Deterministic per text, so the same chunk always lands in the same place
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+    rng = random.Random(seed)
+    return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+def hashed_vector(text, dim):
+    """
+    Feature-hashed words and character trigrams: a crude but deterministic
+    stand-in for a sentence embedding, where overlapping wording means
+    nearby vectors (unlike fake_vector), so recall numbers mean something.
+    """
+    vector = [0.0] * dim
+    for word in re.findall(r"\w+", text.lower()):
+        padded = f" {word} "
+        for feature in [word] + [padded[i:i + 3] for i in range(len(padded) - 2)]:
+            digest = hashlib.md5(feature.encode()).digest()
+            index = int.from_bytes(digest[:4], "big") % dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class _EmbeddingHandler(_JsonHandler):
+    def do_POST(self):
+        stub = self.server_stub
+        stub.count_request()
+        body = self.read_json()
+        time.sleep(stub.latency + stub.per_item_latency * len(body.get("inputs") or []))
+        if stub.fail_rate and random.random() < stub.fail_rate:
+            return self.send_json({"error": "Service Unavailable"}, status=503)
+
+        embed = hashed_vector if stub.vectors == "hashed" else fake_vector
+        inputs = body["inputs"]
+        if isinstance(inputs, str):
+            return self.send_json(embed(inputs, stub.dim))
+        self.send_json([embed(text, stub.dim) for text in inputs])
+
+
+class StubEmbeddingServer(_StubServer):
+    """
+    Speaks the HF feature-extraction protocol: POST {"inputs": [...]} -> vectors.
+    Point HuggingFaceEndpointEmbeddings(model=stub.url) (or EMBEDDING_ENDPOINT_URL) at it.
+    vectors="random" gives unrelated vectors per text, "hashed" gives similar
+    vectors for similarly worded texts.
+    """
+
+    handler_class = _EmbeddingHandler
+
+    def __init__(self, latency=0.05, per_item_latency=0.0, fail_rate=0.0, dim=384, vectors="random"):
+        self.vectors = vectors
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.fail_rate = fail_rate
+        self.dim = dim
+        super().__init__()
+
+
+class _ChatHandler(_JsonHandler):
+    def do_POST(self):
+        stub = self.server_stub
+        body = self.read_json()
+        model = body.get("model", "")
+        stub.count_request()
+        stub.count_model(model)
+        time.sleep(stub.setting(stub.latency, model))
+        if random.random() < stub.setting(stub.fail_rate, model):
+            return self.send_json({"error": "Service Unavailable"}, status=503)
+
+        answer = stub.answer(model, body["messages"])
+        if not body.get("stream"):
+            return self.send_json({
+                "id": "stub", "object": "chat.completion", "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": answer}}],
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for word in answer.split(" "):
+            chunk = {"id": "stub", "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {"content": word + " "}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(stub.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class StubChatServer(_StubServer):
+    """
+    OpenAI-style POST /v1/chat/completions (plain and stream=True).
+    latency and fail_rate are a number or a {model: value} dict, so one model
+    can hang or error while another stays healthy. Point LLM_BASE_URL at stub.url + "/v1".
+    """
+
+    handler_class = _ChatHandler
+
+    def __init__(self, latency=0.0, fail_rate=0.0, token_delay=0.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.token_delay = token_delay
+        self.calls = {}
+        super().__init__()
+
+    @staticmethod
+    def setting(value, model):
+        return value.get(model, 0.0) if isinstance(value, dict) else value
+
+    def count_model(self, model):
+        with self._lock:
+            self.calls[model] = self.calls.get(model, 0) + 1
+
+    def answer(self, model, messages):
+        return f"Answer from {model} to: {messages[-1]['content'][:40]}"
+
+
+class _CertHandler(_JsonHandler):
+    def do_GET(self):
+        stub = self.server_stub
+        stub.count_request()
+        time.sleep(stub.latency)
+        data = json.dumps(stub.certs).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Cache-Control", f"public, max-age={stub.max_age}, must-revalidate")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubCertServer(_StubServer):
+    """
+    Serves {key id: PEM} like https://www.googleapis.com/oauth2/v1/certs,
+    with a Cache-Control max-age. Swap .certs to simulate key rotation.
+    """
+
+    handler_class = _CertHandler
+
+    def __init__(self, certs, max_age=3600, latency=0.0):
+        self.certs = certs
+        self.max_age = max_age
+        self.latency = latency
+        super().__init__()
+
+
+def make_signing_key(key_id="stub-key"):
+    """
+    A fresh RSA key: returns (google.auth signer, {key_id: public key PEM}).
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from google.auth import crypt
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return crypt.RSASigner.from_string(private_pem, key_id=key_id), {key_id: public_pem.decode()}
+
+
+def make_google_id_token(signer, email, audience, issuer="https://accounts.google.com", lifetime=3600):
+    from google.auth import jwt
+
+    now = int(time.time())
+    claims = {"iss": issuer, "aud": audience, "sub": email, "email": email, "iat": now, "exp": now + lifetime}
+    return jwt.encode(signer, claims).decode()
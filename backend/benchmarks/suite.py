@@ -0,0 +1,321 @@
+"""
+Offline performance suite: everything RiskSentinel calls out to is replaced
+by local stubs (embedding server, chat-completions server, EDGAR filing
+fixture), so it runs in CI and results are comparable between commits.
+
+    cd backend && python -m benchmarks.suite --output bench-results.json
+    python -m benchmarks.suite --quick --output new.json --compare bench-results.json
+
+Measures
+  ingest     chunks/sec and peak RSS while ingesting one large filing
+  retrieval  lexical / dense / hybrid p50 and p95 as the corpus grows
+  analyze    /api/analyze throughput, p50 and p99 at increasing concurrency
+
+Each benchmark runs in its own process with its own database and vector
+store, so peak RSS and caches don't leak between them.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BACKEND_DIR))
+
+from benchmarks.stub_servers import StubChatServer, StubEmbeddingServer
+
+RESULT_PREFIX = "BENCH-RESULT "
+SUITES = ("ingest", "retrieval", "analyze")
+# Metrics where bigger numbers are better; everything else (ms, MB) should go down
+HIGHER_IS_BETTER = ("per_sec", "rps", "recall")
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))] if values else None
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def _current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20), 1)
+    except OSError:
+        return None
+
+
+# --- CHILD PROCESSES ---
+
+def child_ingest(params):
+    from app.services.edgar_parser import filing_text_splitter, iter_filing_chunks, read_filing_metadata
+    from app.services.vector_store import sync_documents
+    from benchmarks.edgar_fixture import write_filing
+
+    path = write_filing(params["workdir"], size_mb=params["filing_mb"])
+    metadata = read_filing_metadata(path)
+    rss_before = _current_rss_mb()
+
+    started = time.perf_counter()
+    chunks = iter_filing_chunks(path, filing_text_splitter(), metadata=metadata)
+    result = sync_documents(chunks, scope={"ticker": "BENCH", "accession": metadata["accession"]})
+    ingest_seconds = time.perf_counter() - started
+    peak = _peak_rss_mb()
+
+    # Parsing alone, streamed and thrown away
+    started = time.perf_counter()
+    parsed = sum(1 for _ in iter_filing_chunks(path, filing_text_splitter(), metadata=metadata))
+    parse_seconds = time.perf_counter() - started
+
+    return {
+        "filing_mb": round(path.stat().st_size / 1e6, 1),
+        "chunks": result["total"],
+        "ingest_seconds": round(ingest_seconds, 3),
+        "ingest_chunks_per_sec": round(result["total"] / ingest_seconds, 1),
+        "parse_chunks_per_sec": round(parsed / parse_seconds, 1),
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak,
+    }
+
+
+def child_retrieval(params):
+    from app.services import vector_store
+    from benchmarks.bench_retrieval import build_corpus
+
+    # Every question should pay for its embedding, as a new question would
+    vector_store.embedding_model = vector_store.embedding_model.underlying
+    sizes = sorted(params["sizes"])
+    docs, questions = build_corpus(max(0, sizes[-1] // 5 - 8))
+    # Gold chunks first, so every slice of the corpus can answer every question
+    docs.sort(key=lambda doc: "filler" in doc.metadata["fixture_id"])
+    questions = questions[:params["questions"]]
+
+    results, loaded = {}, 0
+    for size in sizes:
+        vector_store.sync_documents(docs[loaded:size], scope={"source": f"slice-{size}"})
+        loaded = size
+        results[str(size)] = {}
+        for mode in ("lexical", "dense", "hybrid"):
+            latencies, hits = [], 0
+            for question, gold in questions:
+                started = time.perf_counter()
+                found = vector_store.retrieve(question, k=params["k"], mode=mode)
+                latencies.append(time.perf_counter() - started)
+                hits += any(doc.metadata.get("fixture_id") == gold for doc in found)
+            results[str(size)][mode] = {
+                "p50_ms": _ms(statistics.median(latencies)),
+                "p95_ms": _ms(_percentile(latencies, 95)),
+                "recall": round(hits / len(questions), 3),
+            }
+    return results
+
+
+async def _analyze_levels(params):
+    import httpx
+    from app import main
+    from app.services import vector_store
+    from benchmarks.bench_retrieval import TOPICS, TICKERS, build_corpus
+
+    docs, _ = build_corpus(params["filler"])
+    vector_store.sync_documents(docs, scope={"source": "fixture"})
+
+    transport = httpx.ASGITransport(app=main.app)
+    # ASGITransport doesn't run the lifespan; enter it like uvicorn would (migrations, warm-up)
+    async with main.lifespan(main.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        response = await client.post("/register", json={"email": "bench@example.com", "password": "pw"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        questions = [q.format(t=t, s=s) for t, s in TICKERS.items() for _, _, q in TOPICS]
+
+        results, run = {}, 0
+        for concurrency in params["concurrency"]:
+            total = max(params["requests"], 2 * concurrency)
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies, errors = [], 0
+
+            async def one(i):
+                nonlocal errors
+                # A fresh question every time, so the answer cache never short-circuits
+                question = f"{questions[i % len(questions)]} (run {run}.{i})"
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post("/api/analyze", json={"question": question}, headers=headers)
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code != 200 or response.json()["answer"].startswith("Error"):
+                        errors += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(total)))
+            wall = time.perf_counter() - started
+            run += 1
+            results[str(concurrency)] = {
+                "requests": total,
+                "errors": errors,
+                "rps": round(total / wall, 2),
+                "p50_ms": _ms(statistics.median(latencies)),
+                "p99_ms": _ms(_percentile(latencies, 99)),
+            }
+    return results
+
+
+def child_analyze(params):
+    return asyncio.run(_analyze_levels(params))
+
+
+CHILDREN = {"ingest": child_ingest, "retrieval": child_retrieval, "analyze": child_analyze}
+
+
+def run_child(name, params, env):
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as workdir:
+        child_env = {
+            **os.environ, **env,
+            "DATABASE_URL": f"sqlite:///{Path(workdir) / 'bench.db'}",
+            "CHROMA_PERSIST_DIR": str(Path(workdir) / "chroma_db"),
+        }
+        command = [sys.executable, "-m", "benchmarks.suite", "--child", name,
+                   "--params", json.dumps({**params, "workdir": workdir})]
+        process = subprocess.run(command, cwd=BACKEND_DIR, env=child_env, capture_output=True, text=True)
+    for line in reversed(process.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"{name} benchmark failed (exit {process.returncode}):\n{process.stderr[-3000:]}")
+
+
+# --- REPORTING ---
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(old, new, threshold):
+    """
+    Returns [(metric, old, new, change, regressed)] for metrics present in both runs.
+    """
+    rows = []
+    old_flat, new_flat = flatten(old), flatten(new)
+    for metric in sorted(old_flat.keys() & new_flat.keys()):
+        before, after = old_flat[metric], new_flat[metric]
+        if not before:
+            continue
+        change = (after - before) / before
+        better_up = any(metric.endswith(suffix) for suffix in HIGHER_IS_BETTER)
+        regressed = change < -threshold if better_up else change > threshold
+        rows.append((metric, before, after, change, regressed))
+    return rows
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", help="previous results file to diff against")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="exit 1 if any metric got worse by more than this fraction (e.g. 0.2)")
+    parser.add_argument("--suites", default=",".join(SUITES))
+    parser.add_argument("--quick", action="store_true", help="small sizes, for CI smoke runs")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="stub seconds per embedding request")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="stub seconds per chat completion")
+    parser.add_argument("--concurrency", default=None, help="comma separated, e.g. 1,4,16,64")
+    parser.add_argument("--requests", type=int, default=None, help="/api/analyze requests per level")
+    parser.add_argument("--sizes", default=None, help="retrieval corpus sizes, e.g. 1000,5000,20000")
+    parser.add_argument("--filing-mb", type=float, default=None)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--params", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = CHILDREN[args.child](json.loads(args.params))
+        print(RESULT_PREFIX + json.dumps(result), flush=True)
+        return
+
+    config = {
+        "embed_latency_s": args.embed_latency,
+        "llm_latency_s": args.llm_latency,
+        "concurrency": [int(c) for c in (args.concurrency or ("1,4,8" if args.quick else "1,4,16,64")).split(",")],
+        "requests": args.requests or (16 if args.quick else 128),
+        "sizes": [int(s) for s in (args.sizes or ("200,1000" if args.quick else "1000,5000,20000")).split(",")],
+        "filing_mb": args.filing_mb or (2 if args.quick else 20),
+    }
+    params = {
+        "ingest": {"filing_mb": config["filing_mb"]},
+        "retrieval": {"sizes": config["sizes"], "questions": 40, "k": 3},
+        "analyze": {"concurrency": config["concurrency"], "requests": config["requests"], "filler": 20},
+    }
+
+    results = {}
+    with StubEmbeddingServer(latency=args.embed_latency, vectors="hashed") as embed_stub, \
+            StubChatServer(latency=args.llm_latency) as chat_stub:
+        env = {
+            "EMBEDDING_ENDPOINT_URL": embed_stub.url,
+            "LLM_BASE_URL": chat_stub.url + "/v1",
+            "HUGGINGFACEHUB_API_TOKEN": "stub",
+            # Measure our pipeline, not the production rate limit we keep for the HF API
+            "EMBED_RATE_PER_SEC": "1000",
+            "ANSWER_CACHE_SIMILARITY": "0",
+            "SERVER_TIMING": "0",
+        }
+        for name in args.suites.split(","):
+            print(f"⏱️  {name} ...", flush=True)
+            results[name] = run_child(name, params[name], env)
+            print(json.dumps(results[name], indent=1))
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": config,
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"📝 Results written to {args.output}")
+
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text())
+        threshold = args.max_regression if args.max_regression is not None else 0.1
+        rows = compare(previous["results"], results, threshold)
+        print(f"\nvs {args.compare} (commit {previous['meta'].get('commit')})")
+        print(f"{'metric':<40} {'before':>10} {'after':>10} {'change':>8}")
+        for metric, before, after, change, regressed in rows:
+            flag = "  ⚠️" if regressed else ""
+            print(f"{metric:<40} {before:>10} {after:>10} {change:>+8.1%}{flag}")
+        if args.max_regression is not None and any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+# --- PATH SETUP ---
+current_file = Path(__file__).resolve()
+project_root = current_file.parent.parent
+sys.path.append(str(project_root))
+
+# Keep test runs off the dev database and the committed Chroma directory.
+# These must be set before anything imports app.database / vector_store.
+_scratch = Path(tempfile.mkdtemp(prefix="risksentinel-tests-"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_scratch / 'test.db'}")
+os.environ.setdefault("CHROMA_PERSIST_DIR", str(_scratch / "chroma_db"))
+os.environ.setdefault("FILING_STORE_DIR", str(_scratch / "filing_store"))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def app_lifespan():
+    """
+    Runs the app's lifespan once for the whole session, like uvicorn would
+    (that is where the schema is migrated). Tests drive the app without it
+    (TestClient outside a with block, httpx.ASGITransport). The warm-up's
+    checks are left out here; test_startup covers them.
+    """
+    from fastapi.testclient import TestClient
+    from app import main
+    from app.services.warmup import Warmup
+
+    warmup, main.warmup = main.warmup, Warmup({})
+    try:
+        with TestClient(main.app):
+            yield
+    finally:
+        main.warmup = warmup
+
+
+@pytest.fixture
+def auth_headers():
+    """
+    Registers a throwaway user and returns a Bearer header for it.
+    """
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    email = f"analyst-{uuid.uuid4().hex[:8]}@example.com"
+    response = TestClient(app).post("/register", json={"email": email, "password": "pw"})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,83 @@
+import asyncio
+
+from app.services.answer_cache import AnswerCache, normalize_question
+
+
+def test_normalized_questions_share_an_entry():
+    cache = AnswerCache()
+    cache.put("What are the China risks?", 1, "Tariffs.")
+
+    assert normalize_question("  what are the CHINA risks ") == "what are the china risks"
+    assert cache.get("what are the china   risks", 1) == "Tariffs."
+    # A new corpus version never sees answers from the old one
+    assert cache.get("What are the China risks?", 2) is None
+
+
+def test_lru_and_ttl_eviction():
+    cache = AnswerCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", 1, "A")
+    cache.put("b", 1, "B")
+    cache.get("a", 1)  # "b" is now least recently used
+    cache.put("c", 1, "C")
+
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) == "A"
+    assert cache.stats()["evictions"] == 1
+
+    expired = AnswerCache(ttl_seconds=0)
+    expired.put("a", 1, "A")
+    assert expired.get("a", 1) is None
+
+
+def test_similarity_threshold_hit():
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.put("supply chain risks", 1, "Suppliers.", query_vector=[1.0, 0.0])
+
+    assert cache.get_similar([0.99, 0.05], 1) == "Suppliers."
+    assert cache.get_similar([0.0, 1.0], 1) is None
+    assert cache.get_similar([0.99, 0.05], 2) is None
+
+
+def test_concurrent_identical_questions_share_one_call():
+    cache = AnswerCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "One answer"
+
+    async def run():
+        return await asyncio.gather(*[
+            cache.get_or_compute("China risks?", 1, compute) for _ in range(20)
+        ])
+
+    answers = asyncio.run(run())
+    assert answers == ["One answer"] * 20
+    assert calls == 1
+    assert cache.stats()["coalesced"] == 19
+
+    # Later callers are served from the cache
+    assert asyncio.run(cache.get_or_compute("china risks", 1, compute)) == "One answer"
+    assert calls == 1
+
+
+def test_errors_are_not_cached():
+    cache = AnswerCache()
+
+    async def compute():
+        return "Error: Could not connect to any AI models."
+
+    asyncio.run(cache.get_or_compute("q", 1, compute))
+    assert cache.get("q", 1) is None
+
+
+def test_scope_is_part_of_the_key():
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put("export risks", 1, "NVDA answer", query_vector=[1.0, 0.0], scope={"ticker": "NVDA"})
+
+    assert cache.get("export risks", 1, {"ticker": "NVDA"}) == "NVDA answer"
+    assert cache.get("export risks", 1, {"ticker": "AAPL"}) is None
+    assert cache.get("export risks", 1) is None
+    assert cache.get_similar([1.0, 0.0], 1, {"ticker": "AAPL"}) is None
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import time
+
+import httpx
+from langchain_core.documents import Document
+
+from app.main import app
+from app.services import rag_service
+from app.services.answer_cache import answer_cache
+
+LLM_DELAY = 0.5
+
+
+def _stub_rag(monkeypatch):
+    answer_cache.clear()
+
+    async def fake_retrieve(question, k=3, query_vector=None, filters=None):
+        return [Document(page_content=f"Context for {question}")]
+
+    async def fake_llm(sys_prompt, user_prompt):
+        await asyncio.sleep(LLM_DELAY)
+        return "Stub answer"
+
+    monkeypatch.setattr(rag_service, "aretrieve", fake_retrieve)
+    monkeypatch.setattr(rag_service, "aget_llm_response_internal", fake_llm)
+
+
+def test_analyze_returns_answer(monkeypatch, auth_headers):
+    _stub_rag(monkeypatch)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/api/analyze", json={"question": "China risks"}, headers=auth_headers)
+            history = await client.get("/api/history", headers=auth_headers)
+        return response, history
+
+    response, history = asyncio.run(run())
+    assert response.status_code == 200
+    assert response.json() == {"answer": "Stub answer"}
+    assert [m["role"] for m in history.json()] == ["user", "assistant"]
+
+
+def test_slow_llm_calls_overlap(monkeypatch, auth_headers):
+    """
+    Many in-flight analyses should wait on the model together, not one after another.
+    """
+    _stub_rag(monkeypatch)
+    concurrency = 50
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            start = time.perf_counter()
+            responses = await asyncio.gather(*[
+                client.post("/api/analyze", json={"question": f"Q{i}"}, headers=auth_headers)
+                for i in range(concurrency)
+            ])
+            return responses, time.perf_counter() - start
+
+    responses, elapsed = asyncio.run(run())
+    assert all(r.status_code == 200 for r in responses)
+    # Serial execution would take concurrency * LLM_DELAY = 25s
+    assert elapsed < LLM_DELAY * 10
+
+
+def test_stream_emits_sources_then_tokens(monkeypatch, auth_headers):
+    _stub_rag(monkeypatch)
+
+    async def fake_stream(sys_prompt, user_prompt):
+        for piece in ["Supply ", "chain ", "risk."]:
+            yield piece
+
+    monkeypatch.setattr(rag_service, "astream_llm_response", fake_stream)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/api/analyze/stream", json={"question": "China risks"}, headers=auth_headers)
+            history = await client.get("/api/history", headers=auth_headers)
+        return response, history
+
+    response, history = asyncio.run(run())
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [block.split("\n")[0].removeprefix("event: ") for block in response.text.strip().split("\n\n")]
+    assert events == ["sources", "context", "token", "token", "token", "done"]
+
+    # The full answer is persisted once the stream completes
+    assert history.json()[-1] == {"role": "assistant", "content": "Supply chain risk."}
+
+
+def _parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def test_risk_matrix_streams_every_cell_in_parallel(monkeypatch, auth_headers):
+    """
+    A 3 x 3 grid embeds its questions once, filters each cell by ticker and
+    takes about one LLM call, not nine.
+    """
+    _stub_rag(monkeypatch)
+    embedded, filters_seen = [], []
+
+    async def fake_embed_questions(questions):
+        embedded.append(list(questions))
+        return [[float(i)] for i, _ in enumerate(questions)]
+
+    async def fake_retrieve(question, k=3, query_vector=None, filters=None):
+        filters_seen.append((question, query_vector, filters))
+        return [Document(page_content=f"Context for {question}")]
+
+    monkeypatch.setattr(rag_service, "aembed_questions", fake_embed_questions)
+    monkeypatch.setattr(rag_service, "aretrieve", fake_retrieve)
+    monkeypatch.setattr(rag_service, "RISK_MATRIX_CONCURRENCY", 9)
+    grid = {"questions": ["China exposure", "Supply chain", "Litigation"], "tickers": ["aapl", "NVDA", "TSLA"]}
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            start = time.perf_counter()
+            response = await client.post("/api/analyze/matrix", json=grid, headers=auth_headers)
+            return response, time.perf_counter() - start
+
+    response, elapsed = asyncio.run(run())
+    events = _parse_sse(response.text)
+
+    assert events[0] == ("grid", {"questions": grid["questions"], "tickers": ["AAPL", "NVDA", "TSLA"]})
+    cells = [payload for event, payload in events if event == "cell"]
+    assert len(cells) == 9 and all(cell["answer"] == "Stub answer" for cell in cells)
+    assert {(cell["row"], cell["col"]) for cell in cells} == {(r, c) for r in range(3) for c in range(3)}
+    assert events[-1][0] == "done"
+    assert embedded == [grid["questions"]]
+    assert ("Litigation", [2.0], {"ticker": "TSLA"}) in filters_seen
+    # Serial cells would take 9 * LLM_DELAY
+    assert elapsed < LLM_DELAY * 3
+
+
+def test_risk_matrix_bounds_llm_concurrency(monkeypatch, auth_headers):
+    _stub_rag(monkeypatch)
+    in_flight, peak = 0, 0
+
+    async def fake_llm(sys_prompt, user_prompt):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return "Stub answer"
+
+    async def fake_embed_questions(questions):
+        return [None] * len(questions)
+
+    monkeypatch.setattr(rag_service, "aget_llm_response_internal", fake_llm)
+    monkeypatch.setattr(rag_service, "aembed_questions", fake_embed_questions)
+    monkeypatch.setattr(rag_service, "RISK_MATRIX_CONCURRENCY", 2)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            too_big = await client.post("/api/analyze/matrix", headers=auth_headers,
+                                        json={"questions": [f"Q{i}" for i in range(61)], "tickers": ["AAPL"]})
+            response = await client.post("/api/analyze/matrix", headers=auth_headers,
+                                         json={"questions": ["Q1", "Q2", "Q3"], "tickers": ["AAPL", "MSFT"]})
+            return too_big, response
+
+    too_big, response = asyncio.run(run())
+    assert too_big.status_code == 400
+    assert sum(event == "cell" for event, _ in _parse_sse(response.text)) == 6
+    assert peak == 2
@@ -0,0 +1,108 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from app import auth, main, models
+from app.database import SessionLocal
+from app.services.auth_cache import GoogleCertStore, PrincipalCache
+from benchmarks.stub_servers import StubCertServer, make_google_id_token, make_signing_key
+
+
+def test_principal_is_cached_and_invalidated_on_user_change(auth_headers, monkeypatch):
+    client = TestClient(main.app)
+    loads = []
+    real_load = auth._load_user
+
+    def counting_load(db, email):
+        loads.append(email)
+        return real_load(db, email)
+
+    monkeypatch.setattr(auth, "_load_user", counting_load)
+    auth.principal_cache.clear()
+
+    for _ in range(3):
+        assert client.get("/api/history", headers=auth_headers).status_code == 200
+    assert len(loads) == 1
+
+    # Changing the user drops their cached principal
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == loads[0]).one()
+        user.provider = "google"
+        db.commit()
+    finally:
+        db.close()
+    assert client.get("/api/history", headers=auth_headers).status_code == 200
+    assert len(loads) == 2
+
+
+def test_principal_cache_is_bounded_and_respects_token_expiry():
+    class User:
+        def __init__(self, email):
+            self.email = email
+
+    cache = PrincipalCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", User("a@x"))
+    cache.put("b", User("b@x"))
+    cache.put("c", User("c@x"))
+    assert cache.get("a") is None and cache.get("c").email == "c@x"
+
+    cache.put("expiring", User("d@x"), token_expires_at=time.time() - 1)
+    assert cache.get("expiring") is None
+
+
+def test_google_certs_are_fetched_once_and_refreshed_ahead():
+    signer, certs = make_signing_key("k1")
+    token = make_google_id_token(signer, "analyst@example.com", "client-id")
+
+    with StubCertServer(certs, max_age=3600) as stub:
+        store = GoogleCertStore(url=stub.url, refresh_ahead=60)
+        for _ in range(5):
+            assert store.verify(token, "client-id")["email"] == "analyst@example.com"
+        assert stub.requests == 1
+
+    # Close to expiry: callers get the current certs, a refresh runs behind them
+    with StubCertServer(certs, max_age=30, latency=0.3) as stub:
+        store = GoogleCertStore(url=stub.url, refresh_ahead=60)
+        store.verify(token, "client-id")
+        started = time.monotonic()
+        store.verify(token, "client-id")
+        assert time.monotonic() - started < 0.2
+        time.sleep(0.5)
+        assert stub.requests == 2
+
+
+def test_google_key_rotation_and_bad_tokens(monkeypatch):
+    old_signer, old_certs = make_signing_key("old")
+    new_signer, new_certs = make_signing_key("new")
+
+    with StubCertServer(old_certs) as stub:
+        monkeypatch.setattr(auth, "google_certs", GoogleCertStore(url=stub.url))
+        assert auth.verify_google_token(make_google_id_token(old_signer, "a@example.com", auth.GOOGLE_CLIENT_ID)) == "a@example.com"
+
+        # Google rotated keys: an unknown kid triggers one refetch (outside the 30s guard)
+        stub.certs = new_certs
+        auth.google_certs._fetched_at -= 60
+        assert auth.verify_google_token(make_google_id_token(new_signer, "b@example.com", auth.GOOGLE_CLIENT_ID)) == "b@example.com"
+
+        assert auth.verify_google_token(make_google_id_token(new_signer, "c@example.com", "someone-else")) is None
+        assert auth.verify_google_token(
+            make_google_id_token(new_signer, "d@example.com", auth.GOOGLE_CLIENT_ID, issuer="evil.example.com")
+        ) is None
+
+
+def test_changes_the_orm_events_miss_expire_with_the_ttl(monkeypatch):
+    class User:
+        def __init__(self, email):
+            self.email = email
+
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = PrincipalCache(ttl_seconds=60)
+    cache.put("token", User("a@x"))
+
+    # e.g. a bulk UPDATE or another worker changed the user: no invalidation arrives
+    now[0] += 59
+    assert cache.get("token").email == "a@x"
+    now[0] += 2
+    assert cache.get("token") is None
@@ -0,0 +1,21 @@
+from app.services.edgar_parser import filing_text_splitter, iter_filing_chunks, read_filing_metadata
+from benchmarks.edgar_fixture import write_filing
+from benchmarks.suite import compare
+
+
+def test_filing_fixture_parses_like_a_10k(tmp_path):
+    path = write_filing(tmp_path, ticker="BENCH", fiscal_year=2023, size_mb=0.3)
+    metadata = read_filing_metadata(path)
+    assert metadata["accession"] == path.parent.name and metadata["period"] == "20231231"
+
+    chunks = list(iter_filing_chunks(path, filing_text_splitter(), metadata=metadata))
+    assert {chunk.metadata["item"] for chunk in chunks} >= {"1", "1A", "7"}
+    assert all(chunk.metadata["document_type"] == "10-K" for chunk in chunks)
+    assert not any("HIDDEN-XBRL-FACT" in chunk.page_content for chunk in chunks)
+
+
+def test_compare_knows_which_direction_is_worse():
+    old = {"analyze": {"4": {"rps": 10.0, "p99_ms": 100.0}}, "ingest": {"peak_rss_mb": 200.0}}
+    new = {"analyze": {"4": {"rps": 8.0, "p99_ms": 90.0}}, "ingest": {"peak_rss_mb": 205.0}}
+    regressed = {metric for metric, _, _, _, bad in compare(old, new, threshold=0.1) if bad}
+    assert regressed == {"analyze.4.rps"}
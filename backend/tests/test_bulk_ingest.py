@@ -0,0 +1,75 @@
+import json
+
+from app.services.bulk_ingest import read_ticker_file, run_bulk_ingest
+
+
+def _filing(accession, period, text):
+    return (
+        f"<SEC-HEADER>\nACCESSION NUMBER:\t{accession}\nCONFORMED SUBMISSION TYPE:\t10-K\n"
+        f"CONFORMED PERIOD OF REPORT:\t{period}\nFILED AS OF DATE:\t{period}\n</SEC-HEADER>\n"
+        f"<DOCUMENT>\n<TYPE>10-K\n<TEXT>\n<html><body><p>Item 1A. Risk Factors</p><p>{text}</p></body></html>\n"
+        "</TEXT>\n</DOCUMENT>\n"
+    )
+
+
+class FakeDownloader:
+    """
+    Writes canned filings where sec-edgar-downloader would.
+    """
+
+    def __init__(self, root, filings):
+        self.root = root
+        self.filings = filings  # ticker -> [(accession, period)]
+        self.calls = []
+
+    def get(self, form, ticker, after=None, before=None, accession_numbers_to_skip=None):
+        self.calls.append((ticker, after, before, set(accession_numbers_to_skip or ())))
+        for accession, period in self.filings[ticker]:
+            path = self.root / "sec-edgar-filings" / ticker / form / accession / "full-submission.txt"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(_filing(accession, period, f"{ticker} supply chain risk in {period[:4]}"))
+
+
+def test_bulk_ingest_filters_years_and_resumes(tmp_path):
+    downloader = FakeDownloader(tmp_path, {
+        "AAPL": [("A-2022", "20220924"), ("A-2023", "20230930"), ("A-2018", "20180929")],
+        "NVDA": [("N-2023", "20230129")],
+    })
+    stored = []
+    broken = {"N-2023"}
+
+    def store(chunks, scope):
+        if scope["accession"] in broken:
+            raise ConnectionError("embedding endpoint down")
+        stored.append(scope["accession"])
+        assert all(chunk.metadata["item"] == "1A" for chunk in chunks)
+        return {"total": len(chunks), "added": len(chunks), "skipped": 0, "deleted": 0}
+
+    checkpoint = tmp_path / "checkpoint.json"
+    kwargs = dict(download_dir=tmp_path, downloader=downloader, store=store, download_workers=2, parse_workers=1)
+    result = run_bulk_ingest(["AAPL", "NVDA"], 2021, 2023, checkpoint, **kwargs)
+
+    assert sorted(stored) == ["A-2022", "A-2023"]
+    assert len(result["failures"]) == 1
+    assert result["stages"]["parse"]["items"] == 4
+    assert result["stages"]["embed"]["chunks"] == 2
+    filings = json.loads(checkpoint.read_text())["filings"]
+    assert filings["A-2018"]["status"] == "skipped"
+    assert filings["N-2023"]["status"] == "failed"
+    assert ("AAPL", "2021-01-01", "2024-12-31", set()) in downloader.calls
+
+    # Rerun after the "crash": only the failed filing is redone
+    broken.clear()
+    stored.clear()
+    downloader.calls.clear()
+    result = run_bulk_ingest(["AAPL", "NVDA"], 2021, 2023, checkpoint, **kwargs)
+
+    assert stored == ["N-2023"] and not result["failures"]
+    assert ("AAPL", "2021-01-01", "2024-12-31", {"A-2018", "A-2022", "A-2023"}) in downloader.calls
+    assert json.loads(checkpoint.read_text())["filings"]["N-2023"]["status"] == "done"
+
+
+def test_read_ticker_file(tmp_path):
+    path = tmp_path / "tickers.txt"
+    path.write_text("# S&P sample\naapl\nNVDA, msft\n\naapl  # duplicate\n")
+    assert read_ticker_file(path) == ["AAPL", "NVDA", "MSFT"]
@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import create_engine, inspect, text
+
+from app import auth, main, models
+from app.database import SessionLocal, engine
+from app.migrations import run_migrations
+from app.services import chat_history
+
+
+def _insert_messages(user_id, count, conversation_id=None, start=datetime(2024, 1, 1)):
+    db = SessionLocal()
+    try:
+        db.bulk_save_objects([
+            models.Message(user_id=user_id, role="user", content=f"message {i}",
+                           conversation_id=conversation_id, timestamp=start + timedelta(seconds=i // 2))
+            for i in range(count)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def _me(headers):
+    email = jwt.decode(headers["Authorization"].split()[1], auth.SECRET_KEY, algorithms=[auth.ALGORITHM])["sub"]
+    db = SessionLocal()
+    try:
+        return db.query(models.User).filter(models.User.email == email).one().id
+    finally:
+        db.close()
+
+
+def test_history_pages_back_with_cursor(auth_headers):
+    client = TestClient(main.app)
+    # Two messages per second, so the cursor has to break timestamp ties by id
+    _insert_messages(_me(auth_headers), 25)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 10, **({"before": cursor} if cursor else {})}
+        response = client.get("/api/history", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        page = [m["content"] for m in response.json()]
+        seen = page + seen
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [f"message {i}" for i in range(25)]
+
+    assert client.get("/api/history", params={"before": "garbage"}, headers=auth_headers).status_code == 400
+
+
+def test_conversations_group_messages(auth_headers, monkeypatch):
+    client = TestClient(main.app)
+
+    async def fake_rag(question, filters=None):
+        return f"answer to {question}"
+
+    monkeypatch.setattr(main, "aquery_rag", fake_rag)
+    first = client.post("/api/conversations", json={"title": "NVDA export controls"}, headers=auth_headers).json()
+    second = client.post("/api/conversations", json={}, headers=auth_headers).json()
+
+    client.post("/api/analyze", json={"question": "q1", "conversation_id": first["id"]}, headers=auth_headers)
+    client.post("/api/analyze", json={"question": "q2", "conversation_id": second["id"]}, headers=auth_headers)
+
+    history = client.get("/api/history", params={"conversation_id": first["id"]}, headers=auth_headers).json()
+    assert [m["content"] for m in history] == ["q1", "answer to q1"]
+
+    # Most recently active first
+    listed = client.get("/api/conversations", headers=auth_headers).json()
+    assert listed[0]["id"] == second["id"]
+
+    other = client.post("/register", json={"email": "someone-else@example.com", "password": "pw"}).json()
+    response = client.post("/api/analyze", json={"question": "q", "conversation_id": first["id"]},
+                           headers={"Authorization": f"Bearer {other['access_token']}"})
+    assert response.status_code == 404
+
+
+def test_conversation_pages_never_repeat_a_conversation_that_becomes_active(auth_headers):
+    user_id = _me(auth_headers)
+    db = SessionLocal()
+    try:
+        start = datetime(2024, 1, 1)
+        rows = [models.Conversation(user_id=user_id, title=f"c{i}", updated_at=start + timedelta(minutes=i))
+                for i in range(6)]
+        db.add_all(rows)
+        db.commit()
+        ids = [c.id for c in rows]
+        first, cursor = chat_history.fetch_conversations(db, user_id, limit=3)
+        assert [c.id for c in first] == ids[:2:-1]
+
+        # Activity on a conversation already served and on one not yet served
+        for i in (5, 1):
+            rows[i].updated_at = datetime.utcnow()
+        db.commit()
+        second, _ = chat_history.fetch_conversations(db, user_id, before=cursor, limit=3)
+        # The unseen one moved above the cursor: skipped until the list is reloaded, never repeated
+        assert [c.id for c in second] == [ids[2], ids[0]]
+    finally:
+        db.close()
+
+
+def test_write_through_commits_before_responding(auth_headers, monkeypatch):
+    async def fake_rag(question, filters=None):
+        return f"answer to {question}"
+
+    monkeypatch.setattr(main, "aquery_rag", fake_rag)
+    monkeypatch.setattr(main, "MESSAGE_WRITE_THROUGH", True)
+    # Left alone, the writer would hold these rows for a minute
+    monkeypatch.setattr(main.message_writer, "flush_interval", 60)
+    user_id = _me(auth_headers)
+    response = TestClient(main.app).post("/api/analyze", json={"question": "seen elsewhere?"}, headers=auth_headers)
+    assert response.status_code == 200
+
+    # What another worker reading the database straight away would see
+    db = SessionLocal()
+    try:
+        rows = db.query(models.Message).filter(models.Message.user_id == user_id).order_by(models.Message.id).all()
+        assert [m.content for m in rows] == ["seen elsewhere?", "answer to seen elsewhere?"]
+    finally:
+        db.close()
+
+
+def test_history_is_503_while_writes_are_stuck(auth_headers, monkeypatch):
+    monkeypatch.setattr(main.message_writer, "wait_for_user", lambda user_id: False)
+    response = TestClient(main.app).get("/api/history", headers=auth_headers)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_history_query_uses_composite_index():
+    with engine.connect() as conn:
+        plan = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM messages WHERE user_id = 1 "
+            "AND (timestamp < '2024-01-01' OR (timestamp = '2024-01-01' AND id < 5)) "
+            "ORDER BY timestamp DESC, id DESC LIMIT 51"
+        )).fetchall()
+    detail = " ".join(str(row[-1]) for row in plan)
+    assert "ix_messages_user_ts_id" in detail
+    assert "TEMP B-TREE" not in detail  # no sort step
+
+
+def test_migration_upgrades_old_schema(tmp_path):
+    old = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with old.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR, hashed_password VARCHAR, provider VARCHAR)"))
+        conn.execute(text("CREATE TABLE messages (id INTEGER PRIMARY KEY, user_id INTEGER, role VARCHAR, content TEXT, timestamp DATETIME)"))
+        conn.execute(text("INSERT INTO messages (user_id, role, content) VALUES (1, 'user', 'kept')"))
+
+    run_migrations(old)
+    run_migrations(old)  # idempotent
+
+    inspector = inspect(old)
+    assert "conversation_id" in {c["name"] for c in inspector.get_columns("messages")}
+    assert "ix_messages_user_ts_id" in {ix["name"] for ix in inspector.get_indexes("messages")}
+    with old.connect() as conn:
+        assert conn.execute(text("SELECT content FROM messages")).scalar() == "kept"
@@ -0,0 +1,55 @@
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.services.context_builder import estimate_tokens, merge_overlap, mmr_order, pack_context
+
+TEXT = " ".join(
+    f"Sentence {i} describes supply chain, tariff and cybersecurity exposure in region {i % 7}."
+    for i in range(60)
+)
+
+
+def _chunks(**metadata):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=100)
+    return [Document(page_content=c, metadata=dict(metadata)) for c in splitter.split_text(TEXT)]
+
+
+def test_adjacent_splitter_chunks_merge_back():
+    chunks = [doc.page_content for doc in _chunks()]
+    merged = chunks[0]
+    for chunk in chunks[1:4]:
+        merged = merge_overlap(merged, chunk)
+        assert merged is not None
+    assert merged in TEXT
+    assert merge_overlap(chunks[3], chunks[0]) is None  # not adjacent
+    assert merge_overlap(chunks[1], chunks[0]) == merge_overlap(chunks[0], chunks[1])  # either order
+
+
+def test_pack_merges_overlap_and_respects_budget():
+    chunks = _chunks(accession="0000320193-23-000106", item="1A")[:6]
+    naive = sum(estimate_tokens(c.page_content) for c in chunks)
+
+    pack = pack_context(chunks + [chunks[2]], budget=10_000)
+    assert pack.merged >= 5
+    assert pack.tokens < naive
+    assert len(pack.passages) == 1
+
+    small = pack_context(chunks, budget=150)
+    assert 0 < small.tokens <= 150
+    assert small.dropped > 0
+
+    # Even a budget smaller than one chunk yields something to answer from
+    tiny = pack_context(chunks, budget=20)
+    assert len(tiny.passages) == 1 and tiny.tokens <= 20
+
+
+def test_mmr_prefers_a_diverse_second_pick():
+    docs = [
+        Document(page_content="Tariffs on steel imports raise component costs"),
+        Document(page_content="Tariffs on steel imports raise component costs significantly"),
+        Document(page_content="Ransomware attacks could disrupt operations"),
+    ]
+    assert mmr_order(docs, lambda_=0.5)[:2] == [0, 2]
+    # With vectors, redundancy comes from cosine similarity instead
+    assert mmr_order(docs, vectors=[[1, 0], [1, 0.01], [0, 1]], lambda_=0.5)[:2] == [0, 2]
+    assert mmr_order(docs, lambda_=1.0) == [0, 1, 2]
@@ -0,0 +1,121 @@
+import tracemalloc
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.services.edgar_parser import iter_filing_chunks, read_filing_metadata
+
+HEADER = (
+    "<SEC-DOCUMENT>0000320193-23-000106.txt : 20231103\n"
+    "<SEC-HEADER>0000320193-23-000106.hdr.sgml : 20231103\n"
+    "ACCESSION NUMBER:\t\t0000320193-23-000106\n"
+    "CONFORMED SUBMISSION TYPE:\t10-K\n"
+    "CONFORMED PERIOD OF REPORT:\t20230930\n"
+    "FILED AS OF DATE:\t\t20231103\n"
+    "</SEC-HEADER>\n"
+)
+
+PRIMARY = (
+    "<DOCUMENT>\n<TYPE>10-K\n<SEQUENCE>1\n<FILENAME>aapl-20230930.htm\n<TEXT>\n"
+    "<html><head><title>aapl-20230930</title><style>p {color: red}</style></head><body>"
+    "<div style=\"display:none\"><ix:header><ix:hidden>HIDDEN-XBRL-FACT</ix:hidden></ix:header></div>"
+    "<p>Item&#160;1A. Risk Factors</p>"
+    "<p>The Company&#8217;s operations in China are subject to tariffs.</p>"
+    "<table><tr><td>Net sales</td><td>$383,285</td></tr></table>"
+    "</body></html>\n"
+    "</TEXT>\n</DOCUMENT>\n"
+)
+
+
+def _exhibit(doc_type, body):
+    return f"<DOCUMENT>\n<TYPE>{doc_type}\n<SEQUENCE>9\n<FILENAME>x\n<TEXT>\n{body}\n</TEXT>\n</DOCUMENT>\n"
+
+
+def _write_filing(tmp_path, *documents):
+    path = tmp_path / "0000320193-23-000106" / "full-submission.txt"
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(HEADER + "".join(documents) + "</SEC-DOCUMENT>\n")
+    return path
+
+
+def _splitter():
+    return RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
+
+
+def test_read_filing_metadata(tmp_path):
+    path = _write_filing(tmp_path, PRIMARY)
+    assert read_filing_metadata(str(path)) == {
+        "accession": "0000320193-23-000106",
+        "form": "10-K",
+        "period": "20230930",
+        "filed": "20231103",
+    }
+
+
+def test_only_primary_document_text_is_kept(tmp_path):
+    path = _write_filing(
+        tmp_path,
+        PRIMARY,
+        _exhibit("EX-101.INS", "<xbrl><us-gaap:Revenues>383285</us-gaap:Revenues></xbrl>"),
+        _exhibit("GRAPHIC", "begin 644 logo.jpg\nM_]C_X``02D9)1@`!`0$`8`!@``#_VP!#``@&!@<&!0@'!P<)\"`\nend"),
+    )
+
+    chunks = list(iter_filing_chunks(str(path), _splitter(), metadata={"ticker": "AAPL"}))
+    text = "\n".join(c.page_content for c in chunks)
+
+    assert "Item 1A. Risk Factors" in text
+    assert "The Company’s operations in China are subject to tariffs." in text
+    assert "Net sales $383,285" in text
+    for noise in ("HIDDEN-XBRL-FACT", "color: red", "us-gaap", "logo.jpg"):
+        assert noise not in text
+    assert chunks[0].metadata["ticker"] == "AAPL"
+    assert chunks[0].metadata["document_type"] == "10-K"
+
+
+def test_long_documents_chunk_like_a_single_pass(tmp_path):
+    # One enormous line of HTML, as many filers produce
+    paragraphs = "".join(f"<p>Paragraph {i} discusses supply chain concentration risk.</p>" for i in range(5000))
+    primary = f"<DOCUMENT>\n<TYPE>10-K\n<TEXT>\n<html><body>{paragraphs}</body></html>\n</TEXT>\n</DOCUMENT>\n"
+    path = _write_filing(tmp_path, primary)
+
+    chunks = list(iter_filing_chunks(str(path), _splitter()))
+
+    assert all(len(c.page_content) <= 2000 for c in chunks)
+    text = " ".join(c.page_content for c in chunks)
+    for i in (0, 1234, 4999):
+        assert f"Paragraph {i} discusses" in text
+
+
+def test_peak_memory_ignores_exhibit_size(tmp_path):
+    big_exhibit = _exhibit("EX-101.INS", ("<fact>" + "9" * 200 + "</fact>\n") * 100_000)  # ~20 MB
+    path = _write_filing(tmp_path, PRIMARY, big_exhibit)
+
+    tracemalloc.start()
+    chunks = iter_filing_chunks(str(path), _splitter())
+    count = sum(1 for _ in chunks)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert count >= 1
+    assert peak < 2 * 1024 * 1024
+
+
+def test_chunks_are_tagged_with_item_and_year(tmp_path):
+    sections = (
+        "<p>Apple Inc. Form 10-K cover page</p>"
+        "<p>Item 1. Business</p><p>The Company designs smartphones.</p>"
+        "<p>Item 1A. Risk Factors</p><p>Tariffs on imports from China could hurt margins.</p>"
+        "<p>ITEM 7. MANAGEMENT'S DISCUSSION AND ANALYSIS</p><p>Net sales grew.</p>"
+    )
+    primary = f"<DOCUMENT>\n<TYPE>10-K\n<TEXT>\n<html><body>{sections}</body></html>\n</TEXT>\n</DOCUMENT>\n"
+    path = _write_filing(tmp_path, primary)
+    metadata = read_filing_metadata(str(path))
+
+    chunks = list(iter_filing_chunks(str(path), _splitter(), metadata={**metadata, "ticker": "AAPL"}))
+    by_item = {c.metadata.get("item"): c.page_content for c in chunks}
+
+    assert "item" not in chunks[0].metadata  # cover page precedes Item 1
+    assert by_item["1"].startswith("Item 1. Business")
+    assert "Tariffs on imports from China" in by_item["1A"]
+    assert "Tariffs" not in by_item["1"]
+    assert "Net sales grew." in by_item["7"]
+    assert all(c.metadata["fiscal_year"] == 2023 for c in chunks)
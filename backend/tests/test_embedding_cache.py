@@ -0,0 +1,76 @@
+import asyncio
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: int = 0
+    texts_sent: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts_sent += len(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls += 1
+        self.texts_sent += 1
+        return super().embed_query(text)
+
+
+def test_reingest_costs_no_remote_calls(tmp_path):
+    remote = CountingEmbeddings(size=8)
+    cache = CachedEmbeddings(remote, model_id="m", path=tmp_path / "cache.sqlite3")
+    chunks = ["Item 1A. Risk Factors", "Boilerplate", "Boilerplate", "Tariffs on China"]
+
+    first = cache.embed_documents(chunks)
+    assert remote.texts_sent == 3  # repeated boilerplate is embedded once
+
+    # A fresh process (new instance, same file) re-ingesting the filing
+    reopened = CachedEmbeddings(remote, model_id="m", path=tmp_path / "cache.sqlite3")
+    assert reopened.embed_documents(chunks) == first
+    assert remote.texts_sent == 3
+
+    # Queries share the same content-addressed store
+    assert reopened.embed_query("Tariffs on China") == first[3]
+    assert remote.texts_sent == 3
+
+
+def test_model_id_is_part_of_the_key(tmp_path):
+    remote = CountingEmbeddings(size=8)
+    CachedEmbeddings(remote, model_id="a", path=tmp_path / "c.sqlite3").embed_query("text")
+    CachedEmbeddings(remote, model_id="b", path=tmp_path / "c.sqlite3").embed_query("text")
+    assert remote.calls == 2
+
+
+def test_async_path_uses_cache(tmp_path):
+    remote = CountingEmbeddings(size=8)
+    cache = CachedEmbeddings(remote, model_id="m", path=tmp_path / "c.sqlite3")
+
+    async def run():
+        await cache.aembed_query("China risks")
+        await cache.aembed_query("China risks")
+        return await cache.aembed_documents(["China risks", "new text"])
+
+    vectors = asyncio.run(run())
+    assert len(vectors) == 2
+    assert remote.texts_sent == 2
+    assert cache.stats()["hits"] == 2
+
+
+def test_size_limit_evicts_least_recently_used(tmp_path):
+    remote = CountingEmbeddings(size=8)
+    cache = CachedEmbeddings(remote, model_id="m", path=tmp_path / "c.sqlite3", max_entries=10)
+
+    cache.embed_documents([f"chunk {i}" for i in range(10)])
+    cache.embed_query("chunk 9")  # touch the newest
+    cache.embed_documents(["chunk 10"])
+
+    assert cache.stats()["entries"] <= 10
+    sent = remote.texts_sent
+    cache.embed_query("chunk 9")
+    assert remote.texts_sent == sent
+    cache.embed_query("chunk 0")
+    assert remote.texts_sent == sent + 1
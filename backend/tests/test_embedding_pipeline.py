@@ -0,0 +1,58 @@
+import threading
+import time
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_huggingface import HuggingFaceEndpointEmbeddings
+
+from app.services.embedding_pipeline import ResilientEmbeddings, TokenBucket, embed_and_store
+from benchmarks.stub_servers import StubEmbeddingServer
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate_per_sec=20, capacity=1)
+    start = time.perf_counter()
+    for _ in range(6):
+        bucket.acquire()
+    # First token is free, the next five need ~0.25s at 20/s
+    assert time.perf_counter() - start >= 0.2
+
+
+def test_batches_are_written_incrementally_with_bounded_concurrency():
+    docs = [Document(page_content=f"chunk {i}") for i in range(100)]
+    active, peak = 0, 0
+    lock = threading.Lock()
+
+    class SlowEmbeddings(DeterministicFakeEmbedding):
+        def embed_documents(self, texts):
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.02)
+            with lock:
+                active -= 1
+            return super().embed_documents(texts)
+
+    writes = []
+    progress = []
+    written = embed_and_store(
+        iter(docs), SlowEmbeddings(size=4), lambda batch, vectors: writes.append(len(batch)),
+        batch_size=10, max_concurrency=3, on_progress=progress.append
+    )
+
+    assert written == 100
+    assert sum(writes) == 100 and len(writes) == 10
+    assert progress[-1] == 100
+    assert peak <= 3
+
+
+def test_transient_503s_are_retried():
+    with StubEmbeddingServer(latency=0, fail_rate=0.3, dim=8) as stub:
+        remote = HuggingFaceEndpointEmbeddings(model=stub.url, task="feature-extraction", huggingfacehub_api_token="stub")
+        embedder = ResilientEmbeddings(remote, batch_size=5, rate_per_sec=0, retries=20, retry_base_delay=0.001)
+
+        vectors = embedder.embed_documents([f"text {i}" for i in range(50)])
+
+    assert len(vectors) == 50
+    assert all(len(v) == 8 for v in vectors)
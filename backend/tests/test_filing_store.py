@@ -0,0 +1,154 @@
+import gzip
+import json
+
+import pytest
+
+from app.services import filing_store, rag_service
+from app.services.filing_store import FilingNotFound, FilingStore
+
+CIK = 320193
+
+
+def _filing(accession, period, text):
+    return (
+        f"<SEC-HEADER>\nACCESSION NUMBER:\t{accession}\nCONFORMED SUBMISSION TYPE:\t10-K\n"
+        f"CONFORMED PERIOD OF REPORT:\t{period}\nFILED AS OF DATE:\t{period}\n</SEC-HEADER>\n"
+        f"<DOCUMENT>\n<TYPE>10-K\n<TEXT>\n<html><body><p>Item 1A. Risk Factors</p><p>{text}</p></body></html>\n"
+        "</TEXT>\n</DOCUMENT>\n"
+    )
+
+
+def _edgar(root, filings):
+    """
+    A local directory laid out like www.sec.gov + data.sec.gov.
+    filings: [(accession, form, period)], in the (unordered) way SEC lists them.
+    """
+    (root / "files").mkdir(parents=True, exist_ok=True)
+    (root / "files" / "company_tickers.json").write_text(
+        json.dumps({"0": {"cik_str": CIK, "ticker": "AAPL", "title": "Apple Inc."}}))
+    recent = {"accessionNumber": [], "form": [], "reportDate": [], "filingDate": [], "primaryDocument": []}
+    for accession, form, period in filings:
+        recent["accessionNumber"].append(accession)
+        recent["form"].append(form)
+        recent["reportDate"].append(f"{period[:4]}-{period[4:6]}-{period[6:]}")
+        recent["filingDate"].append(f"{int(period[:4]) + 1}-01-15")
+        recent["primaryDocument"].append("aapl-10k.htm")
+        archive = root / "Archives" / "edgar" / "data" / str(CIK) / accession.replace("-", "")
+        archive.mkdir(parents=True, exist_ok=True)
+        (archive / f"{accession}.txt").write_text(_filing(accession, period, "Supply chain risk in China. " * 200))
+    (root / "submissions").mkdir(exist_ok=True)
+    (root / "submissions" / f"CIK{CIK:010d}.json").write_text(json.dumps({"filings": {"recent": recent}}))
+
+
+@pytest.fixture
+def requests_made(monkeypatch):
+    made = []
+    real_fetch = filing_store.fetch
+
+    def fetch(url, etag=None, last_modified=None, stream=False):
+        status, body, headers = real_fetch(url, etag, last_modified, stream)
+        made.append((url.rsplit("/", 1)[-1], status))
+        return status, body, headers
+
+    monkeypatch.setattr(filing_store, "fetch", fetch)
+    return made
+
+
+def test_fetch_latest_stores_compressed_and_skips_known_accessions(tmp_path, requests_made):
+    edgar = tmp_path / "edgar"
+    _edgar(edgar, [("0000320193-23-000106", "10-K", "20230930"),
+                   ("0000320193-24-000001", "10-K/A", "20230930"),
+                   ("0000320193-22-000108", "10-K", "20220924")])
+    store = FilingStore(tmp_path / "store", base_url=edgar.as_uri(), ttl=0)
+
+    metadata, path = store.fetch_latest("aapl")
+    assert metadata == {"accession": "0000320193-23-000106", "form": "10-K", "period": "20230930",
+                        "filed": "20230930"}
+    assert path.endswith("AAPL/10-K/0000320193-23-000106.txt.gz")
+    raw = (edgar / "Archives/edgar/data/320193/000032019323000106/0000320193-23-000106.txt").read_bytes()
+    assert gzip.decompress(open(path, "rb").read()) == raw
+    assert len(open(path, "rb").read()) < len(raw) / 10
+
+    # Nothing new at SEC: a 304 for the filing list and no download
+    requests_made.clear()
+    assert store.fetch_latest("AAPL")[0]["accession"] == "0000320193-23-000106"
+    assert requests_made == [("CIK0000320193.json", 304)]
+
+    # A new 10-K is listed: only it is downloaded, and it becomes the latest
+    _edgar(edgar, [("0000320193-23-000106", "10-K", "20230930"), ("0000320193-24-000123", "10-K", "20240928")])
+    requests_made.clear()
+    assert store.fetch_latest("AAPL")[0]["accession"] == "0000320193-24-000123"
+    assert requests_made == [("CIK0000320193.json", 200), ("0000320193-24-000123.txt", 200)]
+    assert [f["accession"] for f in store.filings("AAPL")] == ["0000320193-24-000123", "0000320193-23-000106"]
+
+
+def test_fresh_or_unreachable_index_stays_offline(tmp_path, requests_made):
+    edgar = tmp_path / "edgar"
+    _edgar(edgar, [("0000320193-23-000106", "10-K", "20230930")])
+    store = FilingStore(tmp_path / "store", base_url=str(edgar), ttl=3600)
+    store.fetch_latest("AAPL")
+
+    requests_made.clear()
+    assert store.fetch_latest("AAPL")[0]["accession"] == "0000320193-23-000106"
+    assert requests_made == []
+
+    with pytest.raises(FilingNotFound):
+        store.fetch_latest("MSFT")
+
+
+def test_ingest_reads_from_the_store(tmp_path, monkeypatch, requests_made):
+    edgar = tmp_path / "edgar"
+    _edgar(edgar, [("0000320193-23-000106", "10-K", "20230930")])
+    store = FilingStore(tmp_path / "store", base_url=edgar.as_uri())
+    synced = []
+
+    def fake_sync(chunks, scope, on_progress=None):
+        synced.extend(chunks)
+        return {"total": len(synced), "added": len(synced), "skipped": 0, "deleted": 0}
+
+    monkeypatch.setattr(rag_service, "get_filing_store", lambda: store)
+    monkeypatch.setattr(rag_service, "sync_documents", fake_sync)
+    monkeypatch.setattr(rag_service.risk_digest, "RISK_DIGEST", False)
+
+    assert rag_service.download_and_ingest_10k("AAPL") == len(synced) > 0
+    assert {c.metadata["accession"] for c in synced} == {"0000320193-23-000106"}
+    assert all(c.metadata["item"] == "1A" and c.metadata["fiscal_year"] == 2023 for c in synced)
+
+
+def test_put_streams_and_cleans_up_on_error(tmp_path):
+    import io
+
+    store = FilingStore(tmp_path / "store")
+    entry = store.put("aapl", io.BytesIO(_filing("0000320193-23-000106", "20230930", "Risk.").encode()))
+    assert entry["accession"] == "0000320193-23-000106"
+
+    with pytest.raises(ValueError):
+        store.put("AAPL", io.BytesIO(b"<html>no SEC header</html>"))
+    assert [p.name for p in (tmp_path / "store" / "AAPL" / "10-K").iterdir()] == ["0000320193-23-000106.txt.gz"]
+
+
+def test_reingesting_an_unchanged_filing_keeps_its_digest_and_cache(tmp_path, monkeypatch, requests_made):
+    edgar = tmp_path / "edgar"
+    _edgar(edgar, [("0000320193-23-000106", "10-K", "20230930")])
+    store = FilingStore(tmp_path / "store", base_url=edgar.as_uri())
+    seen, digests, bumps = set(), [], []
+
+    def fake_sync(chunks, scope, on_progress=None):
+        ids = {c.page_content for c in chunks}
+        added = len(ids - seen)
+        seen.update(ids)
+        return {"total": len(ids), "added": added, "skipped": len(ids) - added, "deleted": 0}
+
+    monkeypatch.setattr(rag_service, "get_filing_store", lambda: store)
+    monkeypatch.setattr(rag_service, "sync_documents", fake_sync)
+    monkeypatch.setattr(rag_service, "bump_corpus_version", lambda: bumps.append(1))
+    monkeypatch.setattr(rag_service.risk_digest, "materialize_digest",
+                        lambda ticker, filing, chunks: digests.append(filing["accession"]))
+    monkeypatch.setattr(rag_service.risk_digest, "has_digest", lambda accession: accession in digests)
+
+    rag_service.download_and_ingest_10k("AAPL")
+    assert digests == ["0000320193-23-000106"] and len(bumps) == 1
+
+    # Nothing changed and the digest exists: no LLM call, cached answers stay valid
+    rag_service.download_and_ingest_10k("AAPL")
+    assert len(digests) == 1 and len(bumps) == 1
@@ -0,0 +1,177 @@
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# --- PATH SETUP ---
+current_file = Path(__file__).resolve()
+project_root = current_file.parent.parent
+sys.path.append(str(project_root))
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services import vector_store
+from app.services.index_versions import IndexVersions, WriterBusy
+
+# A reader worker: prints "= <version> <chroma count> <bm25 count>" for every line on stdin
+READER = """
+import sys
+from app.services import vector_store
+for _ in sys.stdin:
+    store, lexical = vector_store.get_vector_store(), vector_store.get_lexical_index()
+    print("=", vector_store._open_version, store._collection.count(), lexical.count(), flush=True)
+"""
+
+
+def _use_versioned_store(monkeypatch, tmp_path):
+    monkeypatch.setattr(vector_store, "_versions", IndexVersions(tmp_path / "index"))
+    monkeypatch.setattr(vector_store, "VECTOR_INDEX_POLL", 0)
+    monkeypatch.setattr(vector_store, "embedding_model", DeterministicFakeEmbedding(size=16))
+    vector_store.refresh_vector_store()
+
+
+def test_publish_swaps_current_and_keeps_old_version(tmp_path):
+    versions = IndexVersions(tmp_path)
+    with versions.publish() as path:
+        (path / "data").write_text("one")
+    with versions.publish() as path:
+        assert (path / "data").read_text() == "one"  # starts from a copy
+        (path / "data").write_text("two")
+
+    assert versions.current() == "v000002"
+    assert (versions.path("v000001") / "data").read_text() == "one"
+    assert (versions.path("v000002") / "data").read_text() == "two"
+
+
+def test_failed_publish_leaves_current_alone(tmp_path):
+    versions = IndexVersions(tmp_path)
+    with versions.publish():
+        pass
+    with pytest.raises(RuntimeError):
+        with versions.publish() as path:
+            raise RuntimeError("embedding failed")
+
+    assert versions.current() == "v000001"
+    assert not path.exists()
+
+
+def test_only_one_writer_at_a_time(tmp_path):
+    versions = IndexVersions(tmp_path)
+    with versions.publish():
+        # flock is per open file, so a second handle in this process contends too
+        with pytest.raises(WriterBusy):
+            with IndexVersions(tmp_path).publish(timeout=0.2):
+                pass
+
+
+def test_workers_starting_together_publish_one_seed(tmp_path):
+    names = []
+    threads = [threading.Thread(target=lambda: names.append(IndexVersions(tmp_path).ensure_current()))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(names) == {"v000001"}
+    assert IndexVersions(tmp_path)._names() == ["v000001"]
+
+
+def test_gc_waits_for_the_grace_period(tmp_path):
+    versions = IndexVersions(tmp_path)
+    for _ in range(4):
+        with versions.publish():
+            pass
+
+    versions.gc(keep=1, grace=60)
+    assert len(versions._names()) == 4  # just superseded; readers may still use them
+
+    versions.gc(keep=1, grace=0)
+    assert versions._names() == ["v000004"]
+
+
+def test_sync_documents_publishes_a_new_version(monkeypatch, tmp_path):
+    _use_versioned_store(monkeypatch, tmp_path)
+    store = vector_store.get_vector_store()
+    first = vector_store._open_version
+
+    result = vector_store.sync_documents([Document(page_content="Supply chain risk in China")],
+                                         scope={"ticker": "AAPL", "accession": "a1"})
+
+    assert result["added"] == 1
+    assert vector_store._open_version != first
+    assert store._collection.count() == 0  # the published version is never written in place
+    assert vector_store.get_vector_store()._collection.count() == 1
+    assert vector_store.get_lexical_index().count() == 1
+
+    vector_store.refresh_vector_store()
+
+
+def test_batched_syncs_publish_once(monkeypatch, tmp_path):
+    _use_versioned_store(monkeypatch, tmp_path)
+    vector_store.get_vector_store()
+    before = len(vector_store._versions._names())
+
+    with vector_store.publishing():
+        for accession in ("a1", "a2", "a3"):
+            vector_store.sync_documents([Document(page_content=f"Risk factor {accession}")],
+                                        scope={"ticker": "AAPL", "accession": accession})
+
+    assert len(vector_store._versions._names()) == before + 1
+    assert vector_store.get_vector_store()._collection.count() == 3
+
+    vector_store.refresh_vector_store()
+
+
+def test_corpus_version_follows_versions_published_elsewhere(monkeypatch, tmp_path):
+    _use_versioned_store(monkeypatch, tmp_path)
+    vector_store.get_vector_store()
+    before = vector_store.get_corpus_version()
+
+    # Another worker publishes; this one hasn't retrieved anything since
+    with IndexVersions(tmp_path / "index").publish():
+        pass
+
+    assert vector_store.get_corpus_version() > before
+    assert vector_store._open_version == "v000002"
+
+    vector_store.refresh_vector_store()
+
+
+def test_reader_processes_follow_published_versions(monkeypatch, tmp_path):
+    """
+    Readers in other processes (uvicorn workers) pick up a new version
+    without a restart and never see a half-written one.
+    """
+    _use_versioned_store(monkeypatch, tmp_path)
+    vector_store.get_vector_store()
+    env = {**os.environ, "VECTOR_INDEX_ROOT": str(tmp_path / "index"), "VECTOR_INDEX_POLL": "0",
+           "PYTHONPATH": str(project_root)}
+    readers = [subprocess.Popen([sys.executable, "-c", READER], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                text=True, env=env, cwd=project_root) for _ in range(2)]
+
+    def ask(reader):
+        reader.stdin.write("\n")
+        reader.stdin.flush()
+        line = reader.stdout.readline()
+        while not line.startswith("= "):  # skip the reader's own log lines
+            assert line, "reader process exited"
+            line = reader.stdout.readline()
+        return line.split()[1:]
+
+    try:
+        assert [ask(r) for r in readers] == [["v000001", "0", "0"]] * 2
+
+        vector_store.sync_documents([Document(page_content=f"Chunk {i}") for i in range(5)],
+                                    scope={"ticker": "AAPL", "accession": "a1"})
+
+        assert [ask(r) for r in readers] == [["v000002", "5", "5"]] * 2
+    finally:
+        for reader in readers:
+            reader.stdin.close()
+            reader.wait(timeout=30)
+        vector_store.refresh_vector_store()
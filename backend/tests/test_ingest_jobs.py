@@ -0,0 +1,146 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.services.ingest_jobs import IngestJobQueue
+
+
+def _wait_for(job, timeout=5):
+    deadline = time.time() + timeout
+    while job.active and time.time() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def test_concurrent_requests_for_a_ticker_share_one_job():
+    release = threading.Event()
+    runs = []
+
+    def runner(ticker, progress):
+        runs.append(ticker)
+        progress("embedding", chunks_done=0, chunks_total=10)
+        release.wait(5)
+        progress("embedding", chunks_done=10)
+        return 10
+
+    queue = IngestJobQueue(runner)
+    first, created = queue.submit("aapl")
+    second, created_again = queue.submit("AAPL")
+    other, _ = queue.submit("NVDA")
+
+    assert created and not created_again
+    assert second is first
+    assert other is not first
+
+    release.set()
+    assert _wait_for(first).status == "succeeded"
+    assert first.chunks_done == 10 and first.chunks_total == 10
+    assert sorted(runs) == ["AAPL", "NVDA"]
+
+    # Once finished, a new request starts a fresh job
+    third, created = queue.submit("AAPL")
+    assert created and third is not first
+    _wait_for(third)
+    queue.shutdown()
+
+
+def test_failed_job_reports_error():
+    def runner(ticker, progress):
+        progress("downloading")
+        raise ValueError(f"Failed to download 10-K for {ticker}")
+
+    queue = IngestJobQueue(runner)
+    job, _ = queue.submit("ZZZZ")
+    _wait_for(job)
+
+    assert job.status == "failed"
+    assert job.stage == "downloading"
+    assert "ZZZZ" in job.error
+    queue.shutdown()
+
+
+def test_ingest_endpoint_returns_job_and_status(monkeypatch, auth_headers):
+    queue = IngestJobQueue(lambda ticker, progress: 42)
+    monkeypatch.setattr(main, "ingest_queue", queue)
+    client = TestClient(main.app)
+
+    response = client.post("/api/ingest", json={"ticker": "tsla"}, headers=auth_headers)
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    _wait_for(queue.get(job_id))
+
+    status = client.get(f"/api/ingest/{job_id}", headers=auth_headers).json()
+    assert status["ticker"] == "TSLA"
+    assert status["status"] == "succeeded"
+    assert status["chunks_done"] == 42
+
+    assert client.get("/api/ingest/missing", headers=auth_headers).status_code == 404
+    queue.shutdown()
+
+
+def test_workers_share_jobs_through_the_database():
+    from app.database import SessionLocal
+
+    release = threading.Event()
+    runs = []
+
+    def runner(ticker, progress):
+        runs.append(ticker)
+        progress("embedding", chunks_done=3)
+        release.wait(5)
+        return 7
+
+    # Two queues stand in for two uvicorn worker processes
+    first_worker = IngestJobQueue(runner, session_factory=SessionLocal)
+    second_worker = IngestJobQueue(runner, session_factory=SessionLocal)
+    job, created = first_worker.submit("SHRD")
+    attached, created_again = second_worker.submit("shrd")
+
+    assert created and not created_again
+    assert attached.id == job.id
+    assert second_worker.get(job.id).ticker == "SHRD"
+
+    release.set()
+    _wait_for(job)
+    status = second_worker.get(job.id)
+    assert status.status == "succeeded" and status.chunks_done == 7
+    assert runs == ["SHRD"]
+
+    # Finished, so either worker may start the ticker again
+    again, created = second_worker.submit("SHRD")
+    assert created and again.id != job.id
+    _wait_for(again)
+    first_worker.shutdown()
+    second_worker.shutdown()
+
+
+def test_quiet_job_keeps_its_claim_through_heartbeats(monkeypatch):
+    from app.database import SessionLocal
+    from app.services import ingest_jobs
+
+    monkeypatch.setattr(ingest_jobs, "INGEST_HEARTBEAT_SECONDS", 0.05)
+    monkeypatch.setattr(ingest_jobs, "INGEST_STALE_SECONDS", 0.5)
+    release = threading.Event()
+    runs = []
+
+    def runner(ticker, progress):
+        # A long download: no progress reports for longer than the stale limit
+        runs.append(ticker)
+        release.wait(5)
+        return 1
+
+    first_worker = IngestJobQueue(runner, session_factory=SessionLocal)
+    second_worker = IngestJobQueue(runner, session_factory=SessionLocal)
+    job, _ = first_worker.submit("QUIET")
+    time.sleep(1)
+
+    attached, created = second_worker.submit("QUIET")
+    assert not created and attached.id == job.id
+
+    release.set()
+    _wait_for(job)
+    assert runs == ["QUIET"]
+    first_worker.shutdown()
+    second_worker.shutdown()
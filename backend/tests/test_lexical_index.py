@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+
+# --- PATH SETUP ---
+current_file = Path(__file__).resolve()
+project_root = current_file.parent.parent
+sys.path.append(str(project_root))
+
+from langchain_core.documents import Document
+
+from app.services.lexical_index import LexicalIndex, tokenize
+
+
+def _doc(cid, text, **metadata):
+    return Document(page_content=text, metadata={"chunk_id": cid, **metadata})
+
+
+def test_exact_terms_rank_first(tmp_path):
+    """
+    BM25 should nail exact phrases that a dense model tends to blur.
+    """
+    index = LexicalIndex(tmp_path / "lexical.sqlite3")
+    index.add([
+        _doc("a", "Section 232 tariffs on steel and aluminum could raise our costs.", ticker="AAPL"),
+        _doc("b", "General economic conditions may affect demand for our products.", ticker="AAPL"),
+        _doc("c", "Braeburn Capital manages the investment portfolio.", ticker="AAPL"),
+    ])
+
+    results = index.search("What about Section 232 tariffs?", k=2)
+    assert results[0][0].metadata["chunk_id"] == "a"
+    assert results[0][1] >= results[-1][1]
+
+    assert index.search("Braeburn", k=1)[0][0].page_content.startswith("Braeburn Capital")
+    assert index.search("what is the", k=3) == []  # only stopwords
+
+
+def test_filters_replace_and_delete(tmp_path):
+    index = LexicalIndex(tmp_path / "lexical.sqlite3")
+    index.add([
+        _doc("n23", "export control risk", ticker="NVDA", fiscal_year=2023, item="1A"),
+        _doc("n24", "export control risk", ticker="NVDA", fiscal_year=2024, item="1A"),
+        _doc("a24", "export control risk", ticker="AAPL", fiscal_year=2024, item="1A"),
+    ])
+    hits = index.search("export control", k=10, filters={"ticker": "NVDA", "fiscal_year": 2024})
+    assert [doc.metadata["chunk_id"] for doc, _ in hits] == ["n24"]
+
+    # Re-adding an id replaces its text, it doesn't duplicate it
+    index.add([_doc("n24", "liquidity risk", ticker="NVDA", fiscal_year=2024)])
+    assert index.count() == 3
+    assert index.search("export", k=10, filters={"ticker": "NVDA", "fiscal_year": 2024}) == []
+
+    index.delete(["n23", "a24"])
+    assert index.count() == 1
+    assert index.search("export control", k=10) == []
+
+    # Persisted: a fresh handle sees the same rows
+    assert LexicalIndex(tmp_path / "lexical.sqlite3").count() == 1
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("What are the China risks mentioned in the report?") == ["china", "risks"]
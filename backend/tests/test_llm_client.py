@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.stub_servers import StubChatServer
+from app.services.llm_client import LLMClient, LLMUnavailable, ModelHealth
+
+BIG, SMALL = "big-model", "small-model"
+MESSAGES = [{"role": "user", "content": "What are the China risks?"}]
+
+
+def _client(stub, **kwargs):
+    kwargs.setdefault("timeouts", {BIG: 0.3, SMALL: 2})
+    return LLMClient([BIG, SMALL], base_url=stub.url + "/v1", **kwargs)
+
+
+def test_hung_primary_times_out_and_falls_back():
+    with StubChatServer(latency={BIG: 3}) as stub:
+        client = _client(stub)
+        started = time.monotonic()
+        answer = asyncio.run(client.acomplete(MESSAGES))
+        assert answer.startswith(f"Answer from {SMALL}")
+        assert time.monotonic() - started < 1.5
+
+        # Same for the sync path
+        assert client.complete(MESSAGES).startswith(f"Answer from {SMALL}")
+        assert client.stats()["models"][BIG]["error_rate"] == 1.0
+
+
+def test_hedged_request_beats_slow_primary():
+    with StubChatServer(latency={BIG: 1.0, SMALL: 0.05}) as stub:
+        client = _client(stub, timeouts={BIG: 5, SMALL: 5}, hedge_after=0.1)
+        started = time.monotonic()
+        answer = asyncio.run(client.acomplete(MESSAGES))
+        assert answer.startswith(f"Answer from {SMALL}")
+        assert time.monotonic() - started < 0.6
+        assert client.hedged == 1 and client.hedge_wins == 1
+        # The cancelled primary isn't held against it
+        assert client.stats()["models"][BIG]["calls"] == 0
+
+
+def test_circuit_opens_on_errors_and_probes_after_cooldown():
+    with StubChatServer(fail_rate={BIG: 1.0}) as stub:
+        client = _client(stub, health_kwargs={"min_calls": 3, "cooldown": 0.2})
+        for _ in range(6):
+            assert client.complete(MESSAGES).startswith(f"Answer from {SMALL}")
+        # Three failures opened the circuit; later calls never touched the big model
+        assert stub.calls[BIG] == 3
+        assert client.stats()["models"][BIG]["state"] == "open"
+
+        stub.fail_rate = 0.0
+        time.sleep(0.25)
+        assert client.complete(MESSAGES).startswith(f"Answer from {BIG}")
+        assert client.stats()["models"][BIG]["state"] == "closed"
+
+
+def test_latency_alone_can_open_the_circuit():
+    health = ModelHealth(min_calls=4, max_p95=1.0, cooldown=60)
+    for seconds in (0.2, 0.3, 0.2):
+        health.record(seconds, ok=True)
+    assert health.allow()
+    health.record(5.0, ok=True)
+    assert not health.allow() and health.snapshot()["state"] == "open"
+
+
+def test_streaming_and_total_outage():
+    async def collect(client):
+        return "".join([delta async for delta in client.astream(MESSAGES)])
+
+    with StubChatServer(latency={BIG: 3}) as stub:
+        assert asyncio.run(collect(_client(stub))).startswith(f"Answer from {SMALL}")
+
+    with StubChatServer(fail_rate=1.0) as stub:
+        client = _client(stub)
+        with pytest.raises(LLMUnavailable):
+            asyncio.run(client.acomplete(MESSAGES))
+
+
+def test_probe_cancelled_by_hedge_is_released():
+    with StubChatServer(fail_rate={BIG: 1.0}) as stub:
+        client = _client(stub, timeouts={BIG: 5, SMALL: 5}, health_kwargs={"min_calls": 3, "cooldown": 0.2})
+        for _ in range(3):
+            client.complete(MESSAGES)
+        assert client.stats()["models"][BIG]["state"] == "open"
+
+        # After the cooldown the probe is slow, so the hedge wins and cancels it
+        stub.fail_rate, stub.latency = 0.0, {BIG: 1.0, SMALL: 0.05}
+        client.hedge_after = 0.1
+        time.sleep(0.25)
+        assert asyncio.run(client.acomplete(MESSAGES)).startswith(f"Answer from {SMALL}")
+        assert client.stats()["models"][BIG]["state"] == "half_open"
+
+        # The next call may probe again, and its success closes the circuit
+        stub.latency = {}
+        assert asyncio.run(client.acomplete(MESSAGES)).startswith(f"Answer from {BIG}")
+        assert client.stats()["models"][BIG]["state"] == "closed"
@@ -0,0 +1,115 @@
+import threading
+import uuid
+
+from app import models
+from app.database import SessionLocal
+from app.services.message_writer import MessageWriter
+
+
+def _new_user():
+    db = SessionLocal()
+    try:
+        user = models.User(email=f"writer-{uuid.uuid4().hex[:8]}@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def _contents(user_id):
+    db = SessionLocal()
+    try:
+        rows = db.query(models.Message).filter(models.Message.user_id == user_id)\
+            .order_by(models.Message.timestamp, models.Message.id).all()
+        return [row.content for row in rows]
+    finally:
+        db.close()
+
+
+def test_concurrent_messages_share_a_few_commits():
+    user_id = _new_user()
+    writer = MessageWriter(SessionLocal, flush_interval=0.2, batch_size=1000)
+
+    def send(n):
+        for i in range(10):
+            writer.enqueue(user_id, "user", f"{n}-{i}")
+
+    threads = [threading.Thread(target=send, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert writer.wait_for_user(user_id)
+    contents = _contents(user_id)
+    assert len(contents) == 80
+    # Each sender's messages keep their order
+    for n in range(8):
+        assert [c for c in contents if c.startswith(f"{n}-")] == [f"{n}-{i}" for i in range(10)]
+    assert writer.stats()["flushes"] <= 3
+    writer.close()
+
+
+def test_read_your_writes_and_drain_on_close():
+    user_id = _new_user()
+    # A long interval: only wait_for_user / close make it write
+    writer = MessageWriter(SessionLocal, flush_interval=60)
+    writer.enqueue(user_id, "user", "question")
+    writer.enqueue(user_id, "assistant", "answer")
+    assert writer.wait_for_user(user_id, timeout=5)
+    assert _contents(user_id) == ["question", "answer"]
+
+    writer.enqueue(user_id, "user", "last words")
+    writer.close()
+    assert _contents(user_id)[-1] == "last words"
+
+
+def test_failed_flush_keeps_rows(monkeypatch):
+    user_id = _new_user()
+    monkeypatch.setattr("app.services.message_writer.MESSAGE_FLUSH_RETRY", 0.01)
+    attempts = []
+
+    def flaky_session():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("database is restarting")
+        return SessionLocal()
+
+    writer = MessageWriter(flaky_session, flush_interval=0.01)
+    writer.enqueue(user_id, "user", "kept")
+    assert writer.wait_for_user(user_id, timeout=5)
+    assert _contents(user_id) == ["kept"]
+    writer.close()
+
+
+def test_close_reports_rows_it_could_not_write(monkeypatch, capsys):
+    monkeypatch.setattr("app.services.message_writer.MESSAGE_FLUSH_RETRY", 0.01)
+
+    def down():
+        raise RuntimeError("database is down")
+
+    writer = MessageWriter(down, flush_interval=0.01)
+    writer.enqueue(1, "user", "never saved")
+    assert not writer.wait_for_user(1, timeout=0.1)
+
+    assert writer.close(timeout=0.1) == 1
+    assert "1 chat messages NOT written" in capsys.readouterr().out
+
+
+def test_a_row_the_database_rejects_does_not_block_the_rest(monkeypatch):
+    user_id = _new_user()
+    monkeypatch.setattr("app.services.message_writer.MESSAGE_FLUSH_RETRY", 0.01)
+    writer = MessageWriter(SessionLocal, flush_interval=60)
+    writer.enqueue(user_id, "user", "before")
+    writer.enqueue(user_id, "user", object())  # can never be bound
+    writer.enqueue(user_id, "assistant", "after")
+    assert writer.wait_for_user(user_id, timeout=5)
+    assert _contents(user_id) == ["before", "after"]
+    assert writer.stats()["dropped"] == 1
+
+    # Later messages go out in batches again
+    writer.enqueue(user_id, "user", "next")
+    assert writer.wait_for_user(user_id, timeout=5)
+    assert _contents(user_id)[-1] == "next"
+    writer.close()
@@ -0,0 +1,112 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# --- PATH SETUP ---
+current_file = Path(__file__).resolve()
+project_root = current_file.parent.parent
+sys.path.append(str(project_root))
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services import mmap_vector_store, vector_store
+from app.services.mmap_vector_store import MmapVectorStore
+
+
+def _clustered(rows, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=rows)] + 0.3 * rng.normal(size=(rows, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _fill(store, vectors):
+    ids = [f"c{i}" for i in range(len(vectors))]
+    store.upsert(ids, vectors, [f"chunk {i}" for i in range(len(vectors))],
+                 [{"ticker": "AAPL" if i % 2 else "NVDA", "row": i} for i in range(len(vectors))])
+    return ids
+
+
+def _recall(store, vectors, queries, k=10):
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+    found = store.search_by_vectors(queries, k=k)
+    return np.mean([len({row for row, _ in hits} & set(truth)) / k for hits, truth in zip(found, exact)])
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_search_matches_exact_scores(tmp_path, dtype):
+    vectors = _clustered(2000)
+    store = MmapVectorStore(tmp_path, DeterministicFakeEmbedding(size=32), dtype=dtype)
+    _fill(store, vectors)
+
+    assert _recall(store, vectors, vectors[:50]) >= 0.95
+    assert store.search_by_vectors(vectors[7:8], k=1)[0][0][0] == 7
+
+
+def test_upsert_replaces_and_delete_hides_rows(tmp_path):
+    store = MmapVectorStore(tmp_path, DeterministicFakeEmbedding(size=32))
+    vectors = _clustered(10)
+    _fill(store, vectors)
+
+    store.upsert(["c3"], [vectors[4]], ["chunk 3, edited"], [{"ticker": "AAPL"}])
+    store.delete(ids=["c5"])
+
+    assert store.count() == 9
+    assert store.get(ids=["c3"])["documents"] == ["chunk 3, edited"]
+    assert "c5" not in store.get()["ids"]
+    hits = store.similarity_search_by_vector(vectors[5], k=9)
+    assert "chunk 5" not in [doc.page_content for doc in hits]
+
+
+def test_filters_and_reopen(tmp_path):
+    store = MmapVectorStore(tmp_path, DeterministicFakeEmbedding(size=32), dtype="int8")
+    vectors = _clustered(200)
+    _fill(store, vectors)
+    store.close()
+
+    # A second process opening the directory sees the same index (and its dtype)
+    reader = MmapVectorStore(tmp_path, DeterministicFakeEmbedding(size=32), dtype="float32")
+    assert reader.dtype == "int8"
+    hits = reader.similarity_search_by_vector(vectors[0], k=5, filter={"ticker": "AAPL"})
+    assert len(hits) == 5 and all(doc.metadata["ticker"] == "AAPL" for doc in hits)
+    where = {"$and": [{"ticker": "AAPL"}, {"row": 3}]}
+    assert reader.get(where=where, include=[])["ids"] == ["c3"]
+
+
+def test_ivf_keeps_recall_and_covers_new_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(mmap_vector_store, "MMAP_IVF_PROBE", 4)
+    vectors = _clustered(5000)
+    store = MmapVectorStore(tmp_path, DeterministicFakeEmbedding(size=32), dtype="float16")
+    _fill(store, vectors)
+    store.train_ivf(lists=40)
+
+    assert store._view() and store._ivf is not None
+    assert _recall(store, vectors, vectors[:50]) >= 0.8
+
+    # Rows added after training are searched even though no partition holds them
+    extra = _clustered(1, seed=99)
+    store.upsert(["late"], extra, ["late chunk"], [{}])
+    assert store.similarity_search_by_vector(extra[0], k=1)[0].page_content == "late chunk"
+
+
+def test_vector_store_on_mmap_backend(monkeypatch, tmp_path):
+    monkeypatch.setattr(vector_store, "VECTOR_BACKEND", "mmap")
+    monkeypatch.setattr(vector_store, "mmap_index_path", tmp_path / "mmap_index")
+    monkeypatch.setattr(vector_store, "lexical_index_path", tmp_path / "lexical_index.sqlite3")
+    monkeypatch.setattr(vector_store, "embedding_model", DeterministicFakeEmbedding(size=16))
+    vector_store.refresh_vector_store()
+    scope = {"ticker": "AAPL", "accession": "a1"}
+    docs = [Document(page_content=t) for t in ("Supply chain risk in China", "Interest rate risk")]
+
+    assert vector_store.sync_documents(docs, scope)["added"] == 2
+    assert vector_store.sync_documents(docs[:1], scope) == {"total": 1, "added": 0, "skipped": 1, "deleted": 1}
+
+    found = vector_store.get_retriever(k=1).invoke("Supply chain risk in China")
+    assert found[0].page_content == "Supply chain risk in China"
+    assert vector_store.retrieve("Supply chain risk in China", k=1, filters={"ticker": "AAPL"}, mode="dense")
+    assert vector_store.get_chunk_vectors(found)[0] is not None
+
+    vector_store.refresh_vector_store()
@@ -0,0 +1,99 @@
+import asyncio
+import uuid
+
+from langchain_core.documents import Document
+
+from app.services import rag_service, risk_digest
+from app.services.answer_cache import answer_cache
+
+RISKS_2023 = """Item 1A. Risk Factors
+Risks Related to Our Business
+Our operations depend on suppliers in China and Taiwan that may be affected by trade tariffs.
+We rely on a small number of component suppliers, some of which are a single source. Delays at
+these suppliers have in the past reduced our shipments. We may not find alternatives quickly.
+Cybersecurity breaches or ransomware attacks could disrupt our systems and harm our reputation.
+Attacks are increasingly sophisticated. We may not detect an intrusion for some time."""
+
+RISKS_2024 = """Item 1A. Risk Factors
+Our operations depend on suppliers in China and Taiwan that may be affected by new trade tariffs.
+Cybersecurity breaches or ransomware attacks could disrupt our systems and harm our reputation.
+Changes in interest rates and inflation may reduce demand for our products and services."""
+
+
+def _chunks(text, item="1A"):
+    return [Document(page_content=text, metadata={"item": item})]
+
+
+def _ticker():
+    return "T" + uuid.uuid4().hex[:6].upper()
+
+
+def test_extracts_and_categorizes_headings():
+    risks = risk_digest.extract_risks(_chunks(RISKS_2023) + _chunks("Item 7. MD&A\nRevenue grew.", item="7"),
+                                      {"ticker": "AAPL", "accession": "a1"})
+
+    assert [r["category"] for r in risks] == ["geopolitical & trade", "cybersecurity"]
+    assert risks[0]["heading"].startswith("Our operations depend on suppliers")
+    assert len(risks[0]["chunk_ids"]) == 1
+
+
+def test_digest_diffs_against_prior_year():
+    ticker = _ticker()
+    first = risk_digest.materialize_digest(ticker, {"accession": f"{ticker}-a1", "fiscal_year": 2023},
+                                           _chunks(RISKS_2023), summarize=False)
+    second = risk_digest.materialize_digest(ticker, {"accession": f"{ticker}-a2", "fiscal_year": 2024},
+                                            _chunks(RISKS_2024), summarize=False)
+
+    assert first["compared_to"] is None
+    assert second["compared_to"] == f"{ticker}-a1"
+    # Reworded ("new trade tariffs") still matches last year's heading
+    assert second["added_headings"] == ["Changes in interest rates and inflation may reduce demand for our products and services."]
+    assert second["removed_headings"] == []
+    assert risk_digest.find_digest(ticker)["accession"] == f"{ticker}-a2"
+    assert risk_digest.digest_for_filters({"ticker": ticker, "fiscal_year": 2023})["accession"] == f"{ticker}-a1"
+    assert risk_digest.digest_for_filters({"ticker": ticker, "item": "7"}) is None
+
+
+def test_answers_only_overview_questions():
+    ticker = _ticker()
+    digest = risk_digest.materialize_digest(ticker, {"accession": f"{ticker}-a1", "fiscal_year": 2024},
+                                            _chunks(RISKS_2024), summarize=False)
+
+    assert "1. Our operations depend on suppliers" in risk_digest.answer_from_digest("What are the key risks?", digest)
+    assert risk_digest.answer_from_digest("Which risks are new this year?", digest) is None  # no prior year
+    assert risk_digest.answer_from_digest("What are the key risks related to China?", digest) is None
+    assert risk_digest.answer_from_digest("How much cash does the company hold?", digest) is None
+    assert "RISK DIGEST" in risk_digest.digest_context(digest)
+
+
+def test_query_answers_from_digest_without_llm(monkeypatch):
+    answer_cache.clear()
+    ticker = _ticker()
+    risk_digest.materialize_digest(ticker, {"accession": f"{ticker}-a1", "fiscal_year": 2024},
+                                   _chunks(RISKS_2024), summarize=False)
+
+    async def no_llm(*args, **kwargs):
+        raise AssertionError("the digest should have answered")
+
+    monkeypatch.setattr(rag_service, "aget_llm_response_internal", no_llm)
+    monkeypatch.setattr(rag_service, "aretrieve", no_llm)
+    answer = asyncio.run(rag_service.aquery_rag("What are the main risks?", filters={"ticker": ticker}))
+
+    assert answer.startswith(f"Key risk factors in the {ticker} FY2024 10-K")
+
+
+def test_digest_is_trimmed_to_its_share_of_a_small_budget(monkeypatch):
+    ticker = _ticker()
+    digest = risk_digest.materialize_digest(ticker, {"accession": f"{ticker}-a1", "fiscal_year": 2024},
+                                            _chunks(RISKS_2024), summarize=False)
+    full = risk_digest.digest_context(digest)
+    trimmed = risk_digest.digest_context(digest, max_tokens=risk_digest.estimate_tokens(full) - 1)
+
+    assert trimmed is not None and full.startswith(trimmed) and len(trimmed) < len(full)
+    assert risk_digest.digest_context(digest, max_tokens=5) is None
+
+    monkeypatch.setattr(rag_service, "context_token_budget", lambda: 40)
+    monkeypatch.setattr(rag_service, "get_chunk_vectors", lambda docs: None)
+    assert rag_service._digest_section(digest) is None
+    pack = rag_service._select_context([Document(page_content="Tariffs on China.", metadata={})], reserved_tokens=500)
+    assert pack.budget == 30 and pack.passages
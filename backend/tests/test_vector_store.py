@@ -0,0 +1,190 @@
+import sys
+from pathlib import Path
+
+# --- PATH SETUP ---
+current_file = Path(__file__).resolve()
+project_root = current_file.parent.parent
+sys.path.append(str(project_root))
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services import vector_store
+
+
+def _use_tmp_store(monkeypatch, tmp_path):
+    monkeypatch.setattr(vector_store, "vector_db_path", tmp_path / "chroma_db")
+    monkeypatch.setattr(vector_store, "lexical_index_path", tmp_path / "lexical_index.sqlite3")
+    monkeypatch.setattr(vector_store, "embedding_model", DeterministicFakeEmbedding(size=16))
+    vector_store.refresh_vector_store()
+
+
+def test_store_handle_is_shared(monkeypatch, tmp_path):
+    """
+    Every caller should get the same warm Chroma client.
+    """
+    _use_tmp_store(monkeypatch, tmp_path)
+
+    assert vector_store.get_vector_store() is vector_store.get_vector_store()
+    assert vector_store.get_retriever() is vector_store.get_retriever()
+
+    vector_store.refresh_vector_store()
+
+
+def test_ingested_docs_visible_to_retriever(monkeypatch, tmp_path):
+    """
+    Ingestion and queries use one handle, so new chunks are searchable immediately.
+    """
+    _use_tmp_store(monkeypatch, tmp_path)
+
+    retriever = vector_store.get_retriever(k=1)
+    vector_store.get_vector_store().add_documents([Document(page_content="Supply chain risk in China")])
+
+    docs = retriever.invoke("Supply chain risk in China")
+    assert docs[0].page_content == "Supply chain risk in China"
+
+    # A refresh reopens the directory and still sees the persisted data
+    vector_store.refresh_vector_store()
+    assert vector_store.get_vector_store() is not None
+    assert vector_store.get_retriever(k=1).invoke("China")[0].page_content == "Supply chain risk in China"
+
+    vector_store.refresh_vector_store()
+
+
+def test_reingesting_a_filing_is_idempotent(monkeypatch, tmp_path):
+    _use_tmp_store(monkeypatch, tmp_path)
+    scope = {"ticker": "AAPL", "accession": "0000320193-23-000106"}
+
+    def chunks(*texts):
+        return [Document(page_content=t, metadata={"source": "full-submission.txt"}) for t in texts]
+
+    first = vector_store.sync_documents(chunks("risk a", "risk b", "risk b"), scope)
+    assert first == {"total": 2, "added": 2, "skipped": 0, "deleted": 0}
+
+    again = vector_store.sync_documents(chunks("risk a", "risk b"), scope)
+    assert again == {"total": 2, "added": 0, "skipped": 2, "deleted": 0}
+
+    # An updated parse of the same filing only touches what changed
+    changed = vector_store.sync_documents(chunks("risk a", "risk c"), scope)
+    assert changed == {"total": 2, "added": 1, "skipped": 1, "deleted": 1}
+
+    # Another year's filing lives alongside it
+    vector_store.sync_documents(chunks("risk a"), {"ticker": "AAPL", "accession": "0000320193-24-000123"})
+
+    collection = vector_store.get_vector_store()._collection
+    assert collection.count() == 3
+    stored = collection.get(where={"accession": scope["accession"]})
+    assert sorted(stored["documents"]) == ["risk a", "risk c"]
+    assert stored["ids"][0] == stored["metadatas"][0]["chunk_id"]
+
+    vector_store.refresh_vector_store()
+
+
+
+def test_filters_scope_retrieval(monkeypatch, tmp_path):
+    import asyncio
+
+    _use_tmp_store(monkeypatch, tmp_path)
+    for ticker, year in (("AAPL", 2023), ("NVDA", 2023), ("NVDA", 2024)):
+        docs = [
+            Document(page_content=f"{ticker} {year} export control risk", metadata={"fiscal_year": year, "item": "1A"}),
+            Document(page_content=f"{ticker} {year} revenue discussion", metadata={"fiscal_year": year, "item": "7"}),
+        ]
+        vector_store.sync_documents(docs, {"ticker": ticker, "accession": f"{ticker}-{year}"})
+
+    filters = vector_store.build_filter(ticker="nvda", year=2024, item="Item 1A")
+    assert filters == {"ticker": "NVDA", "fiscal_year": 2024, "item": "1A"}
+
+    docs = vector_store.get_retriever(k=3, filters=filters).invoke("export control risk")
+    assert [d.page_content for d in docs] == ["NVDA 2024 export control risk"]
+
+    docs = asyncio.run(vector_store.aretrieve("risk", k=10, filters=vector_store.build_filter(ticker="NVDA")))
+    assert len(docs) == 4 and all(d.metadata["ticker"] == "NVDA" for d in docs)
+
+    assert vector_store.build_filter() is None
+    vector_store.refresh_vector_store()
+
+
+def test_hybrid_retrieval_fuses_and_falls_back(monkeypatch, tmp_path):
+    import asyncio
+    _use_tmp_store(monkeypatch, tmp_path)
+    docs = [Document(page_content=text) for text in (
+        "Section 232 tariffs on imported steel",
+        "Supply chain concentration in China",
+        "Cybersecurity incidents and ransomware",
+    )]
+    vector_store.sync_documents(docs, {"source": "10k.txt"})
+
+    # Ingestion keeps the BM25 index in step with the vector store
+    assert vector_store.get_lexical_index().count() == 3
+    lexical = asyncio.run(vector_store.aretrieve("Section 232 tariffs", k=1, mode="lexical"))
+    assert lexical[0].page_content == "Section 232 tariffs on imported steel"
+
+    hybrid = asyncio.run(vector_store.aretrieve("Section 232 tariffs", k=3))
+    assert hybrid[0].page_content == "Section 232 tariffs on imported steel"
+    assert len({d.metadata["chunk_id"] for d in hybrid}) == len(hybrid)
+
+    # Embedding endpoint down: answer from BM25 and stop calling it for a while
+    calls = []
+
+    async def broken_embed(self, question):
+        calls.append(question)
+        raise ConnectionError("endpoint down")
+
+    monkeypatch.setattr(DeterministicFakeEmbedding, "aembed_query", broken_embed)
+    monkeypatch.setattr(vector_store, "_dense_down_until", 0.0)
+    for _ in range(2):
+        docs = asyncio.run(vector_store.aretrieve("ransomware", k=1))
+        assert docs[0].page_content == "Cybersecurity incidents and ransomware"
+    assert len(calls) == 1
+
+    vector_store.refresh_vector_store()
+
+
+def test_only_outages_switch_dense_search_off(monkeypatch, tmp_path):
+    import asyncio
+    import pytest
+    _use_tmp_store(monkeypatch, tmp_path)
+    vector_store.sync_documents([Document(page_content="Cybersecurity incidents and ransomware")],
+                                {"source": "10k.txt"})
+
+    class Overloaded(Exception):
+        status = 503
+
+    async def failing_embed(self, question):
+        raise error
+
+    monkeypatch.setattr(DeterministicFakeEmbedding, "aembed_query", failing_embed)
+    for error in (ValueError("bad input"), KeyError("dim"), type("Rejected", (Exception,), {"status": 400})()):
+        monkeypatch.setattr(vector_store, "_dense_down_until", 0.0)
+        with pytest.raises(type(error)):
+            asyncio.run(vector_store.aretrieve("ransomware", k=1))
+        assert vector_store._dense_down_until == 0.0
+
+    for error in (Overloaded(), TimeoutError(), ConnectionResetError()):
+        monkeypatch.setattr(vector_store, "_dense_down_until", 0.0)
+        assert asyncio.run(vector_store.aretrieve("ransomware", k=1))
+        assert vector_store._dense_down_until > 0.0
+
+    vector_store.refresh_vector_store()
+
+
+def test_sync_retrieve_works_inside_a_running_loop(monkeypatch, tmp_path):
+    import asyncio
+    _use_tmp_store(monkeypatch, tmp_path)
+    vector_store.sync_documents([Document(page_content="Section 232 tariffs on imported steel")],
+                                {"source": "10k.txt"})
+
+    async def caller():
+        return vector_store.retrieve("tariffs", k=1, mode="lexical")
+
+    assert asyncio.run(caller())[0].page_content == "Section 232 tariffs on imported steel"
+    assert vector_store.retrieve("tariffs", k=1, mode="lexical")
+
+    vector_store.refresh_vector_store()
+
+
+def test_rrf_prefers_documents_found_by_both():
+    a, b, c = (Document(page_content=t, metadata={"chunk_id": t}) for t in "abc")
+    fused = vector_store.rrf_fuse([[a, b, c], [b, c]], k=3)
+    assert [d.page_content for d in fused] == ["b", "c", "a"]
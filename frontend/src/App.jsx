@@ -103,6 +103,7 @@ function Dashboard() {
     { role: "system", content: "Connecting to Secure Archives..." },
   ]);
   const [loading, setLoading] = useState(false);
+  const [olderCursor, setOlderCursor] = useState(null); // set while older history pages exist
 
   // --- NEW: INGESTION STATE ---
   const [showModal, setShowModal] = useState(false);
@@ -114,9 +115,11 @@ function Dashboard() {
   useEffect(() => {
     const fetchHistory = async () => {
       try {
+        // Only the latest page; older messages load on demand
         const res = await axios.get("/api/history", {
           headers: { Authorization: `Bearer ${token}` },
         });
+        setOlderCursor(res.headers["x-next-cursor"] || null);
         if (res.data.length > 0) setMessages(res.data);
         else
           setMessages([
@@ -132,6 +135,19 @@ function Dashboard() {
     fetchHistory();
   }, [token]);
 
+  const loadOlder = async () => {
+    try {
+      const res = await axios.get("/api/history", {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { before: olderCursor },
+      });
+      setOlderCursor(res.headers["x-next-cursor"] || null);
+      setMessages((prev) => [...res.data, ...prev]);
+    } catch (error) {
+      if (error.response?.status === 401) logout();
+    }
+  };
+
   // 2. Handle Message Send
   const handleSend = async () => {
     if (!input.trim()) return;
@@ -141,20 +157,51 @@ function Dashboard() {
     setLoading(true);
 
     try {
-      const response = await axios.post(
-        "/api/analyze",
-        { question: userMessage.content },
-        { headers: { Authorization: `Bearer ${token}` } },
-      );
-      const aiMessage = { role: "assistant", content: response.data.answer };
-      setMessages((prev) => [...prev, aiMessage]);
+      // Stream the answer (Server-Sent Events) so tokens show up as they arrive
+      const response = await fetch("/api/analyze/stream", {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          Authorization: `Bearer ${token}`,
+        },
+        body: JSON.stringify({ question: userMessage.content }),
+      });
+      if (response.status === 401) return logout();
+      if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+      setMessages((prev) => [...prev, { role: "assistant", content: "" }]);
+      const appendToAnswer = (text) =>
+        setMessages((prev) => {
+          const last = prev[prev.length - 1];
+          return [...prev.slice(0, -1), { ...last, content: last.content + text }];
+        });
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const block of events) {
+          const [eventLine, dataLine] = block.split("\n");
+          const event = eventLine.replace("event: ", "");
+          const data = JSON.parse(dataLine.replace("data: ", ""));
+          if (event === "token") {
+            setLoading(false);
+            appendToAnswer(data);
+          } else if (event === "error") {
+            throw new Error(data);
+          }
+        }
+      }
     } catch (error) {
-      if (error.response?.status === 401) logout();
-      else
-        setMessages((prev) => [
-          ...prev,
-          { role: "system", content: "❌ Connection Error" },
-        ]);
+      setMessages((prev) => [
+        ...prev,
+        { role: "system", content: "❌ Connection Error" },
+      ]);
     } finally {
       setLoading(false);
     }
@@ -166,12 +213,19 @@ function Dashboard() {
     setIngesting(true);
 
     try {
-      // Call our new Endpoint
-      await axios.post(
+      // Queue the job, then poll until the worker finishes it
+      const headers = { Authorization: `Bearer ${token}` };
+      const { data } = await axios.post(
         "/api/ingest",
         { ticker: ticker },
-        { headers: { Authorization: `Bearer ${token}` } },
+        { headers },
       );
+      let job = data;
+      while (job.status === "queued" || job.status === "running") {
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        job = (await axios.get(`/api/ingest/${data.job_id}`, { headers })).data;
+      }
+      if (job.status !== "succeeded") throw new Error(job.error);
 
       // Update UI
       setFiles((prev) => [...prev, `${ticker.toUpperCase()} 10-K`]);
@@ -238,6 +292,14 @@ function Dashboard() {
       {/* --- MAIN CHAT --- */}
       <div className="flex-1 flex flex-col relative bg-desco-900">
         <div className="flex-1 overflow-y-auto p-4 space-y-4 scroll-smooth">
+          {olderCursor && (
+            <button
+              onClick={loadOlder}
+              className="block mx-auto text-xs text-gray-400 hover:text-white"
+            >
+              Load earlier messages
+            </button>
+          )}
           {messages.map((msg, idx) => (
             <div
               key={idx}